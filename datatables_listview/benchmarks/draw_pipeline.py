@@ -0,0 +1,225 @@
+"""
+Benchmark of the draw pipeline by stage at realistic data sizes: parsing the
+draw params, building the search Q objects, the counts, the page query, the
+rendering of the cells and of the options and the JSON encoding. It seeds the
+test models (Persons with a dog and three cats) and runs several scenarios,
+the results are saved as JSON to compare them across commits.
+
+Run it from the datatables_listview directory:
+
+    python -m benchmarks.draw_pipeline --rows 100000 --output results.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+from datetime import date, timedelta
+
+from .utils import setup_django, timeit
+
+SCENARIOS = [
+    # name, draw params, view
+    ('first_page', {'start': 0, 'length': 10}, 'plain'),
+    ('deep_page', {'start': 0.9, 'length': 10}, 'plain'),
+    ('multi_word_search', {
+        'start': 0, 'length': 10, 'search[value]': 'name12 female 2000-01-01'
+    }, 'plain'),
+    ('wide_page', {'start': 0, 'length': 1000}, 'plain'),
+    ('options_heavy', {'start': 0, 'length': 100}, 'options'),
+]
+
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(rows, batch_size=5000):
+    """
+    Creates the rows with bulk_create, the fields that aren't used by the
+    views are copied from an object prepared by model_mommy
+    """
+    from model_mommy import mommy
+    from tests.models import TestCat, TestDog, TestPerson
+
+    template = mommy.prepare_recipe('tests.test_person')
+    template_values = {
+        field.attname: getattr(template, field.attname)
+        for field in TestPerson._meta.concrete_fields
+        if not field.primary_key and not field.is_relation
+    }
+    dogs = TestDog.objects.bulk_create([
+        TestDog(name="Dog%s" % counter, age=counter % 20)
+        for counter in range(max(rows // 10, 1))
+    ])
+    cats = TestCat.objects.bulk_create([
+        TestCat(name="Cat%s" % counter, hate_level=counter % 10)
+        for counter in range(max(rows // 10, 3))
+    ])
+    if not dogs[0].pk:
+        # Databases that don't return the pks of bulk_create
+        dogs = list(TestDog.objects.all())
+        cats = list(TestCat.objects.all())
+    through = TestPerson.cats.through
+    randomizer = random.Random(0)
+    first_date = date(1950, 1, 1)
+    for start in range(0, rows, batch_size):
+        persons = []
+        for counter in range(start, min(start + batch_size, rows)):
+            values = dict(
+                template_values,
+                name="Name%s" % counter,
+                gender=randomizer.randint(0, 1),
+                birth_date=first_date + timedelta(days=counter % 20000),
+                dog_id=randomizer.choice(dogs).pk
+            )
+            persons.append(TestPerson(**values))
+        TestPerson.objects.bulk_create(persons)
+        persons = TestPerson.objects.order_by('-pk')[:len(persons)]
+        through.objects.bulk_create([
+            through(testperson_id=person.pk, testcat_id=cat.pk)
+            for person in persons
+            for cat in randomizer.sample(cats, 3)
+        ])
+
+
+def get_view_classes():
+    from core.views import DatatablesListView
+    from tests.models import TestPerson
+
+    def is_female(value, condition_values):
+        return value in condition_values
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender', 'birth_date', 'dog', 'cats']
+
+    class OptionsPersonListView(PersonListView):
+        options_list = [
+            {
+                'option_label': 'Option %s' % counter,
+                'option_url': 'person-dog' if counter % 2 else 'person-detail',
+                'url_params': ['id', 'dog'] if counter % 2 else ['id'],
+                'icon': 'eye',
+                'conditions': [
+                    {
+                        'field': 'gender',
+                        'condition_values': ['FEMALE'],
+                        'condition_func': is_female
+                    }
+                ] if counter % 3 == 0 else []
+            }
+            for counter in range(10)
+        ]
+
+    return {'plain': PersonListView, 'options': OptionsPersonListView}
+
+
+def benchmark_scenario(view_class, request, repeat):
+    from core.serializers import StdlibJSONSerializer, get_json_serializer
+
+    view = view_class()
+    draw_params = view.get_draw_params(request)
+    results = {}
+
+    results['draw_params'] = timeit(
+        lambda: view.get_draw_params(request), repeat
+    )
+    if draw_params.search:
+        # The search backend of the view with the compiler of its spec
+        results['search_q'] = timeit(
+            lambda: view.filter_by_search_text(
+                view.get_queryset(), draw_params.search
+            ),
+            repeat
+        )
+    _, queryset, filtered_queryset = view.prepare_draw(request)
+    results['count'] = timeit(
+        lambda: view.count_draw(queryset, filtered_queryset, draw_params),
+        repeat
+    )
+
+    def fetch_page():
+        page = view.apply_query_plan(filtered_queryset)
+        return list(view.filter_by_draw_params(page, draw_params))
+
+    results['page_query'] = timeit(fetch_page, repeat)
+    page = fetch_page()
+
+    def render_cells():
+        view.reset_row_values()
+        return view.generate_rows(page)
+
+    results['cells'] = timeit(render_cells, repeat)
+    if view.get_options_list():
+        option_renderer = view.get_option_renderer()
+
+        def render_options():
+            view.reset_row_values()
+            return [
+                option_renderer.render_options(view.get_rendered_urls(obj))
+                for obj in page
+            ]
+
+        results['options'] = timeit(render_options, repeat)
+
+    final_data = view.generate_data(request)
+    results['json_stdlib'] = timeit(
+        lambda: StdlibJSONSerializer().dumps(final_data), repeat
+    )
+    fast_serializer = get_json_serializer()
+    if type(fast_serializer) is not StdlibJSONSerializer:
+        results['json_fast'] = timeit(
+            lambda: fast_serializer.dumps(final_data), repeat
+        )
+    results['total'] = timeit(lambda: view.generate_data(request), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000,
+                        help="Rows to seed, like 10000, 100000 or 1000000")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="File for the JSON results")
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.test import RequestFactory
+
+    seed(args.rows)
+    view_classes = get_view_classes()
+    factory = RequestFactory()
+    report = {
+        'rows': args.rows,
+        'commit': get_git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'scenarios': {}
+    }
+    for name, params, view_name in SCENARIOS:
+        params = dict(params, draw=1)
+        params.setdefault('order[0][column]', 1)
+        params.setdefault('order[0][dir]', 'asc')
+        if isinstance(params['start'], float):
+            params['start'] = int(args.rows * params['start'])
+        results = benchmark_scenario(
+            view_classes[view_name], factory.get('/', params), args.repeat
+        )
+        report['scenarios'][name] = results
+        for stage, elapsed in results.items():
+            print("%-18s %-12s %10.3f ms" % (name, stage, elapsed * 1e3))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
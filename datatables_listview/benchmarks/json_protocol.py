@@ -0,0 +1,75 @@
+"""
+Benchmark of the ajax responses, comparing the payload size and the encoding
+time of the HTML rows against the compact protocol, with the json module and
+the fastest serializer installed (orjson or ujson).
+
+Run it from the datatables_listview directory:
+
+    python -m benchmarks.json_protocol --rows 500
+"""
+import argparse
+
+from .utils import setup_django, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory
+    from model_mommy import mommy
+    from core.serializers import StdlibJSONSerializer, get_json_serializer
+    from core.views import DatatablesListView
+    from tests.models import TestPerson
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender', 'birth_date', 'dog']
+        options_list = [
+            {
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'icon': 'eye',
+            },
+            {
+                'option_label': 'Dog',
+                'option_url': 'person-dog',
+                'url_params': ['id', 'dog'],
+                'confirm_modal': 'dog-modal',
+            }
+        ]
+
+    class CompactPersonListView(PersonListView):
+        compact_protocol = True
+
+    mommy.make_recipe('tests.test_person', _quantity=args.rows)
+    request = RequestFactory().get('/', {
+        'start': 0,
+        'length': args.rows,
+        'order[0][column]': 0,
+        'order[0][dir]': 'asc',
+        'draw': 1
+    })
+    serializers = [StdlibJSONSerializer()]
+    fast_serializer = get_json_serializer()
+    if type(fast_serializer) is not StdlibJSONSerializer:
+        serializers.append(fast_serializer)
+
+    for name, view_class in (
+        ('html', PersonListView), ('compact', CompactPersonListView)
+    ):
+        data = view_class().generate_data(request)
+        for serializer in serializers:
+            payload = serializer.dumps(data)
+            elapsed = timeit(lambda: serializer.dumps(data))
+            print("%-8s %-22s %10d bytes %8.2f ms" % (
+                name, serializer.__class__.__name__, len(payload),
+                elapsed * 1e3
+            ))
+
+
+if __name__ == "__main__":
+    main()
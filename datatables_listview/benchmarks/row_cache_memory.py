@@ -0,0 +1,83 @@
+"""
+Memory benchmark of the row cache of evaluate_data over a long iteration,
+comparing the old fields_data dict (Never cleared, keyed by a formatted
+string) against the row cache scoped to each draw. The rows are unsaved
+objects so it only measures the cache, a draw is a page of --page-size rows.
+
+Run it from the datatables_listview directory:
+
+    python -m benchmarks.row_cache_memory --rows 1000000
+"""
+import argparse
+import datetime
+import tracemalloc
+
+from .utils import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--checkpoints', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from core.views import DatatablesListView
+    from tests.models import TestPerson
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender', 'birth_date']
+
+    view = PersonListView()
+    columns = view.table_spec.columns
+    birth_date = datetime.date(2000, 1, 1)
+    checkpoint_every = max(args.rows // args.checkpoints, 1)
+
+    def draws():
+        # The same view object draws every page, like a long lived view
+        for start in range(0, args.rows, args.page_size):
+            end = min(start + args.page_size, args.rows)
+            yield [
+                TestPerson(id=pk, name='Person %s' % pk, gender='MALE',
+                           birth_date=birth_date)
+                for pk in range(start, end)
+            ]
+
+    def fields_data():
+        # How the values were cached before the row cache
+        cache = {}
+        for page in draws():
+            for obj in page:
+                for column in columns:
+                    key = f'{column.field.name}-{obj.pk}'
+                    try:
+                        cache[key]
+                    except KeyError:
+                        cache[key] = getattr(obj, column.field.name)
+            yield page[-1].pk + 1
+
+    def row_cache():
+        for page in draws():
+            view.reset_row_values()
+            for obj in page:
+                for column in columns:
+                    view.evaluate_data(obj, column.field)
+            yield page[-1].pk + 1
+
+    for name, func in (('fields_data', fields_data), ('row_cache', row_cache)):
+        tracemalloc.start()
+        next_checkpoint = checkpoint_every
+        for rows in func():
+            if rows >= next_checkpoint:
+                current, peak = tracemalloc.get_traced_memory()
+                print("%-12s %9d rows %10.1f KiB current %10.1f KiB peak" % (
+                    name, rows, current / 1024, peak / 1024
+                ))
+                next_checkpoint += checkpoint_every
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
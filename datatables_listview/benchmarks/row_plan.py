@@ -0,0 +1,164 @@
+"""
+Microbenchmark of the per-row cost of reading the values of a row (The cells,
+the conditions and the url params of the options), comparing a copy of the
+code used before the TableSpec (BaselineRowReader: the fields_data cache with
+string keys, _meta.get_field by option param and condition and the dict
+lookups of options_list) against the compiled spec. The rendering of the
+cells and the options isn't measured, it's the same in both.
+
+Run it from the datatables_listview directory:
+
+    python -m benchmarks.row_plan --rows 1000
+"""
+import argparse
+
+from .utils import setup_django, timeit
+
+
+class BaselineRowReader:
+    """
+    Copy of the methods of DatatablesListView that read the rows before the
+    TableSpec, without the permissions and the rendering
+    """
+
+    def __init__(self, view_class):
+        self.model = view_class.model
+        self.fields = view_class.fields
+        self.options_list = view_class.options_list
+        self.fields_data = {}
+
+    def get_fields(self):
+        return [self.model._meta.get_field(field) for field in self.fields]
+
+    def get_obj_data(self, obj):
+        return [self.evaluate_data(obj, field) for field in self.get_fields()]
+
+    def get_url_params(self, obj):
+        urls_params = []
+        for option_conf in self.options_list:
+            try:
+                permissions = option_conf['permissions']
+            except KeyError:
+                permissions = None
+
+            try:
+                conditions = option_conf['conditions']
+            except KeyError:
+                conditions = None
+
+            if self.evaluate_conditions(obj, permissions, conditions):
+                params = []
+                for param in option_conf['url_params']:
+                    field = self.model._meta.get_field(param)
+                    field_data = self.evaluate_data(obj, field)
+                    params.append(field_data)
+                urls_params.append(params)
+        return urls_params
+
+    def evaluate_conditions(self, obj, permissions, conditions):
+        if conditions:
+            for contition in conditions:
+                field_name = contition['field']
+                field = self.model._meta.get_field(field_name)
+                field_value = self.evaluate_data(obj, field)
+                condition_values = contition['condition_values']
+                condition_func = contition['condition_func']
+                result = condition_func(field_value, condition_values)
+                if not result:
+                    return False
+        return True
+
+    def evaluate_data(self, obj, field):
+        try:
+            value = self.fields_data[f'{field.name}-{obj.pk}']
+            return value
+        except KeyError:
+            pass
+
+        if field.choices:
+            value = getattr(obj, 'get_%s_display' % field.name)()
+        elif field.many_to_many:
+            value = getattr(obj, field.name)
+            if type(value) == list:
+                value = ", ".join(value)
+            else:
+                qs_objects = getattr(obj, field.name).all()
+                value = ", ".join([str(obj) for obj in qs_objects])
+            return value
+        else:
+            value = getattr(obj, field.name)
+
+        self.fields_data[f'{field.name}-{obj.pk}'] = value
+        return value
+
+    def validate_options(self):
+        # The validation done by the __init__ of every view
+        for option in self.options_list:
+            for key in ('option_label', 'option_url', 'url_params'):
+                option[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from model_mommy import mommy
+    from core.views import DatatablesListView
+    from tests.models import TestPerson
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender', 'birth_date', 'dog']
+        options_list = [
+            {
+                'option_label': 'Option %s' % counter,
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'conditions': [
+                    {
+                        'field': 'gender',
+                        'condition_values': ['MALE', 'FEMALE'],
+                        'condition_func': lambda value, values: value in values
+                    }
+                ]
+            }
+            for counter in range(5)
+        ]
+
+    mommy.make_recipe('tests.test_person', _quantity=args.rows)
+    view = PersonListView()
+    objects = list(view.apply_query_plan(view.get_queryset()))
+
+    def baseline():
+        # A new reader by draw, like the views
+        reader = BaselineRowReader(PersonListView)
+        for obj in objects:
+            reader.get_obj_data(obj)
+            reader.get_url_params(obj)
+
+    def table_spec():
+        view.reset_row_values()
+        for obj in objects:
+            for column in view.table_spec.columns:
+                view.evaluate_data(obj, column.field)
+            for option in view.table_spec.options:
+                if view.evaluate_conditions(obj, (), option.conditions):
+                    for column in option.url_params:
+                        view.evaluate_data(obj, column.field)
+
+    def baseline_init():
+        BaselineRowReader(PersonListView).validate_options()
+
+    for name, func in (('baseline', baseline), ('table_spec', table_spec)):
+        elapsed = timeit(func)
+        print("%-15s %8.2f us/row" % (name, elapsed / len(objects) * 1e6))
+    for name, func in (
+        ('baseline_init', baseline_init), ('table_spec_init', PersonListView)
+    ):
+        elapsed = timeit(func)
+        print("%-15s %8.2f us/view" % (name, elapsed * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import time
+
+
+def setup_django():
+    """
+    Configures Django with the test settings and creates the test tables in
+    the in-memory database, the benchmarks use the test models
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.testsettings")
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def timeit(func, repeat=5):
+    """
+    Runs func several times and returns the best time in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
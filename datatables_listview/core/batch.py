@@ -0,0 +1,157 @@
+import copy
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.exceptions import ImproperlyConfigured, SuspiciousOperation
+from django.http import Http404, HttpResponse, QueryDict
+from django.views.generic import View
+
+from .serializers import get_json_serializer
+from .views import get_request_context, run_in_own_connection
+
+
+class BatchDrawView(View):
+    """
+    View that serves the draws of several tables of a page in one request,
+    the body is a JSON object with the name of each table and its draw params
+    as a query string (What datatables_pipeline.js sends to the view of the
+    table) and the response has the data of each table by name. It's used by
+    $.fn.dataTable.batch in datatables_batch.js.
+
+    The middlewares and the user run once for all the tables and the
+    permissions of the options are shared between them. The dispatch of each
+    table runs before the draws, so its access mixins (LoginRequiredMixin,
+    PermissionRequiredMixin...) and overrides are applied as in its own
+    requests, the response of the first table that denies the access is the
+    response of the batch. With
+    concurrent_queries each table is served in its own thread with its own
+    database connection (And the script prefix, the urlconf and the language
+    of the request), so they don't see the changes of a transaction that
+    isn't committed.
+
+    - tables: The DatatablesListView classes by name
+    - max_tables: Tables accepted by request
+    """
+    tables = None
+    max_tables = 10
+    concurrent_queries = False
+    json_serializer = None
+
+    def get_tables(self):
+        if self.tables is None:
+            raise ImproperlyConfigured(
+                "%(cls)s is missing the tables. Define %(cls)s.tables with "
+                "the DatatablesListView classes by name" % {
+                    'cls': self.__class__.__name__
+                }
+            )
+        return self.tables
+
+    def get_draws(self, request):
+        """
+        Method to read the draws of the body, a dictionary with the query
+        string of each table by name
+        """
+        try:
+            draws = json.loads(request.body)
+        except ValueError:
+            raise SuspiciousOperation("The body of the batch isn't valid JSON")
+        if not isinstance(draws, dict) or not all(
+            isinstance(query_string, str) for query_string in draws.values()
+        ):
+            raise SuspiciousOperation(
+                "The body of the batch must be an object with the query "
+                "string of each table"
+            )
+        if len(draws) > self.max_tables:
+            raise SuspiciousOperation(
+                "The batch has %s tables, the maximum is %s" % (
+                    len(draws), self.max_tables
+                )
+            )
+        tables = self.get_tables()
+        for name in draws:
+            if name not in tables:
+                raise Http404("Unknown table %s" % name)
+        return draws
+
+    def get_table_request(self, request, query_string):
+        table_request = copy.copy(request)
+        table_request.method = 'GET'
+        table_request.GET = QueryDict(query_string)
+        return table_request
+
+    def get_table_view(self, name, table_request, shared_permissions):
+        view = self.get_tables()[name]()
+        if hasattr(view, 'setup'):
+            view.setup(table_request)
+        else:
+            view.request = table_request
+            view.args = ()
+            view.kwargs = {}
+        view.shared_permissions = shared_permissions
+        return view
+
+    def check_table_access(self, view):
+        """
+        Runs the dispatch of the table with a handler that only grants the
+        access, it returns the response of the table when it's denied. The
+        tables that aren't a View have no dispatch to run
+        """
+        if not hasattr(view, 'dispatch'):
+            return None
+        granted = HttpResponse()
+        view.get = lambda request, *args, **kwargs: granted
+        try:
+            response = view.dispatch(view.request, *view.args, **view.kwargs)
+        finally:
+            del view.get
+        return None if response is granted else response
+
+    def generate_table_data(self, view):
+        return view.generate_ajax_data(view.request)
+
+    def post(self, request, *args, **kwargs):
+        draws = self.get_draws(request)
+        # The user is loaded once, before the threads
+        user = getattr(request, 'user', None)
+        if user is not None:
+            user.is_authenticated
+        shared_permissions = {}
+        views = {
+            name: self.get_table_view(
+                name, self.get_table_request(request, query_string),
+                shared_permissions
+            )
+            for name, query_string in draws.items()
+        }
+        for view in views.values():
+            response = self.check_table_access(view)
+            if response is not None:
+                return response
+        if self.concurrent_queries and len(views) > 1:
+            context = get_request_context()
+            with ThreadPoolExecutor(max_workers=len(views)) as executor:
+                futures = {
+                    name: executor.submit(
+                        run_in_own_connection, self.generate_table_data, view,
+                        context=context
+                    )
+                    for name, view in views.items()
+                }
+                data = {
+                    name: future.result() for name, future in futures.items()
+                }
+        else:
+            data = {
+                name: self.generate_table_data(view)
+                for name, view in views.items()
+            }
+        serializer = self.json_serializer or get_json_serializer()
+        response = HttpResponse(
+            serializer.dumps(data), content_type=serializer.content_type
+        )
+        for view in views.values():
+            if view.draw_stats is not None:
+                view.finish_draw_stats(response)
+        return response
@@ -0,0 +1,74 @@
+import threading
+from hashlib import md5
+
+from django.core.cache import caches
+
+
+class Flight:
+    """
+    A computation in progress, the requests that arrive meanwhile wait for it
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces the identical draws that run at the same time in the process,
+    the first one computes the data and the others wait for it and get the
+    same result. With cache_alias the results are also kept in that cache for
+    timeout seconds, so the identical draws of other processes reuse them
+    """
+
+    def __init__(self, cache_alias=None, timeout=2):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def get_cache_key(self, key):
+        return "datatables_listview:single-flight:%s" % md5(
+            repr(key).encode()
+        ).hexdigest()
+
+    def run(self, key, func):
+        with self.lock:
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.in_flight[key] = flight
+            else:
+                flight.waiters += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.compute(key, func)
+            return flight.result
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight.done.set()
+
+    def compute(self, key, func):
+        if self.cache_alias is None:
+            return func()
+        cache = caches[self.cache_alias]
+        cache_key = self.get_cache_key(key)
+        result = cache.get(cache_key)
+        if result is None:
+            result = func()
+            cache.set(cache_key, result, self.timeout)
+        return result
@@ -0,0 +1,114 @@
+import re
+from hashlib import md5
+
+from django.core.cache import caches
+from django.db import connections
+
+from .utils import get_model_version, normalize_draw_filters
+
+
+class ExactCount:
+    """
+    Count strategy for the recordsTotal and recordsFiltered of the draws, this
+    one does a COUNT(*) every time
+    """
+
+    def count_total(self, view, queryset):
+        return queryset.count()
+
+    def count_filtered(self, view, queryset, draw_params):
+        return queryset.count()
+
+
+class CachedCount(ExactCount):
+    """
+    Count strategy that keeps the counts in the Django's cache framework, the
+    filtered counts are keyed by the normalized search and column filters and
+    the total count is kept longer. All of them are invalidated when an object
+    of the view model is saved or deleted (See get_model_version).
+
+    The keys only have the view class and the filters, if the queryset of the
+    view depends on the request (The user, for example) override get_cache_key
+    """
+
+    def __init__(self, timeout=60, total_timeout=600, cache_alias='default'):
+        self.timeout = timeout
+        self.total_timeout = total_timeout
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_cache_key(self, view, filters):
+        version = get_model_version(view.model, self.cache_alias)
+        digest = md5(repr(filters).encode()).hexdigest()
+        return "datatables_listview:count:%s.%s:%s:%s" % (
+            view.__class__.__module__, view.__class__.__qualname__,
+            version, digest
+        )
+
+    def get_or_count(self, view, queryset, filters, timeout):
+        key = self.get_cache_key(view, filters)
+        count = self.cache.get(key)
+        if count is None:
+            count = queryset.count()
+            self.cache.set(key, count, timeout)
+        return count
+
+    def count_total(self, view, queryset):
+        return self.get_or_count(view, queryset, None, self.total_timeout)
+
+    def count_filtered(self, view, queryset, draw_params):
+        return self.get_or_count(
+            view, queryset, normalize_draw_filters(draw_params), self.timeout
+        )
+
+
+class ApproximateCount(ExactCount):
+    """
+    Count strategy that uses the estimates of the PostgreSQL planner, the total
+    count is taken from pg_class.reltuples and the filtered count from the rows
+    of the EXPLAIN of the query. The estimates are only used above threshold,
+    smaller sets are counted exactly. In other databases it's an exact count
+    """
+    explain_rows_re = re.compile(r"rows=(\d+)")
+
+    def __init__(self, threshold=100000):
+        self.threshold = threshold
+
+    def is_postgresql(self, queryset):
+        return connections[queryset.db].vendor == 'postgresql'
+
+    def estimate_total(self, queryset):
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 (0 before PostgreSQL 14) if the table has never
+        # been analyzed
+        return int(row[0]) if row else -1
+
+    def estimate_filtered(self, queryset):
+        match = self.explain_rows_re.search(queryset.explain())
+        return int(match.group(1)) if match else -1
+
+    def count_total(self, view, queryset):
+        if self.is_postgresql(queryset):
+            if queryset.query.where:
+                # The queryset of the view is already filtered
+                estimate = self.estimate_filtered(queryset)
+            else:
+                estimate = self.estimate_total(queryset)
+            if estimate >= self.threshold:
+                return estimate
+        return super().count_total(view, queryset)
+
+    def count_filtered(self, view, queryset, draw_params):
+        if self.is_postgresql(queryset):
+            estimate = self.estimate_filtered(queryset)
+            if estimate >= self.threshold:
+                return estimate
+        return super().count_filtered(view, queryset, draw_params)
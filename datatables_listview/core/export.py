@@ -0,0 +1,105 @@
+import csv
+import datetime
+import json
+import tempfile
+from decimal import Decimal
+from wsgiref.util import FileWrapper
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class Echo:
+    """
+    Pseudo buffer for the csv writer, it returns the written rows instead of
+    keeping them. See the streaming CSV example of the Django docs
+    """
+
+    def write(self, value):
+        return value
+
+
+class CSVEncoder:
+    content_type = 'text/csv'
+    extension = 'csv'
+
+    def encode(self, header, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """
+    Encodes the types of the DjangoJSONEncoder (Dates in ISO format, decimals,
+    UUIDs) and the other values (Related objects, files) as text
+    """
+
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            return str(o)
+
+
+class NDJSONEncoder:
+    """
+    Encodes the rows as JSON Lines, one object by row with the header as keys
+    """
+    content_type = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def encode(self, header, rows):
+        for row in rows:
+            yield json.dumps(
+                dict(zip(header, row)), cls=ExportJSONEncoder
+            ) + "\n"
+
+
+class XLSXEncoder:
+    """
+    Encodes the rows as an Excel file with XlsxWriter in constant memory mode,
+    the rows are flushed to a temporary file while they are written so the
+    memory doesn't grow with the rows. The file is streamed when it's complete
+    because a XLSX is a zip file
+    """
+    content_type = (
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    extension = 'xlsx'
+    block_size = 8192
+
+    def encode(self, header, rows):
+        try:
+            import xlsxwriter
+        except ImportError:
+            raise ImproperlyConfigured(
+                "The xlsx export needs XlsxWriter, install it with "
+                "pip install XlsxWriter"
+            )
+        output = tempfile.TemporaryFile()
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, header)
+        for counter, row in enumerate(rows, start=1):
+            worksheet.write_row(counter, 0, [self.cell(value) for value in row])
+        workbook.close()
+        output.seek(0)
+        return FileWrapper(output, self.block_size)
+
+    def cell(self, value):
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return str(value)
+
+
+EXPORT_ENCODERS = {
+    'csv': CSVEncoder(),
+    'xlsx': XLSXEncoder(),
+    'ndjson': NDJSONEncoder(),
+}
@@ -0,0 +1,110 @@
+import threading
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.dispatch import Signal
+
+# Sent when an instrumented draw is served, with the view and its DrawStats
+draw_finished = Signal()
+
+# The stage being measured in the thread, the template renders are counted
+# for it
+_local = threading.local()
+
+
+def record_template_render():
+    stage = getattr(_local, 'stage', None)
+    if stage is not None:
+        stage.templates += 1
+
+
+class Stage:
+    """
+    Measures a stage of a draw, its duration and the queries and template
+    renders done meanwhile
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.duration = 0
+        self.queries = 0
+        self.templates = 0
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.exit_stack = ExitStack()
+        for connection in connections.all():
+            self.exit_stack.enter_context(
+                connection.execute_wrapper(self.count_query)
+            )
+        self.parent = getattr(_local, 'stage', None)
+        _local.stage = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration += time.perf_counter() - self.start
+        _local.stage = self.parent
+        self.exit_stack.close()
+
+
+class NullStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class DrawStats:
+    """
+    Stages of an instrumented draw, in the order they ran
+    """
+
+    def __init__(self, draw_params=None):
+        self.draw_params = draw_params
+        self.stages = {}
+
+    def stage(self, name):
+        try:
+            return self.stages[name]
+        except KeyError:
+            stage = Stage(name)
+            self.stages[name] = stage
+            return stage
+
+    @property
+    def duration(self):
+        return sum(stage.duration for stage in self.stages.values())
+
+    @property
+    def queries(self):
+        return sum(stage.queries for stage in self.stages.values())
+
+    def as_dict(self):
+        return {
+            name: {
+                'duration': round(stage.duration * 1000, 3),
+                'queries': stage.queries,
+                'templates': stage.templates
+            }
+            for name, stage in self.stages.items()
+        }
+
+    def server_timing(self):
+        """
+        Gets the value of the Server-Timing header, the durations are in
+        milliseconds
+        """
+        return ", ".join(
+            "%s;dur=%.3f" % (name, stage.duration * 1000)
+            for name, stage in self.stages.items()
+        )
@@ -0,0 +1,468 @@
+import threading
+import time
+from array import array
+from itertools import islice
+from uuid import UUID
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .search import IContainsSearch
+from .spec import FK, M2M
+from .utils import (
+    DATE_FIELD_TYPES, INTEGER_FIELD_TYPES, NUMBER_FIELD_TYPES, ValuesRow,
+    chunked, normalize_search_text, parse_date, parse_integer, parse_number
+)
+
+
+def make_column(values):
+    """
+    Makes a compact column of the values, an array when all of them are
+    integers or floats and a list otherwise
+    """
+    if values and all(type(value) is int for value in values):
+        try:
+            return array('q', values)
+        except OverflowError:
+            return list(values)
+    if values and all(type(value) is float for value in values):
+        return array('d', values)
+    return list(values)
+
+
+def set_value(column, position, value):
+    """
+    Sets the value of a position of the column, or appends it after the last
+    one. Returns the column, it's converted to a list when the value doesn't
+    fit in the array anymore (A None, for example)
+    """
+    try:
+        if position == len(column):
+            column.append(value)
+        else:
+            column[position] = value
+        return column
+    except (TypeError, OverflowError):
+        return set_value(list(column), position, value)
+
+
+def get_search_value(field_type, value):
+    # The values compared by the search, the text is kept in lower case and
+    # the dates of the datetimes in the current time zone like the __date
+    # lookup
+    if value is None:
+        return None
+    if field_type == 'DateTimeField':
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    if field_type in DATE_FIELD_TYPES or field_type == 'choices':
+        return value
+    if field_type in INTEGER_FIELD_TYPES | NUMBER_FIELD_TYPES:
+        return value
+    if field_type == 'UUIDField':
+        return value
+    return str(value).lower()
+
+
+class MemoryTable:
+    """
+    The rows of a view loaded in columns, a column by attname with the values
+    in the order of the pks and a search column by searched field. The sort
+    permutations (The positions of the rows sorted by a column and the pk)
+    are computed the first time a column is sorted and kept until the rows
+    change. The nulls go first in the ascending order and the text is sorted
+    by code points, like the C collation
+    """
+
+    def __init__(self, names, search_fields):
+        self.names = names
+        self.search_fields = search_fields
+        self.lock = threading.RLock()
+        self.loaded_at = time.monotonic()
+        self.pks = []
+        self.positions = {}
+        self.columns = {}
+        self.search_columns = {}
+        self.permutations = {}
+
+    def load(self, rows):
+        rows = list(rows)
+        self.pks = make_column([row[0] for row in rows])
+        self.positions = {pk: position for position, pk in enumerate(self.pks)}
+        for index, name in enumerate(self.names, 1):
+            self.columns[name] = make_column([row[index] for row in rows])
+        for name, field_type in self.search_fields:
+            self.search_columns[name] = [
+                get_search_value(field_type, value)
+                for value in self.get_column(name)
+            ]
+        self.permutations = {}
+
+    def __len__(self):
+        return len(self.pks)
+
+    def get_column(self, name):
+        # The pk is kept apart from the other columns
+        return self.pks if name == 'pk' else self.columns[name]
+
+    def set_row(self, row):
+        pk = row[0]
+        position = self.positions.get(pk, len(self.pks))
+        self.pks = set_value(self.pks, position, pk)
+        self.positions[pk] = position
+        for index, name in enumerate(self.names, 1):
+            self.columns[name] = set_value(
+                self.columns[name], position, row[index]
+            )
+        for name, field_type in self.search_fields:
+            self.search_columns[name] = set_value(
+                self.search_columns[name], position,
+                get_search_value(field_type, self.get_column(name)[position])
+            )
+        self.permutations = {}
+
+    def delete_row(self, pk):
+        # The last row takes the place of the deleted one
+        position = self.positions.pop(pk, None)
+        if position is None:
+            return
+        last = len(self.pks) - 1
+        columns = [self.pks] + list(self.columns.values()) + list(
+            self.search_columns.values()
+        )
+        for column in columns:
+            column[position] = column[last]
+            del column[last]
+        if position != last:
+            self.positions[self.pks[position]] = position
+        self.permutations = {}
+
+    def get_permutation(self, name):
+        """
+        Gets the positions of the rows sorted by the column and the pk, the
+        nulls first like in the ascending order of SQLite
+        """
+        try:
+            return self.permutations[name]
+        except KeyError:
+            pass
+        pks = self.pks
+        if name == 'pk':
+            permutation = sorted(range(len(pks)), key=pks.__getitem__)
+        else:
+            column = self.get_column(name)
+            permutation = sorted(
+                range(len(pks)),
+                key=lambda position: (
+                    column[position] is not None, column[position],
+                    pks[position]
+                )
+            )
+        permutation = array('q', permutation)
+        self.permutations[name] = permutation
+        return permutation
+
+    def sort(self, sort_keys):
+        """
+        Gets the positions of all the rows sorted by the sort keys, a list of
+        (name, descending). A single column uses its permutation, several
+        columns are sorted with a stable sort by each one from the last
+        """
+        name, descending = sort_keys[0]
+        if len(sort_keys) == 1 or sort_keys[1:] == [('pk', descending)]:
+            permutation = self.get_permutation(name)
+            return reversed(permutation) if descending else permutation
+        positions = list(range(len(self.pks)))
+        for name, descending in reversed(sort_keys):
+            column = self.get_column(name)
+            positions.sort(
+                key=lambda position: (
+                    column[position] is not None, column[position]
+                ),
+                reverse=descending
+            )
+        return positions
+
+    def search(self, field_lookups, search_text):
+        """
+        Gets a mask of the rows that match any word of the search in any
+        field, with the criteria of the SearchCompiler. field_lookups are
+        (name, field type, choices, prefix) tuples
+        """
+        mask = bytearray(len(self.pks))
+        for word in normalize_search_text(search_text).split():
+            for name, field_type, choices, prefix in field_lookups:
+                match = get_word_matcher(field_type, choices, word, prefix)
+                if match is None:
+                    continue
+                for position, value in enumerate(self.search_columns[name]):
+                    if (
+                        value is not None and not mask[position]
+                        and match(value)
+                    ):
+                        mask[position] = 1
+        return mask
+
+    def get_page(self, sort_keys, start, end, mask=None):
+        """
+        Gets the number of rows in the mask (Or of all the rows) and the
+        positions of the rows between start and end once sorted
+        """
+        positions = self.sort(sort_keys)
+        if mask is None:
+            return len(self.pks), list(islice(positions, start, end))
+        matched = (position for position in positions if mask[position])
+        return mask.count(1), list(islice(matched, start, end))
+
+    def get_row(self, position):
+        return ValuesRow(self.pks[position], {
+            name: column[position] for name, column in self.columns.items()
+        })
+
+
+def get_word_matcher(field_type, choices, word, prefix=False):
+    # The Python version of SearchCompiler.get_search_criteria
+    if field_type == 'choices':
+        keys = {key for display, key in choices.items() if word in display}
+        if keys:
+            return keys.__contains__
+    elif field_type in INTEGER_FIELD_TYPES:
+        value = parse_integer(word)
+        if value is not None:
+            return value.__eq__
+    elif field_type in NUMBER_FIELD_TYPES:
+        value = parse_number(word)
+        if value is not None:
+            if field_type == 'FloatField':
+                value = float(value)
+            return lambda field_value: field_value == value
+    elif field_type in DATE_FIELD_TYPES:
+        if len(word) == 4 and word.isdigit():
+            year = int(word)
+            return lambda field_value: field_value.year == year
+        value = parse_date(word)
+        if value:
+            return value.__eq__
+    elif field_type == 'UUIDField':
+        try:
+            return UUID(word).__eq__
+        except ValueError:
+            pass
+    elif prefix:
+        return lambda field_value: field_value.startswith(word)
+    else:
+        return lambda field_value: word in field_value
+    return None
+
+
+class OversizedTable:
+    """
+    Placeholder of a table with more than max_rows rows, it's false so the
+    draws use the database. The rows are counted again after max_age seconds
+    """
+
+    def __init__(self):
+        self.loaded_at = time.monotonic()
+
+    def __bool__(self):
+        return False
+
+
+class MemoryEngine:
+    """
+    Engine that serves the draws of a view from its rows loaded in memory,
+    for the tables with some thousands of rows that change rarely. The
+    concrete columns of the view are loaded the first time in compact
+    columns (Arrays of integers and floats, lists otherwise), and the search,
+    the counts, the ordering and the slicing of each draw are done in memory.
+    Only the objects of the page are read from the database to be rendered.
+
+    The loaded rows are updated one by one with the post_save and post_delete
+    signals of the model once the transaction is committed, and all of them
+    are loaded again after max_age seconds (When the table is also changed
+    by other means, like bulk updates). Tables with more than max_rows rows
+    aren't loaded.
+
+    The draws that can't be done in memory use the database: the column
+    filters, the search backends other than IContainsSearch and the
+    orderings by columns that aren't loaded (Relations to many). The rows are
+    shared by all the requests, so the queryset of the view mustn't depend on
+    the request. Each process has its own copy
+    """
+
+    def __init__(self, max_age=None, max_rows=500000, chunk_size=5000):
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.tables = {}
+
+    def get_column_names(self, view):
+        names = [
+            column.attname for column in view.table_spec.columns
+            if column.field.concrete and column.kind != M2M
+        ]
+        if view.row_cache_version_field:
+            names.append(view.model._meta.get_field(
+                view.row_cache_version_field
+            ).attname)
+        pk_attname = view.model._meta.pk.attname
+        return [
+            name for index, name in enumerate(names)
+            if name not in names[:index] and name != pk_attname
+        ]
+
+    def get_attname(self, view, field_name):
+        field = view.model._meta.get_field(field_name)
+        return 'pk' if field.primary_key else field.attname
+
+    def get_search_fields(self, view):
+        search_compiler = view.table_spec.search_compiler
+        return [
+            (self.get_attname(view, name), field_type)
+            for name, field_type, _ in search_compiler.field_lookups
+        ]
+
+    def fetch_rows(self, view, names, pks=None):
+        queryset = view.get_queryset()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        return queryset.values_list('pk', *names).iterator(
+            chunk_size=self.chunk_size
+        )
+
+    def get_table(self, view):
+        """
+        Gets the table of the view, it's loaded the first time and when it's
+        older than max_age. None when the table has too many rows
+        """
+        view_class = view.__class__
+        table = self.tables.get(view_class)
+        if table is not None and (
+            self.max_age is None
+            or time.monotonic() - table.loaded_at < self.max_age
+        ):
+            return table or None
+        with self.lock:
+            if self.tables.get(view_class) is not table:
+                return self.tables[view_class] or None
+            if view.get_queryset().count() > self.max_rows:
+                self.tables[view_class] = OversizedTable()
+                return None
+            names = self.get_column_names(view)
+            table = MemoryTable(names, self.get_search_fields(view))
+            table.load(self.fetch_rows(view, names))
+            if not self.tables.get(view_class):
+                self.connect(view_class)
+            self.tables[view_class] = table
+        return table
+
+    def get_sort_keys(self, view, draw_params):
+        sort_keys = []
+        pk_name = view.model._meta.pk.name
+        for criteria in view.get_ordering(draw_params):
+            descending = criteria.startswith("-")
+            name = criteria.lstrip("-")
+            if name not in ('pk', pk_name):
+                column = view.table_spec.columns_by_name.get(name)
+                if (
+                    column is None or column.kind == M2M
+                    or not column.field.concrete
+                ):
+                    return None
+                if column.kind == FK and (
+                    column.field.related_model._meta.ordering
+                ):
+                    # Sorted by the ordering of the related model
+                    return None
+                name = column.attname
+            else:
+                name = 'pk'
+            sort_keys.append((name, descending))
+        return sort_keys
+
+    def get_page(self, view, draw_params):
+        """
+        Gets the total count, the filtered count and the rows of the page
+        (ValuesRow with the pk and the loaded columns) of the draw, or None
+        when it can't be done in memory
+        """
+        if draw_params.column_filters:
+            return None
+        if draw_params.search and not isinstance(
+            view.get_search_backend(), IContainsSearch
+        ):
+            return None
+        sort_keys = self.get_sort_keys(view, draw_params)
+        if sort_keys is None:
+            return None
+        table = self.get_table(view)
+        if table is None:
+            return None
+        search_compiler = view.table_spec.search_compiler
+        field_lookups = [
+            (
+                self.get_attname(view, name), field_type, choices,
+                name in search_compiler.prefix_fields
+            )
+            for name, field_type, choices in search_compiler.field_lookups
+        ]
+        with table.lock:
+            total_count = len(table)
+            mask = None
+            if draw_params.search:
+                mask = table.search(field_lookups, draw_params.search)
+            filtered_count, positions = table.get_page(
+                sort_keys, draw_params.start, draw_params.end, mask
+            )
+            page = [table.get_row(position) for position in positions]
+        return total_count, filtered_count, page
+
+    @property
+    def dispatch_uid(self):
+        return "datatables_listview_memory_%s" % id(self)
+
+    def connect(self, view_class):
+        dispatch_uid = "%s_%s.%s" % (
+            self.dispatch_uid, view_class.__module__, view_class.__qualname__
+        )
+
+        def on_change(sender, instance, **kwargs):
+            pk = instance.pk
+            transaction.on_commit(
+                lambda: self.refresh_rows(view_class, [pk]),
+                using=kwargs.get('using')
+            )
+
+        post_save.connect(
+            on_change, sender=view_class.model, weak=False,
+            dispatch_uid=dispatch_uid
+        )
+        post_delete.connect(
+            on_change, sender=view_class.model, weak=False,
+            dispatch_uid=dispatch_uid
+        )
+
+    def refresh_rows(self, view_class, pks):
+        """
+        Loads again the rows with the given pks, the ones that don't exist
+        anymore (Or aren't part of the queryset of the view) are removed
+        """
+        table = self.tables.get(view_class)
+        if not table:
+            return
+        view = view_class()
+        rows = {}
+        for chunk in chunked(pks, self.chunk_size):
+            rows.update(
+                (row[0], row)
+                for row in self.fetch_rows(view, table.names, chunk)
+            )
+        with table.lock:
+            for pk in pks:
+                if pk in rows:
+                    table.set_row(rows[pk])
+                else:
+                    table.delete_row(pk)
@@ -0,0 +1,126 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from hashlib import md5
+
+from django.core.cache import caches
+
+from .views import get_request_context, run_in_own_connection
+
+
+class WindowPrefetcher:
+    """
+    Prefetches the windows that come after a served draw, like the next
+    request of datatables_pipeline.js (Same ordering and filters, start +
+    length). They are generated in background threads, with the script
+    prefix, the urlconf and the language of the request and a view created
+    with the same initkwargs, and kept in the cache so the next request of
+    the pipeline is a cache hit.
+
+    - depth: Windows prefetched after each draw
+    - max_windows: Windows kept by the process, the oldest are evicted
+    - timeout: Seconds a window is kept, the changes of the rows aren't seen
+      by the prefetched windows until it expires
+    """
+
+    def __init__(self, depth=1, max_windows=50, timeout=30,
+                 cache_alias='default', max_workers=2):
+        self.depth = depth
+        self.max_windows = max_windows
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.windows = OrderedDict()
+        self.futures = {}
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_cache_key(self, draw_key):
+        return "datatables_listview:window:%s" % md5(
+            repr(draw_key).encode()
+        ).hexdigest()
+
+    def get(self, view, draw_params):
+        """
+        Gets the prefetched data of the draw or None
+        """
+        final_data = self.cache.get(
+            self.get_cache_key(view.get_draw_key(draw_params))
+        )
+        if final_data is None:
+            return None
+        return dict(final_data, draw=draw_params.draw)
+
+    def schedule(self, view, request, draw_params, final_data):
+        """
+        Schedules the prefetch of the windows after the served draw
+        """
+        length = draw_params.end - draw_params.start
+        if length <= 0:
+            return
+        for counter in range(1, self.depth + 1):
+            start = draw_params.start + length * counter
+            if start >= final_data['recordsFiltered']:
+                return
+            window_params = draw_params._replace(
+                start=start, end=start + length
+            )
+            cache_key = self.get_cache_key(view.get_draw_key(window_params))
+            with self.lock:
+                expires = self.windows.get(cache_key, 0)
+                if cache_key in self.futures or expires > time.monotonic():
+                    continue
+                self.futures[cache_key] = self.executor.submit(
+                    run_in_own_connection, self.prefetch, view, request,
+                    window_params, cache_key, context=get_request_context()
+                )
+
+    def get_window_request(self, request, window_params):
+        window_request = copy.copy(request)
+        window_request.GET = request.GET.copy()
+        window_request.GET['start'] = str(window_params.start)
+        window_request.GET['length'] = str(
+            window_params.end - window_params.start
+        )
+        return window_request
+
+    def prefetch(self, view, request, window_params, cache_key):
+        # Runs in a thread of the executor with its own database connections
+        # and the context of the request, the window view is configured like
+        # the view of the request
+        try:
+            window_view = view.__class__(**view.initkwargs)
+            window_view.request = request
+            window_view.args = getattr(view, 'args', ())
+            window_view.kwargs = getattr(view, 'kwargs', {})
+            final_data = window_view.generate_data(
+                self.get_window_request(request, window_params)
+            )
+            self.cache.set(cache_key, final_data, self.timeout)
+            self.remember(cache_key)
+        finally:
+            with self.lock:
+                self.futures.pop(cache_key, None)
+
+    def remember(self, cache_key):
+        with self.lock:
+            self.windows.pop(cache_key, None)
+            self.windows[cache_key] = time.monotonic() + self.timeout
+            evicted = []
+            while len(self.windows) > self.max_windows:
+                evicted.append(self.windows.popitem(last=False)[0])
+        if evicted:
+            self.cache.delete_many(evicted)
+
+    def wait(self):
+        """
+        Waits for the prefetches in progress
+        """
+        with self.lock:
+            futures = list(self.futures.values())
+        wait(futures)
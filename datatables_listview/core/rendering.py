@@ -0,0 +1,194 @@
+import re
+from urllib.parse import quote
+
+from django.template.loader import render_to_string as _render_to_string
+from django.urls import NoReverseMatch, reverse
+from django.utils.html import escape
+from django.utils.http import RFC3986_SUBDELIMS
+from django.utils.safestring import mark_safe
+
+from .instrumentation import record_template_render
+
+OPTIONS_TEMPLATE = "datatables_listview/options_list_rendering_tool.html"
+URL_TEMPLATE = "datatables_listview/url_rendering_tool.html"
+
+# The url params are reversed as digits, that way they are accepted by the
+# usual url patterns and converters, and they aren't changed by the quoting or
+# the escaping
+PARAM_SENTINEL = "8675309%03d"
+PARAM_SENTINEL_RE = re.compile(r"8675309(\d{3})")
+URL_SENTINEL = "DATATABLES-LISTVIEW-URL"
+ITEM_SENTINELS = [mark_safe("DATATABLES-LISTVIEW-ITEM-%s" % counter)
+                  for counter in range(3)]
+# Like the quoting done by reverse()
+URL_SAFE_CHARS = RFC3986_SUBDELIMS + "/~:@"
+
+
+def render_to_string(template_name, context):
+    # The renders are counted by the instrumentation of the draws
+    record_template_render()
+    return _render_to_string(template_name, context)
+
+
+def quote_url_param(param):
+    return escape(quote(str(param), safe=URL_SAFE_CHARS))
+
+
+def join_template_parts(parts):
+    """
+    Joins the consecutive strings of a list of template parts, the other parts
+    are the indexes of the url params
+    """
+    joined = []
+    for part in parts:
+        if joined and isinstance(part, str) and isinstance(joined[-1], str):
+            joined[-1] += part
+        else:
+            joined.append(part)
+    return joined
+
+
+def split_by_sentinels(text, sentinel_re):
+    """
+    Splits the text by the sentinels, it returns the literal parts and the
+    indexes of the sentinels between them
+    """
+    parts = sentinel_re.split(text)
+    return parts[::2], [int(index) for index in parts[1::2]]
+
+
+class CompiledOption:
+    """
+    An option of the view with its HTML already rendered, the url params of
+    the rows are placed by string substitution. When the url can't be reversed
+    with the sentinels (Custom converters, for example) it's reversed by row
+    """
+
+    def __init__(self, option):
+        self.option = option
+        html = render_to_string(URL_TEMPLATE, {
+            'name': option.label,
+            'url': URL_SENTINEL,
+            'icon': option.icon,
+            'confirm_modal': option.confirm_modal
+        })
+        self.html_parts = html.split(URL_SENTINEL)
+        self.url_parts = self.compile_url()
+
+    def compile_url(self):
+        params_count = len(self.option.url_params)
+        sentinels = [PARAM_SENTINEL % index for index in range(params_count)]
+        try:
+            url = reverse(self.option.url, args=sentinels)
+        except NoReverseMatch:
+            return None
+        url_parts, indexes = split_by_sentinels(escape(url), PARAM_SENTINEL_RE)
+        # Every param must appear once and in order, if a converter changed
+        # them the url is reversed by row
+        if indexes != list(range(params_count)):
+            return None
+        return url_parts
+
+    def render(self, params):
+        if self.url_parts is None:
+            url = escape(reverse(self.option.url, args=params))
+        else:
+            url_parts = self.url_parts
+            url = url_parts[0]
+            for counter, param in enumerate(params):
+                url += quote_url_param(param)
+                url += url_parts[counter + 1]
+        return mark_safe(url.join(self.html_parts))
+
+    def get_template_parts(self, param_indexes):
+        """
+        Gets the HTML of the option as a list of strings and indexes of the
+        url params, param_indexes has the index of each param of the option.
+        It's None when the url is reversed by row
+        """
+        if self.url_parts is None:
+            return None
+        url = [self.url_parts[0]]
+        for counter, url_part in enumerate(self.url_parts[1:]):
+            url += [param_indexes[counter], url_part]
+        parts = [self.html_parts[0]]
+        for html_part in self.html_parts[1:]:
+            parts += url + [html_part]
+        return join_template_parts(parts)
+
+
+class OptionRenderer:
+    """
+    Renders the options of the rows with the layouts of the templates
+    url_rendering_tool.html and options_list_rendering_tool.html compiled once,
+    so the rows are built by string substitution without rendering templates
+    or resolving urls. The HTML is the same the templates produce
+    """
+
+    def __init__(self, options):
+        self.options = [CompiledOption(option) for option in options]
+        self.compile_wrapper()
+
+    def compile_wrapper(self):
+        self.empty = render_to_string(OPTIONS_TEMPLATE, {'urls': []})
+        one, two, three = [
+            render_to_string(OPTIONS_TEMPLATE, {'urls': ITEM_SENTINELS[:count]})
+            for count in (1, 2, 3)
+        ]
+        self.compiled = False
+        parts = one.split(ITEM_SENTINELS[0])
+        if len(parts) != 2:
+            return
+        self.head, self.tail = parts
+        parts = two[len(self.head) + len(ITEM_SENTINELS[0]):].split(
+            ITEM_SENTINELS[1]
+        )
+        self.separator = parts[0]
+        # The layout must be a plain loop over the urls to be compiled,
+        # otherwise the template is rendered by row
+        self.compiled = (
+            two == self.join_urls(ITEM_SENTINELS[:2])
+            and three == self.join_urls(ITEM_SENTINELS)
+        )
+
+    def join_urls(self, urls):
+        return self.head + self.separator.join(urls) + self.tail
+
+    def render_option(self, option, params):
+        return self.options[option.index].render(params)
+
+    def get_compact_layout(self, param_columns):
+        """
+        Gets the layout used by the compact protocol to render the options in
+        the browser, the template parts of each option and the parts of the
+        wrapper. The url params of the rows are the values of param_columns.
+        It's None when the options can't be rendered by string substitution
+        """
+        if not self.compiled:
+            return None
+        param_indexes = {
+            column.name: index for index, column in enumerate(param_columns)
+        }
+        options = []
+        for compiled_option in self.options:
+            parts = compiled_option.get_template_parts([
+                param_indexes[column.name]
+                for column in compiled_option.option.url_params
+            ])
+            if parts is None:
+                return None
+            options.append(parts)
+        return {
+            'options': options,
+            'head': self.head,
+            'separator': self.separator,
+            'tail': self.tail,
+            'empty': self.empty
+        }
+
+    def render_options(self, urls):
+        if not self.compiled:
+            return render_to_string(OPTIONS_TEMPLATE, {'urls': urls})
+        if not urls:
+            return mark_safe(self.empty)
+        return mark_safe(self.join_urls(urls))
@@ -0,0 +1,276 @@
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.models import Q
+
+from .utils import chunked, get_model_version, normalize_search_text
+
+# Internal types of the fields searched as text by the PostgreSQL backends
+TEXT_FIELD_TYPES = {
+    'CharField', 'TextField', 'EmailField', 'SlugField', 'URLField',
+    'FilePathField', 'GenericIPAddressField'
+}
+
+
+def get_text_field_names(view):
+    """
+    Gets the names of the displayed fields stored as text
+    """
+    return [
+        field.name for field in view.get_fields()
+        if not field.is_relation and field.get_internal_type() in TEXT_FIELD_TYPES
+    ]
+
+
+def is_postgresql(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+class IContainsSearch:
+    """
+    Search backend that filters the queryset with a lookup by each field and
+    word, icontains for the text fields and the cheapest valid lookup for the
+    other types. The Q Objects are compiled by the SearchCompiler of the view
+    spec. It works in any database
+    """
+
+    def filter(self, view, queryset, search_text):
+        q_objects = view.table_spec.search_compiler.compile(search_text)
+        return queryset.filter(q_objects)
+
+
+class PostgresFullTextSearch:
+    """
+    Search backend that uses the PostgreSQL full text search, the rows match if
+    they contain any word of the search (As a prefix, so it works while the
+    user is typing).
+
+    With vector_field the search is done over a stored tsvector column, that
+    column can have a GIN index. Otherwise the vector is built in the query
+    from the displayed text fields. In other databases the fallback backend is
+    used
+    """
+
+    def __init__(self, vector_field=None, config='simple', fallback=None):
+        self.vector_field = vector_field
+        self.config = config
+        self.fallback = fallback or IContainsSearch()
+
+    def get_search_query(self, search_text):
+        from django.contrib.postgres.search import SearchQuery
+
+        words = [re.sub(r"[^\w]", "", word) for word in search_text.split()]
+        raw_query = " | ".join("%s:*" % word for word in words if word)
+        if not raw_query:
+            return None
+        return SearchQuery(raw_query, config=self.config, search_type='raw')
+
+    def filter(self, view, queryset, search_text):
+        if not is_postgresql(queryset):
+            return self.fallback.filter(view, queryset, search_text)
+
+        from django.contrib.postgres.search import SearchVector
+
+        search_query = self.get_search_query(search_text)
+        if search_query is None:
+            return queryset
+        if self.vector_field:
+            return queryset.filter(**{self.vector_field: search_query})
+        vector = SearchVector(*get_text_field_names(view), config=self.config)
+        return queryset.annotate(
+            _datatables_search_vector=vector
+        ).filter(_datatables_search_vector=search_query)
+
+
+class TrigramSearch:
+    """
+    Search backend that uses the trigram similarity of pg_trgm, it matches the
+    rows with any displayed text field similar to the search. The lookup can
+    use a GIN or GiST index with gin_trgm_ops/gist_trgm_ops, the similarity
+    threshold is the pg_trgm.similarity_threshold of the database.
+
+    It needs the pg_trgm extension and django.contrib.postgres in the
+    INSTALLED_APPS. In other databases the fallback backend is used
+    """
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or IContainsSearch()
+
+    def filter(self, view, queryset, search_text):
+        if not is_postgresql(queryset):
+            return self.fallback.filter(view, queryset, search_text)
+
+        q = Q()
+        for field_name in get_text_field_names(view):
+            q.add(
+                Q(**{"%s__trigram_similar" % field_name: search_text}),
+                Q.OR
+            )
+        return queryset.filter(q)
+
+
+class IndexedSearch:
+    """
+    Search backend that uses the search index of the view, a table with the
+    display values of the columns of each object already normalized, so the
+    search doesn't join the related tables. It needs core.search_index in the
+    INSTALLED_APPS.
+
+    The index is kept updated by signals connected by
+    core.search_index.index.register(view_class), call it in the ready() of
+    an AppConfig (Otherwise it's registered with the first search) and build
+    the existing rows with the rebuild_search_index command
+    """
+
+    def filter(self, view, queryset, search_text):
+        if not apps.is_installed('core.search_index'):
+            raise ImproperlyConfigured(
+                "%(cls)s uses the IndexedSearch backend, add "
+                "'core.search_index' to the INSTALLED_APPS" % {
+                    'cls': view.__class__.__name__
+                }
+            )
+        from .search_index.index import register
+
+        return register(view.__class__).filter(queryset, search_text)
+
+
+class NarrowingSearch(IContainsSearch):
+    """
+    Search backend like IContainsSearch that keeps the pks of the rows
+    matched by the recent searches of each user, so a longer search is done
+    over them. When the user types "smi" and then "smit", the text and
+    choices lookups of "smit" are only done over the rows that matched "smi"
+    (By batches of pks) and the exact lookups (Numbers, dates and UUIDs) are
+    done alone, because a longer number can match other rows. A search
+    refines a kept one when it has the same number of words and each word
+    starts with the kept one.
+
+    The searches with more than max_pks matches aren't kept, the kept ones
+    expire after timeout seconds and the least recently used are evicted
+    after max_searches. They are discarded when the version of the model
+    changes (See get_model_version), it's kept in the cache of cache_alias
+    so the saves and deletes of every process that shares it are seen. The
+    narrowing is approximate under the changes that don't send signals
+    (bulk_create, update() or raw SQL): the new rows that match a longer
+    search are missed until the kept ones expire, unless bump_model_version
+    is called after them. The pks are kept by view class and user, override
+    get_scope if the queryset of the view depends on something else of the
+    request
+    """
+
+    def __init__(self, max_searches=200, max_pks=1000, batch_size=500,
+                 timeout=60, cache_alias='default'):
+        self.max_searches = max_searches
+        self.max_pks = max_pks
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+        self.lock = threading.Lock()
+        self.searches = OrderedDict()
+
+    def get_scope(self, view):
+        user = getattr(getattr(view, 'request', None), 'user', None)
+        return (
+            view.__class__.__module__, view.__class__.__qualname__,
+            getattr(user, 'pk', None)
+        )
+
+    def refines(self, words, kept_words):
+        return len(words) == len(kept_words) and all(
+            word.startswith(kept_word)
+            for word, kept_word in zip(words, kept_words)
+        )
+
+    def get_kept_pks(self, scope, search_text, version):
+        """
+        Gets the kept pks of the search and True, or the smallest kept pks of
+        a search it refines and False. The expired and outdated searches are
+        discarded meanwhile
+        """
+        words = search_text.split()
+        now = time.monotonic()
+        refined_key = None
+        with self.lock:
+            for key, (pks, kept_version, expires) in list(
+                self.searches.items()
+            ):
+                if expires <= now or kept_version != version:
+                    del self.searches[key]
+                    continue
+                kept_scope, kept_text = key
+                if kept_scope != scope:
+                    continue
+                if kept_text == search_text:
+                    self.searches.move_to_end(key)
+                    return pks, True
+                if self.refines(words, kept_text.split()) and (
+                    refined_key is None
+                    or len(pks) < len(self.searches[refined_key][0])
+                ):
+                    refined_key = key
+            if refined_key is None:
+                return None, False
+            self.searches.move_to_end(refined_key)
+            return self.searches[refined_key][0], False
+
+    def keep_pks(self, scope, search_text, version, pks):
+        with self.lock:
+            key = (scope, search_text)
+            self.searches[key] = (pks, version, time.monotonic() + self.timeout)
+            self.searches.move_to_end(key)
+            while len(self.searches) > self.max_searches:
+                self.searches.popitem(last=False)
+
+    def search_pks(self, queryset, search_compiler, search_text, candidates):
+        """
+        Gets the sorted pks of the rows that match the search, only among the
+        candidates for the lookups that narrow. None when there are more than
+        max_pks
+        """
+        if candidates is None:
+            pks = queryset.filter(
+                search_compiler.compile(search_text)
+            ).values_list('pk', flat=True)[:self.max_pks + 1]
+        else:
+            narrowing_q, exact_q = search_compiler.compile_split(search_text)
+            pks = set()
+            if narrowing_q:
+                for chunk in chunked(candidates, self.batch_size):
+                    pks.update(queryset.filter(
+                        narrowing_q, pk__in=chunk
+                    ).values_list('pk', flat=True))
+            if exact_q:
+                pks.update(queryset.filter(exact_q).values_list(
+                    'pk', flat=True
+                )[:self.max_pks + 1])
+        pks = sorted(pks)
+        if len(pks) > self.max_pks:
+            return None
+        if all(type(pk) is int for pk in pks):
+            # A compact array for the integer pks
+            return array('q', pks)
+        return tuple(pks)
+
+    def filter(self, view, queryset, search_text):
+        search_compiler = view.table_spec.search_compiler
+        search_text = normalize_search_text(search_text)
+        q_objects = search_compiler.compile(search_text)
+        if not search_text:
+            return queryset.filter(q_objects)
+        scope = self.get_scope(view)
+        version = get_model_version(view.model, self.cache_alias)
+        pks, kept = self.get_kept_pks(scope, search_text, version)
+        if not kept:
+            pks = self.search_pks(queryset, search_compiler, search_text, pks)
+            if pks is None:
+                return queryset.filter(q_objects)
+            self.keep_pks(scope, search_text, version, pks)
+        # The rows changed by other processes must still match
+        return queryset.filter(q_objects, pk__in=list(pks))
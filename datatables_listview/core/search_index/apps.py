@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class SearchIndexConfig(AppConfig):
+    name = 'core.search_index'
+    label = 'datatables_search_index'
+    verbose_name = "Datatables search index"
+    default_auto_field = 'django.db.models.AutoField'
@@ -0,0 +1,292 @@
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Q
+from django.db.models.functions import Cast
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+
+from ..spec import FK, M2M
+from ..utils import INTEGER_FIELD_TYPES, chunked, normalize_search_text
+from .models import SearchIndexEntry
+
+# Indexes of the views registered with register(), by name
+registry = {}
+
+# Attribute of the related objects being deleted (Or cleared) with the pks of
+# the indexed objects to update after it, by index name
+PENDING_PKS_ATTR = '_datatables_search_index_pks'
+
+
+def get_index_name(view_class):
+    return "%s.%s" % (view_class.__module__, view_class.__qualname__)
+
+
+class SearchIndex:
+    """
+    Search index of a view, a SearchIndexEntry by object with the display
+    values of the columns of the view (Choices labels, the __str__ of the
+    related objects and the lists of the relations to many) normalized. The
+    documents are built by the view itself, so they have the same values the
+    table shows. The entries are updated by the signals once the transaction
+    is committed, by chunks of chunk_size objects
+    """
+
+    # Objects updated by query, the pks are bound as parameters
+    chunk_size = 500
+
+    def __init__(self, view_class):
+        self.view_class = view_class
+        self.name = get_index_name(view_class)
+
+    @property
+    def model(self):
+        return self.view_class.model
+
+    def build_document(self, view, obj):
+        values = [
+            view.evaluate_data(obj, column.field)
+            for column in view.table_spec.columns
+        ]
+        return normalize_search_text(" ".join(
+            str(value) for value in values if value is not None
+        ))
+
+    def get_entries(self, view, pks):
+        view.reset_row_values()
+        objects = view.apply_query_plan(
+            self.model._default_manager.filter(pk__in=pks)
+        )
+        return [
+            SearchIndexEntry(
+                index=self.name,
+                object_pk=str(obj.pk),
+                document=self.build_document(view, obj)
+            )
+            for obj in objects
+        ]
+
+    def update(self, pks):
+        """
+        Updates the entries of the objects with the given pks by chunks of
+        chunk_size, the entries of the ones that don't exist anymore are
+        deleted
+        """
+        view = self.view_class()
+        for chunk in chunked(pks, self.chunk_size):
+            entries = self.get_entries(view, chunk)
+            with transaction.atomic(using=SearchIndexEntry.objects.db):
+                self.delete(chunk)
+                SearchIndexEntry.objects.bulk_create(entries)
+
+    def delete(self, pks):
+        for chunk in chunked(pks, self.chunk_size):
+            SearchIndexEntry.objects.filter(
+                index=self.name, object_pk__in=[str(pk) for pk in chunk]
+            ).delete()
+
+    def schedule_update(self, pks, using=None):
+        """
+        Updates the entries once the transaction of the change is committed,
+        so the save that triggers it doesn't wait for the index and a
+        rollback doesn't leave it changed
+        """
+        pks = list(pks)
+        if pks:
+            transaction.on_commit(lambda: self.update(pks), using=using)
+
+    def rebuild(self, chunk_size=2000):
+        """
+        Builds again all the entries of the index, the objects are read by
+        chunks of chunk_size. Returns the number of entries
+        """
+        view = self.view_class()
+        pks = self.model._default_manager.order_by('pk').values_list(
+            'pk', flat=True
+        )
+        count = 0
+        with transaction.atomic(using=SearchIndexEntry.objects.db):
+            SearchIndexEntry.objects.filter(index=self.name).delete()
+            for chunk in chunked(
+                pks.iterator(chunk_size=chunk_size), chunk_size
+            ):
+                entries = self.get_entries(view, chunk)
+                SearchIndexEntry.objects.bulk_create(entries)
+                count += len(entries)
+        return count
+
+    def get_matching_pks(self, search_text):
+        """
+        Gets the pks of the objects with any word of the search in their
+        documents, it's a queryset to be used as a subquery. The pks are
+        stored as text, they are cast back when the pk is an integer.
+
+        The words are looked up with a LIKE '%word%' (contains) over the
+        documents, it scans the entries of the index (Without the joins of
+        the related tables) because a B-tree index can't be used for it. In
+        PostgreSQL a trigram index supports it, add it with a migration of
+        the project: TrigramExtension() and
+        GinIndex(fields=['document'], opclasses=['gin_trgm_ops']) over
+        SearchIndexEntry
+        """
+        entries = SearchIndexEntry.objects.filter(index=self.name)
+        words = normalize_search_text(search_text).split()
+        if words:
+            entries = entries.filter(reduce(or_, [
+                Q(document__contains=word) for word in words
+            ]))
+        if self.model._meta.pk.get_internal_type() in INTEGER_FIELD_TYPES:
+            return entries.annotate(
+                object_pk_value=Cast('object_pk', BigIntegerField())
+            ).values('object_pk_value')
+        return entries.values('object_pk')
+
+    def filter(self, queryset, search_text):
+        return queryset.filter(pk__in=self.get_matching_pks(search_text))
+
+    def get_related_pks(self, column_name, related_obj):
+        return list(self.model._default_manager.filter(
+            **{column_name: related_obj}
+        ).values_list('pk', flat=True))
+
+    def add_pending_pks(self, instance, pks):
+        pending_pks = instance.__dict__.setdefault(PENDING_PKS_ATTR, {})
+        pending_pks.setdefault(self.name, set()).update(pks)
+
+    def pop_pending_pks(self, instance):
+        return instance.__dict__.get(PENDING_PKS_ATTR, {}).pop(self.name, ())
+
+    @property
+    def dispatch_uid(self):
+        return "datatables_search_index_%s" % self.name
+
+    def get_related_columns(self):
+        return [
+            column for column in self.view_class.get_table_spec().columns
+            if column.kind in (FK, M2M)
+        ]
+
+    def get_through_model(self, column):
+        if column.field.concrete:
+            return column.field.remote_field.through
+        return column.field.through
+
+    def connect(self):
+        """
+        Connects the signals that keep the index updated, the changes of the
+        objects, of their relations to many and of the related objects
+        """
+        dispatch_uid = self.dispatch_uid
+        post_save.connect(
+            self.on_save, sender=self.model, weak=False,
+            dispatch_uid=dispatch_uid
+        )
+        post_delete.connect(
+            self.on_delete, sender=self.model, weak=False,
+            dispatch_uid=dispatch_uid
+        )
+        for column in self.get_related_columns():
+            column_uid = "%s_%s" % (dispatch_uid, column.name)
+            related_model = column.field.related_model
+            post_save.connect(
+                self.get_related_save_handler(column.name),
+                sender=related_model, weak=False, dispatch_uid=column_uid
+            )
+            pre_delete.connect(
+                self.get_related_pre_delete_handler(column.name),
+                sender=related_model, weak=False, dispatch_uid=column_uid
+            )
+            post_delete.connect(
+                self.on_related_delete, sender=related_model, weak=False,
+                dispatch_uid=column_uid
+            )
+            if column.field.many_to_many:
+                m2m_changed.connect(
+                    self.get_m2m_changed_handler(column.name),
+                    sender=self.get_through_model(column), weak=False,
+                    dispatch_uid=column_uid
+                )
+
+    def disconnect(self):
+        post_save.disconnect(sender=self.model, dispatch_uid=self.dispatch_uid)
+        post_delete.disconnect(
+            sender=self.model, dispatch_uid=self.dispatch_uid
+        )
+        for column in self.get_related_columns():
+            column_uid = "%s_%s" % (self.dispatch_uid, column.name)
+            related_model = column.field.related_model
+            for signal in (post_save, pre_delete, post_delete):
+                signal.disconnect(sender=related_model, dispatch_uid=column_uid)
+            if column.field.many_to_many:
+                m2m_changed.disconnect(
+                    sender=self.get_through_model(column),
+                    dispatch_uid=column_uid
+                )
+
+    def on_save(self, sender, instance, raw=False, using=None, **kwargs):
+        if not raw:
+            self.schedule_update([instance.pk], using)
+
+    def on_delete(self, sender, instance, using=None, **kwargs):
+        pk = instance.pk
+        transaction.on_commit(lambda: self.delete([pk]), using=using)
+
+    def get_related_save_handler(self, column_name):
+        def on_related_save(sender, instance, raw=False, using=None,
+                            **kwargs):
+            if not raw:
+                self.schedule_update(
+                    self.get_related_pks(column_name, instance), using
+                )
+        return on_related_save
+
+    def get_related_pre_delete_handler(self, column_name):
+        # The relations are removed with the related object, so the objects
+        # to update are collected before
+        def on_related_pre_delete(sender, instance, **kwargs):
+            self.add_pending_pks(
+                instance, self.get_related_pks(column_name, instance)
+            )
+        return on_related_pre_delete
+
+    def on_related_delete(self, sender, instance, using=None, **kwargs):
+        self.schedule_update(self.pop_pending_pks(instance), using)
+
+    def get_m2m_changed_handler(self, column_name):
+        def on_m2m_changed(sender, instance, action, pk_set=None, using=None,
+                           **kwargs):
+            if isinstance(instance, self.model):
+                if action in ('post_add', 'post_remove', 'post_clear'):
+                    self.schedule_update([instance.pk], using)
+            elif action == 'pre_clear':
+                # The related side is cleared, pk_set doesn't have the objects
+                self.add_pending_pks(
+                    instance, self.get_related_pks(column_name, instance)
+                )
+            elif action == 'post_clear':
+                self.schedule_update(self.pop_pending_pks(instance), using)
+            elif action in ('post_add', 'post_remove'):
+                self.schedule_update(pk_set or (), using)
+        return on_m2m_changed
+
+
+def register(view_class):
+    """
+    Registers the search index of a view and connects its signals, it should
+    be called in the ready() of an AppConfig so the index is kept updated from
+    the start
+    """
+    name = get_index_name(view_class)
+    if name not in registry:
+        search_index = SearchIndex(view_class)
+        search_index.connect()
+        registry[name] = search_index
+    return registry[name]
+
+
+def unregister(view_class):
+    search_index = registry.pop(get_index_name(view_class), None)
+    if search_index is not None:
+        search_index.disconnect()
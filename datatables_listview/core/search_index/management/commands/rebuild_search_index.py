@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from ...index import register, registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds again the search indexes of the given views (Dotted paths), "
+        "or of all the registered views"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('views', nargs='*')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['views']:
+            search_indexes = []
+            for view_path in options['views']:
+                try:
+                    view_class = import_string(view_path)
+                except ImportError as error:
+                    raise CommandError(error)
+                search_indexes.append(register(view_class))
+        else:
+            search_indexes = list(registry.values())
+        if not search_indexes:
+            raise CommandError(
+                "There are no registered search indexes, give the dotted paths "
+                "of the views"
+            )
+        for search_index in search_indexes:
+            count = search_index.rebuild(chunk_size=options['chunk_size'])
+            self.stdout.write(
+                "%s: %s entries" % (search_index.name, count)
+            )
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.CharField(max_length=200)),
+                ('object_pk', models.CharField(max_length=64)),
+                ('document', models.TextField()),
+            ],
+            options={
+                'unique_together': {('index', 'object_pk')},
+            },
+        ),
+    ]
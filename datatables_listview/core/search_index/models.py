@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class SearchIndexEntry(models.Model):
+    """
+    Row of the search index of a view, it has the display values of the
+    searchable columns of an object already normalized (In lowercase and
+    joined by spaces), so a search doesn't join the related tables
+    """
+    index = models.CharField(max_length=200)
+    object_pk = models.CharField(max_length=64)
+    document = models.TextField()
+
+    class Meta:
+        unique_together = ('index', 'object_pk')
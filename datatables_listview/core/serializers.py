@@ -0,0 +1,62 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class StdlibJSONSerializer:
+    """
+    Serializer of the ajax responses with the json module of the standard
+    library, the types that aren't JSON (Dates, decimals, UUIDs) are encoded
+    like JsonResponse does
+    """
+    content_type = 'application/json'
+
+    def dumps(self, data):
+        return json.dumps(
+            data, cls=DjangoJSONEncoder, separators=(',', ':')
+        ).encode()
+
+
+class OrjsonSerializer(StdlibJSONSerializer):
+    """
+    Serializer that uses orjson, the dates and UUIDs are encoded by orjson and
+    the other types by the DjangoJSONEncoder
+    """
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+        self.default = DjangoJSONEncoder().default
+
+    def dumps(self, data):
+        return self.orjson.dumps(data, default=self.default)
+
+
+class UjsonSerializer(StdlibJSONSerializer):
+    """
+    Serializer that uses ujson, the types that aren't JSON are encoded by the
+    DjangoJSONEncoder
+    """
+
+    def __init__(self):
+        import ujson
+        self.ujson = ujson
+        self.default = DjangoJSONEncoder().default
+
+    def dumps(self, data):
+        return self.ujson.dumps(
+            data, default=self.default, ensure_ascii=False,
+            escape_forward_slashes=False
+        ).encode()
+
+
+def get_json_serializer():
+    """
+    Gets the fastest serializer installed, orjson, ujson or the json module
+    """
+    for serializer_class in (OrjsonSerializer, UjsonSerializer):
+        try:
+            return serializer_class()
+        except ImportError:
+            pass
+    return StdlibJSONSerializer()
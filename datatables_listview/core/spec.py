@@ -0,0 +1,302 @@
+from collections import namedtuple
+from hashlib import md5
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import (
+    BooleanField, Case, Exists, OuterRef, Q, Value, When
+)
+from django.db.models.constants import LOOKUP_SEP
+from django.urls import get_script_prefix, get_urlconf
+
+from .rendering import OptionRenderer
+from .utils import SearchCompiler
+
+# Using namedtuples like the Draw, the compiled spec is immutable
+Column = namedtuple(
+    'Column',
+    ['index', 'field', 'name', 'attname', 'accessor_name', 'kind', 'choices']
+)
+Condition = namedtuple(
+    'Condition',
+    ['column', 'condition_values', 'condition_func']
+)
+Option = namedtuple(
+    'Option',
+    ['index', 'label', 'url', 'url_params', 'permissions', 'conditions',
+     'icon', 'confirm_modal', 'conf', 'expression', 'annotation']
+)
+
+def describe(value):
+    """
+    Gets a text that describes the value and is the same in every process,
+    the functions are described by their names instead of their addresses
+    """
+    if isinstance(value, dict):
+        return "{%s}" % ", ".join(
+            "%r: %s" % (key, describe(value[key])) for key in sorted(value)
+        )
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ", ".join(describe(element) for element in value)
+    if callable(value) and hasattr(value, '__qualname__'):
+        return "%s.%s" % (value.__module__, value.__qualname__)
+    return repr(value)
+
+
+PLAIN = 'plain'
+CHOICES = 'choices'
+FK = 'fk'
+M2M = 'm2m'
+ARRAY = 'array'
+
+
+def get_column_kind(field):
+    """
+    Gets the kind of a column, it says how its value is read from the objects
+    """
+    if field.many_to_many or field.one_to_many:
+        # Reverse relations are handled like the many to many
+        return M2M
+    if field.is_relation:
+        return FK
+    if field.__class__.__name__ == 'ArrayField':
+        return ARRAY
+    if getattr(field, 'choices', None):
+        return CHOICES
+    return PLAIN
+
+
+def spans_to_many(model, q):
+    """
+    Says if any lookup of the Q object goes through a relation to many, the
+    joins of those relations would repeat the rows
+    """
+    for child in q.children:
+        if isinstance(child, Q):
+            if spans_to_many(model, child):
+                return True
+            continue
+        related_model = model
+        for part in child[0].split(LOOKUP_SEP):
+            try:
+                field = related_model._meta.get_field(part)
+            except FieldDoesNotExist:
+                # A lookup or a transform
+                break
+            if field.many_to_many or field.one_to_many:
+                return True
+            if not field.is_relation:
+                break
+            related_model = field.related_model
+    return False
+
+
+def compile_condition_expression(expression, model):
+    """
+    Compiles the condition_expression of an option to a boolean expression
+    that can be annotated, the Q objects are wrapped in a Case/When. The ones
+    that go through a relation to many are an Exists subquery instead, so
+    the page rows aren't repeated by the joins. Other expressions are
+    annotated as they are
+    """
+    if isinstance(expression, Q):
+        if spans_to_many(model, expression):
+            return Exists(
+                model._default_manager.filter(expression, pk=OuterRef('pk'))
+            )
+        return Case(
+            When(expression, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField()
+        )
+    return expression
+
+
+def compile_column(index, field):
+    kind = get_column_kind(field)
+    choices = None
+    if kind == CHOICES:
+        choices = dict(field.flatchoices)
+    elif kind == ARRAY:
+        choices = field.base_field.choices
+    accessor_name = field.name
+    if field.auto_created and field.is_relation and not field.concrete:
+        accessor_name = field.get_accessor_name()
+    return Column(
+        index, field, field.name, getattr(field, 'attname', field.name),
+        accessor_name, kind, choices
+    )
+
+
+class TableSpec:
+    """
+    Description of a DatatablesListView subclass compiled once by class (Or
+    by view when its fields or options_list aren't the ones of the class), it
+    has everything that's needed to read and render the rows already resolved,
+    so the rows don't do any _meta lookups or options validation:
+
+    - columns: The displayed columns in order
+    - related_columns: The displayed columns plus the ones read by the
+      options (url_params and conditions)
+    - options: The options with its url params and conditions resolved, the
+      condition_expression of an option is annotated on the page queryset
+    - search_compiler: The SearchCompiler of the displayed fields
+    - digest: The digest of the fields and the options, it's part of the keys
+      of the values cached for the rows
+    """
+
+    def __init__(self, view_class, fields=None, options_list=None):
+        self.view_class = view_class
+        if fields is None:
+            fields = view_class.fields
+        if options_list is None:
+            options_list = view_class.options_list
+        model = view_class.model
+        if model is None:
+            raise ImproperlyConfigured(
+                "%(cls)s is missing a Model. Define "
+                "%(cls)s.model" % {
+                    'cls': view_class.__name__
+                }
+            )
+
+        if fields:
+            fields = [model._meta.get_field(field) for field in fields]
+        else:
+            fields = model._meta.get_fields()
+        related_columns = [
+            compile_column(index, field) for index, field in enumerate(fields)
+        ]
+        self.columns = tuple(related_columns)
+        self.columns_by_name = {column.name: column for column in self.columns}
+
+        def get_column(field_name):
+            try:
+                return self.columns_by_name[field_name]
+            except KeyError:
+                column = compile_column(
+                    len(related_columns), model._meta.get_field(field_name)
+                )
+                related_columns.append(column)
+                self.columns_by_name[field_name] = column
+                return column
+
+        options = []
+        for index, option in enumerate(options_list):
+            self.validate_option(option)
+            conditions = tuple(
+                Condition(
+                    get_column(condition['field']),
+                    condition['condition_values'],
+                    condition['condition_func']
+                )
+                for condition in option.get('conditions') or []
+            )
+            expression = option.get('condition_expression')
+            annotation = None
+            if expression is not None:
+                expression = compile_condition_expression(expression, model)
+                annotation = "_datatables_option_%s" % index
+            options.append(Option(
+                index,
+                option['option_label'],
+                option['option_url'],
+                tuple(get_column(param) for param in option['url_params']),
+                tuple(option.get('permissions') or ()),
+                conditions,
+                option.get('icon'),
+                option.get('confirm_modal'),
+                option,
+                expression,
+                annotation
+            ))
+        self.options = tuple(options)
+        self.related_columns = tuple(related_columns)
+        # The columns used as url params by any option, without repeating
+        self.param_columns = tuple({
+            column.name: column
+            for option in self.options for column in option.url_params
+        }.values())
+        self.option_renderers = {}
+        self.digest = md5(describe(
+            [[field.name for field in fields], options_list]
+        ).encode()).hexdigest()
+        self.search_compiler = SearchCompiler(
+            self.fields, prefix_fields=view_class.search_prefix_fields
+        )
+
+    @property
+    def annotations(self):
+        return {
+            option.annotation: option.expression
+            for option in self.options if option.annotation
+        }
+
+    @property
+    def permissions(self):
+        return sorted({
+            permission
+            for option in self.options
+            for permission in option.permissions
+        })
+
+    @property
+    def fields(self):
+        return [column.field for column in self.columns]
+
+    @property
+    def related_fields(self):
+        return [column.field for column in self.related_columns]
+
+    def get_column(self, field):
+        try:
+            return self.columns_by_name[field.name]
+        except KeyError:
+            # A field that isn't part of the table
+            return compile_column(None, field)
+
+    def get_option_renderer(self):
+        """
+        Gets the OptionRenderer of the options, it's compiled the first time
+        for each script prefix and urlconf because the urls depend on them
+        """
+        key = (get_script_prefix(), get_urlconf())
+        try:
+            return self.option_renderers[key]
+        except KeyError:
+            option_renderer = OptionRenderer(self.options)
+            self.option_renderers[key] = option_renderer
+            return option_renderer
+
+    def get_compact_layout(self):
+        return self.get_option_renderer().get_compact_layout(
+            self.param_columns
+        )
+
+    def validate_option(self, option):
+        for key, description in (
+            ('option_label', "with a string"),
+            ('option_url', "with a string"),
+            ('url_params', "with a list of parameters of the url_option as "
+                           "string")
+        ):
+            if key not in option:
+                raise ImproperlyConfigured(
+                    "%(cls)s needs options_list attr created in the __init__ "
+                    "method. It must be a list of dictionaries with and key"
+                    "called '%(key)s' %(description)s" % {
+                        'cls': self.view_class.__name__,
+                        'key': key,
+                        'description': description
+                    }
+                )
+        expression = option.get('condition_expression')
+        if expression is not None and not hasattr(
+            expression, 'resolve_expression'
+        ):
+            raise ImproperlyConfigured(
+                "%(cls)s has an option with an invalid condition_expression, "
+                "it must be a Q object or a boolean expression like "
+                "Case/When" % {
+                    'cls': self.view_class.__name__
+                }
+            )
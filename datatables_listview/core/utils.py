@@ -1,6 +1,13 @@
+import re
 from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from uuid import UUID
 
+from django.core.cache import caches
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
 
 
 def generate_q_objects_by_fields_and_words(fields, search_text):
@@ -17,37 +24,357 @@ def generate_q_objects_by_fields_and_words(fields, search_text):
     Because Q Objects internally are subclasses of django.utils.tree.Node we can
     'add' Q Objects with connectors,
     see: https://bradmontgomery.net/blog/adding-q-objects-in-django/
+
+    The lookups are chosen by the type of each field, see SearchCompiler
     """
-    q = Q()
-    search_text = search_text.split(" ")
-    for field in fields:
-        for word in search_text:
+    return SearchCompiler(fields).compile(search_text)
+
+
+INTEGER_FIELD_TYPES = {
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField',
+    'BigIntegerField', 'SmallIntegerField', 'PositiveIntegerField',
+    'PositiveSmallIntegerField', 'PositiveBigIntegerField'
+}
+NUMBER_FIELD_TYPES = {'FloatField', 'DecimalField'}
+DATE_FIELD_TYPES = {'DateField', 'DateTimeField'}
+# Types that can't match a word of a search
+SKIPPED_FIELD_TYPES = {
+    'BooleanField', 'NullBooleanField', 'DurationField', 'TimeField',
+    'BinaryField'
+}
+DATE_INPUT_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+# Types searched with an exact value of the word, a longer word can match rows
+# that the shorter one didn't
+EXACT_SEARCH_FIELD_TYPES = (
+    INTEGER_FIELD_TYPES | NUMBER_FIELD_TYPES | DATE_FIELD_TYPES | {'UUIDField'}
+)
+
+
+COMPARISON_LOOKUPS = {'>': '__gt', '>=': '__gte', '<': '__lt', '<=': '__lte'}
+
+
+def parse_integer(word):
+    if re.fullmatch(r"-?\d+", word):
+        return int(word)
+    return None
+
+
+def parse_number(word):
+    if re.fullmatch(r"-?\d+(\.\d+)?", word):
+        return Decimal(word)
+    return None
+
+
+def parse_date(word):
+    for date_format in DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(word, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+class SearchCompiler:
+    """
+    Compiles search texts to Q Objects choosing the cheapest valid lookup for
+    each field and word, the rows match if any field matches any word:
+
+    - Choices: The internal values of the choices whose display contains the
+      word, the choices map is built once
+    - Integer and decimal fields: exact lookup if the word is a number
+    - Date fields: exact date if the word is a date, or the year if it's a
+      number of 4 digits
+    - UUID fields: exact lookup if the word is an UUID
+    - Text fields: icontains, or istartswith for the prefix_fields (Fields
+      with an index that supports it)
+    - Relations, booleans, durations and times are skipped because they can't
+      match a word
+
+    The compiled Q Objects are memoized in a LRU cache by the normalized
+    search text
+    """
+
+    def __init__(self, fields, prefix_fields=(), cache_size=256):
+        self.prefix_fields = set(prefix_fields)
+        self.field_types = {}
+        self.field_lookups = []
+        for field in fields:
+            if field.is_relation:
+                continue
+            field_type = field.get_internal_type()
+            choices = None
             if field.choices:
-                # Build a dict with the dictionary to do search by choices
-                # display
-                # This dictionary takes the value (display of the choices) as
-                # key and the internal representation as value
-                # TODO: Change this
-                field_choices = {value.lower(): key for key, value in field.choices}
-                # Search if the searched word exists in the field choices
-                value_coincidences = [
-                    value for key, value in field_choices.items()
-                    if word.lower() in key
-                ]
-                if value_coincidences:
-                    search_criteria = {"%s__in" % field.name: value_coincidences}
-                    q.add(
-                        Q(**search_criteria),
-                        Q.OR
-                    )
-            else:
-                instruction = "%s__icontains" % field.name
-                search_criteria = {instruction: word}
-                # Adding q objects with OR connector
-                q.add(
-                    Q(**search_criteria),
-                    Q.OR
+                # This dictionary takes the display of the choices in lower
+                # case as key and the internal representation as value
+                field_type = 'choices'
+                choices = {
+                    str(value).lower(): key for key, value in field.flatchoices
+                }
+            self.field_types[field.name] = (field_type, choices)
+            if field_type not in SKIPPED_FIELD_TYPES:
+                self.field_lookups.append((field.name, field_type, choices))
+        self.compile_normalized = lru_cache(maxsize=cache_size)(
+            self.compile_normalized
+        )
+        self.compile_column_filter = lru_cache(maxsize=cache_size)(
+            self.compile_column_filter
+        )
+
+    def compile(self, search_text):
+        return self.compile_normalized(normalize_search_text(search_text))
+
+    def compile_normalized(self, search_text):
+        q = Q()
+        for word in search_text.split():
+            for field_name, field_type, choices in self.field_lookups:
+                search_criteria = self.get_search_criteria(
+                    field_name, field_type, choices, word
                 )
+                if search_criteria:
+                    # Adding q objects with OR connector
+                    q.add(Q(**search_criteria), Q.OR)
+        if not q and search_text:
+            # None of the fields can match the search
+            q = Q(pk__in=[])
+        return q
+
+    def compile_split(self, search_text):
+        """
+        Compiles a search text like compile but in two Q Objects, one with the
+        lookups that match less rows as the words get longer (Text and
+        choices) and one with the exact lookups (Numbers, dates and UUIDs).
+        None of them is filtered when they are empty
+        """
+        narrowing_q = Q()
+        exact_q = Q()
+        for word in normalize_search_text(search_text).split():
+            for field_name, field_type, choices in self.field_lookups:
+                search_criteria = self.get_search_criteria(
+                    field_name, field_type, choices, word
+                )
+                if not search_criteria:
+                    continue
+                if field_type in EXACT_SEARCH_FIELD_TYPES:
+                    exact_q.add(Q(**search_criteria), Q.OR)
+                else:
+                    narrowing_q.add(Q(**search_criteria), Q.OR)
+        return narrowing_q, exact_q
+
+    def get_search_criteria(self, field_name, field_type, choices, word):
+        if field_type == 'choices':
+            value_coincidences = [
+                value for key, value in choices.items() if word in key
+            ]
+            if value_coincidences:
+                return {"%s__in" % field_name: value_coincidences}
+        elif field_type in INTEGER_FIELD_TYPES:
+            if parse_integer(word) is not None:
+                return {field_name: parse_integer(word)}
+        elif field_type in NUMBER_FIELD_TYPES:
+            if parse_number(word) is not None:
+                return {field_name: parse_number(word)}
+        elif field_type in DATE_FIELD_TYPES:
+            lookup = "__date" if field_type == 'DateTimeField' else ""
+            if re.fullmatch(r"\d{4}", word):
+                return {"%s__year" % field_name: int(word)}
+            date = parse_date(word)
+            if date:
+                return {"%s%s" % (field_name, lookup): date}
+        elif field_type == 'UUIDField':
+            try:
+                return {field_name: UUID(word)}
+            except ValueError:
+                pass
+        elif field_name in self.prefix_fields:
+            return {"%s__istartswith" % field_name: word}
+        else:
+            return {"%s__icontains" % field_name: word}
+        return None
+
+    def compile_column_filter(self, field_name, value):
+        """
+        Compiles the search value of a column to a Q Object over that column
+        alone, they are cheaper than the global search because they can use
+        the index of the column:
+
+        - Choices: exact display or internal values, several can be given
+          separated by | or ,
+        - Numbers: exact, comparisons (>, >=, <, <=) or ranges (10-20, 10..20)
+        - Dates: exact, the year, comparisons or ranges (a - b, a..b)
+        - Booleans: true/false, yes/no or 1/0
+        - UUIDs: exact
+        - Text: prefix (istartswith)
+
+        The columns that can't be filtered (Relations) are ignored, values
+        that can't match the column (Letters in a number) match nothing
+        """
+        try:
+            field_type, choices = self.field_types[field_name]
+        except KeyError:
+            return Q()
+        value = value.strip()
+        if field_type == 'choices':
+            keys = []
+            for part in re.split(r"[|,]", value.lower()):
+                part = part.strip()
+                keys += [
+                    key for display, key in choices.items()
+                    if part in (display, str(key).lower())
+                ]
+            if keys:
+                return Q(**{"%s__in" % field_name: keys})
+        elif field_type in INTEGER_FIELD_TYPES | NUMBER_FIELD_TYPES:
+            parse = parse_integer
+            if field_type in NUMBER_FIELD_TYPES:
+                parse = parse_number
+            match = re.fullmatch(r"(-?[\d.]+)\s*(?:-|\.\.)\s*(-?[\d.]+)", value)
+            if match:
+                return self.get_range_q(field_name, match.groups(), parse)
+            return self.get_comparison_q(field_name, value, parse)
+        elif field_type in DATE_FIELD_TYPES:
+            if field_type == 'DateTimeField':
+                field_name = "%s__date" % field_name
+            if re.fullmatch(r"\d{4}", value):
+                return Q(**{"%s__year" % field_name: int(value)})
+            match = re.fullmatch(r"(.+?)\s*(?:\s-\s|\.\.)\s*(.+)", value)
+            if match:
+                return self.get_range_q(field_name, match.groups(), parse_date)
+            return self.get_comparison_q(field_name, value, parse_date)
+        elif field_type in ('BooleanField', 'NullBooleanField'):
+            booleans = {
+                'true': True, 'yes': True, '1': True,
+                'false': False, 'no': False, '0': False
+            }
+            if value.lower() in booleans:
+                return Q(**{field_name: booleans[value.lower()]})
+        elif field_type == 'UUIDField':
+            try:
+                return Q(**{field_name: UUID(value)})
+            except ValueError:
+                pass
+        elif field_type in SKIPPED_FIELD_TYPES:
+            return Q()
+        else:
+            return Q(**{"%s__istartswith" % field_name: value})
+        return Q(pk__in=[])
+
+    def get_range_q(self, field_name, values, parse):
+        start, end = [parse(value) for value in values]
+        if start is None or end is None:
+            return Q(pk__in=[])
+        return Q(**{"%s__range" % field_name: (start, end)})
+
+    def get_comparison_q(self, field_name, value, parse):
+        lookup = ""
+        match = re.fullmatch(r"(>=|<=|>|<)\s*(.+)", value)
+        if match:
+            operator, value = match.groups()
+            lookup = COMPARISON_LOOKUPS[operator]
+        value = parse(value)
+        if value is None:
+            return Q(pk__in=[])
+        return Q(**{"%s%s" % (field_name, lookup): value})
+
+
+def normalize_search_text(search_text):
+    """
+    Normalizes a search text to be used in cache keys, the search is case
+    insensitive and the words are split by spaces
+    """
+    return " ".join(search_text.lower().split())
+
+
+def normalize_draw_filters(draw_params):
+    """
+    Gets everything that filters the rows of a draw normalized, it's used in
+    the cache keys of the values that depend on the filtered rows
+    """
+    return (
+        normalize_search_text(draw_params.search),
+        tuple(sorted(draw_params.column_filters))
+    )
+
+
+# Models and cache aliases whose versions are bumped by signals
+versioned_models = set()
+
+
+def get_model_version_key(model):
+    return "datatables_listview:version:%s" % model._meta.label_lower
+
+
+def bump_model_version(model, cache_alias='default'):
+    """
+    Invalidates everything cached for the rows of the model, the version is
+    part of the keys that depend on them. Call it after the changes that
+    don't send signals (bulk_create, update() or raw SQL)
+    """
+    cache = caches[cache_alias]
+    try:
+        cache.incr(get_model_version_key(model))
+    except ValueError:
+        cache.set(get_model_version_key(model), 1, None)
+
+
+def track_model_version(model, cache_alias='default'):
+    """
+    Connects the post_save and post_delete signals that bump the version of
+    the model, the processes that change the model without reading its
+    version (Workers or commands) must call it on start, in
+    AppConfig.ready() for example
+    """
+    if (model, cache_alias) in versioned_models:
+        return
+
+    def bump(sender, **kwargs):
+        bump_model_version(sender, cache_alias)
+
+    dispatch_uid = "datatables_listview_version_%s_%s" % (
+        cache_alias, model._meta.label_lower
+    )
+    post_save.connect(
+        bump, sender=model, weak=False, dispatch_uid=dispatch_uid
+    )
+    post_delete.connect(
+        bump, sender=model, weak=False, dispatch_uid=dispatch_uid
+    )
+    versioned_models.add((model, cache_alias))
+
+
+def get_model_version(model, cache_alias='default'):
+    """
+    Gets the version of the rows of the model, it's kept in the cache so the
+    changes of every process that shares it are seen
+    """
+    track_model_version(model, cache_alias)
+    return caches[cache_alias].get(get_model_version_key(model), 0)
+
+
+def generate_keyset_q(sort_keys, values, inclusive=False):
+    """
+    Generates the Q Object equivalent to the row value comparison
+    (col_1, ..., col_n) > (value_1, ..., value_n), respecting the direction of
+    each sort key, so a page can be fetched seeking from a known row instead of
+    scanning and discarding all the rows before it with an OFFSET.
+
+    sort_keys is a list of (field_name, descending) tuples and values are the
+    values of those fields in the row used as boundary. With inclusive the
+    boundary row itself is part of the result
+    """
+    q = Q()
+    for position, (field_name, descending) in enumerate(sort_keys):
+        search_criteria = {
+            name: value for (name, _), value
+            in zip(sort_keys[:position], values[:position])
+        }
+        lookup = "lt" if descending else "gt"
+        search_criteria["%s__%s" % (field_name, lookup)] = values[position]
+        q.add(Q(**search_criteria), Q.OR)
+    if inclusive:
+        search_criteria = {
+            name: value for (name, _), value in zip(sort_keys, values)
+        }
+        q.add(Q(**search_criteria), Q.OR)
     return q
 
 
@@ -59,6 +386,20 @@ def arrayfield_keys_to_values(keys, choices):
     return values
 
 
+def chunked(iterable, size):
+    """
+    Splits an iterable in lists of size elements without reading it whole
+    """
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 def create_column_defs_list(column_defs):
     column_defs_list = []
     for counter, column_def in enumerate(column_defs):
@@ -73,7 +414,30 @@ def create_column_defs_list(column_defs):
 
 # Using namedtuple for readability, the var name is capitalized because
 # this namedtuple is used like a class
+# column_filters is a tuple of (field_name, search value) with the filtered
+# columns and ordering a tuple of (field_name, sort_order) with all the sorted
+# columns, sort_column and sort_order are the first one
 Draw = namedtuple(
     'Draw',
-    ['start', 'end', 'sort_column', 'sort_order', 'search', 'draw']
+    ['start', 'end', 'sort_column', 'sort_order', 'search', 'draw',
+     'column_filters', 'ordering'],
+    defaults=[(), ()]
 )
+
+
+class ValuesRow:
+    """
+    Lightweight row used by the values_list fast path instead of a model
+    instance, it has the pk and gives access to the fetched values by attname
+    """
+    __slots__ = ('pk', 'values')
+
+    def __init__(self, pk, values):
+        self.pk = pk
+        self.values = values
+
+    def __getattr__(self, name):
+        try:
+            return self.values[name]
+        except KeyError:
+            raise AttributeError(name)
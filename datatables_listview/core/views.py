@@ -1,14 +1,62 @@
-from django.core.exceptions import ImproperlyConfigured
-from django.http import JsonResponse
-from django.template.loader import render_to_string
-from django.urls import reverse
+import asyncio
+import copy
+import datetime
+import logging
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from hashlib import md5
+from uuid import UUID
 
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.exceptions import SuspiciousOperation
+from django.db import close_old_connections
+from django.db.models import F, Prefetch
+from django.http import (
+    Http404, HttpResponse, QueryDict, StreamingHttpResponse
+)
+from django.urls import (
+    get_script_prefix, get_urlconf, set_script_prefix, set_urlconf
+)
+from django.utils import translation
+from django.utils.encoding import force_str
+from django.utils.translation import get_language
+
+from .counts import ExactCount
+from .export import EXPORT_ENCODERS
+from .instrumentation import NULL_STAGE, DrawStats, draw_finished
+from .rendering import quote_url_param
+from .search import IContainsSearch
+from .serializers import get_json_serializer
+from .spec import TableSpec, CHOICES, FK, M2M, ARRAY
 from .utils import (
-    generate_q_objects_by_fields_and_words, arrayfield_keys_to_values,
-    create_column_defs_list, Draw
+    generate_keyset_q, normalize_draw_filters,
+    arrayfield_keys_to_values, create_column_defs_list, chunked, Draw,
+    ValuesRow, normalize_search_text, get_model_version
+)
+
+slow_draws_logger = logging.getLogger('datatables_listview.slow_draws')
+
+
+# Empty slot of the row cache, None is a valid value
+MISSING = object()
+# Guards the TableSpecs compiled by view class for other fields or options
+table_specs_lock = threading.Lock()
+# Types sent as they are by the compact protocol, the serializers encode them
+COMPACT_VALUE_TYPES = (
+    str, int, float, bool, datetime.date, datetime.time, datetime.timedelta,
+    Decimal, UUID
 )
 
 
+class DisallowedOrdering(SuspiciousOperation):
+    """
+    The ordering requested isn't supported by an index of the view
+    """
+    pass
+
+
 class DatatablesListView:
     """
     Author: Milton Lenis
@@ -19,59 +67,153 @@ class DatatablesListView:
     queryset = None
     fields = None
     options_list = []
+    # TableSpecs kept by class for the fields and options_list that aren't
+    # the ones of the class (Created in the __init__)
+    table_spec_cache_size = 16
     show_options = True
     show_options_permission = None
     perms_manager = None
     column_names_and_defs = None
     table_name = None
+    # Keyset (seek) pagination, pages near to an already served page are
+    # fetched seeking from its boundary rows instead of using a big OFFSET
+    keyset_pagination = False
+    keyset_max_distance = 1000
+    keyset_max_boundaries = 200
+    keyset_cache_alias = 'default'
+    keyset_cache_timeout = 300
+    # Orderings supported by an index, a list of tuples of field names. When
+    # it's defined the orderings that aren't a prefix of one of them are
+    # downgraded to the supported part, or rejected with 'reject'
+    indexed_orderings = None
+    unindexed_ordering = 'downgrade'
+    # Fetch the page with values_list instead of building model instances
+    values_fast_path = False
+    # Strategy for recordsTotal and recordsFiltered, see core.counts
+    count_strategy = ExactCount()
+    # Backend used by filter_by_search_text, see core.search
+    search_backend = IContainsSearch()
+    # Text fields with an index that supports istartswith, they are searched
+    # by prefix instead of icontains
+    search_prefix_fields = ()
+    # Server side export of the whole table, requested with ?export=<format>
+    export_param = 'export'
+    export_encoders = EXPORT_ENCODERS
+    export_chunk_size = 2000
+    # Cache of the rendered rows, keyed by the pk and the value of this field
+    # (An updated_at or a version column) that must change when a row changes
+    row_cache_version_field = None
+    row_cache_alias = 'default'
+    row_cache_timeout = 300
+    # Compact protocol of the ajax responses, the cells are the raw values and
+    # the options a bitmask of the visible options and the url params, they
+    # are rendered in the browser by generate_datatable.js
+    compact_protocol = False
+    # Serializer of the ajax responses, see core.serializers. By default the
+    # fastest one installed
+    json_serializer = None
+    # Coalescing of the identical draws served at the same time, a
+    # core.coalescing.SingleFlight
+    single_flight = None
+    # Prefetch of the windows after each draw, a core.prefetch.WindowPrefetcher
+    window_prefetch = None
+    # Engine that does the search, counts, ordering and slicing of the draws
+    # over the rows loaded in memory, a core.memory.MemoryEngine
+    memory_engine = None
+    # The first window of the table is generated with the page and embedded
+    # in it, it seeds the cache of datatables_pipeline.js so the first draw
+    # doesn't need an ajax request. page_length and pipeline_pages are the
+    # ones of the DataTable
+    inline_first_page = False
+    page_length = 10
+    pipeline_pages = 5
+    # Instrumentation of the draws, the duration, queries and template renders
+    # of each stage. The stats are sent with the draw_finished signal of
+    # core.instrumentation, in a Server-Timing header, in the 'debug' key of
+    # the JSON and the draws slower than slow_draw_threshold (Seconds) are
+    # logged
+    instrument_draws = False
+    server_timing = False
+    debug_stats = False
+    slow_draw_threshold = None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._fields = None
+        # The initkwargs of as_view(), the views created for the same request
+        # in other threads are configured with them
+        self.initkwargs = kwargs
         self.show_options = bool(self.options_list) and self.show_options
-        self.fields_data = {}
+        self.reset_row_values()
+        self.user_permissions = None
+        self.shared_permissions = {}
+        self.draw_stats = None
 
-        if self.model is None:
-            raise ImproperlyConfigured(
-                "%(cls)s is missing a Model. Define "
-                "%(cls)s.model" % {
-                    'cls': self.__class__.__name__
-                }
-            )
+        # The spec validates the model and the options_list the first time
+        self.table_spec
 
-        for option in self.options_list:
-            try:
-                option['option_label']
-            except KeyError:
-                raise ImproperlyConfigured(
-                    "%(cls)s needs options_list attr created in the __init__ "
-                    "method. It must be a list of dictionaries with and key"
-                    "called 'option_label' with a string" % {
-                        'cls': self.__class__.__name__
-                    }
-                )
-            try:
-                option['option_url']
-            except KeyError:
-                raise ImproperlyConfigured(
-                    "%(cls)s needs options_list attr created in the __init__ "
-                    "method. It must be a list of dictionaries with and key"
-                    "called 'option_url' with a string" % {
-                        'cls': self.__class__.__name__
-                    }
-                )
+    @classmethod
+    def get_table_spec(cls):
+        """
+        Method to get the TableSpec of the view class, it's compiled the first
+        time and reused by all the instances (One by request)
+        """
+        # Only the __dict__ of the class is checked, so each subclass compiles
+        # its own spec
+        table_spec = cls.__dict__.get('_table_spec')
+        if table_spec is None:
+            table_spec = TableSpec(cls)
+            cls._table_spec = table_spec
+        return table_spec
 
-            try:
-                option['url_params']
-            except KeyError:
-                raise ImproperlyConfigured(
-                    "%(cls)s needs options_list attr created in the __init__ "
-                    "method. It must be a list of dictionaries with and key"
-                    "called 'url_params' with a list of parameters of the "
-                    "url_option as string" % {
-                        'cls': self.__class__.__name__
-                    }
-                )
+    @property
+    def table_spec(self):
+        """
+        The TableSpec of the view, the one of the class unless the fields or
+        the options_list of the view are others (Set in the __init__ or
+        returned by get_options_list). Those are compiled once by content and
+        kept by the class, the table_spec_cache_size last ones
+        """
+        cls = self.__class__
+        fields = self.fields
+        options_list = self.get_options_list()
+        if fields is cls.fields and options_list is cls.options_list:
+            return cls.get_table_spec()
+        compiled = self.__dict__.get('_view_table_spec')
+        if compiled is not None:
+            compiled_fields, compiled_options_list, table_spec = compiled
+            if (
+                (fields is compiled_fields or fields == compiled_fields)
+                and (options_list is compiled_options_list
+                     or options_list == compiled_options_list)
+            ):
+                return table_spec
+        table_spec = cls.get_view_table_spec(fields, options_list)
+        self._view_table_spec = (fields, options_list, table_spec)
+        return table_spec
+
+    @classmethod
+    def get_view_table_spec(cls, fields, options_list):
+        """
+        Method to get the TableSpec of other fields and options_list of the
+        view class, the ones with the same content share it
+        """
+        key = (
+            None if fields is None else tuple(fields), repr(options_list)
+        )
+        with table_specs_lock:
+            table_specs = cls.__dict__.get('_table_specs')
+            if table_specs is None:
+                table_specs = cls._table_specs = OrderedDict()
+            table_spec = table_specs.get(key)
+            if table_spec is not None:
+                table_specs.move_to_end(key)
+                return table_spec
+        table_spec = TableSpec(cls, fields, options_list)
+        with table_specs_lock:
+            table_specs[key] = table_spec
+            while len(table_specs) > cls.table_spec_cache_size:
+                table_specs.popitem(last=False)
+        return table_spec
 
     def get_options_list(self):
         return self.options_list
@@ -95,14 +237,10 @@ class DatatablesListView:
         Method to get all the field instances using the Django's Model _meta API
 
         Juan Diego: Cached fields into _fields attr
+
+        The fields are resolved once by the TableSpec of the view
         """
-        if self._fields is None:
-            if self.fields:
-                self._fields = [self.model._meta.get_field(field)
-                                for field in self.fields]
-            else:
-                self._fields = self.model._meta.get_fields()
-        return self._fields
+        return self.table_spec.fields
 
     def get_field_names(self):
         """
@@ -113,9 +251,61 @@ class DatatablesListView:
         Juan Diego: Use get_fields instead
         """
         if self.fields is None:
-            self.fields = [field.name for field in self.get_fields()]
+            return [field.name for field in self.get_fields()]
         return self.fields
 
+    def get_related_fields(self):
+        """
+        Method to get all the field instances whose values are read for every
+        row, those are the displayed fields and the fields used by the options
+        as url parameters or conditions
+        """
+        return self.table_spec.related_fields
+
+    def get_query_plan(self):
+        """
+        Method to get the relations that must be loaded with the page to avoid
+        one query by row for each related field. Returns a tuple with the
+        lookups for select_related (Forward relations) and the Prefetch objects
+        for prefetch_related (Relations to many)
+        """
+        select_related = []
+        prefetch_related = []
+        for column in self.table_spec.related_columns:
+            if column.kind == M2M:
+                # Reverse relations are accessed by its accessor name
+                prefetch_related.append(Prefetch(
+                    column.accessor_name,
+                    queryset=column.field.related_model._default_manager.all()
+                ))
+            elif column.kind == FK and column.field.concrete:
+                select_related.append(column.name)
+        return select_related, prefetch_related
+
+    def apply_query_plan(self, queryset):
+        select_related, prefetch_related = self.get_query_plan()
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+    def annotate_option_conditions(self, queryset):
+        """
+        Method to annotate the condition_expression of the options on the
+        queryset, a boolean by option that's read by get_rendered_urls
+        """
+        annotations = self.table_spec.annotations
+        if not annotations or not self.get_options_list():
+            return queryset
+        return queryset.annotate(**annotations)
+
+    def get_count_strategy(self):
+        return self.count_strategy
+
+    def get_search_backend(self):
+        return self.search_backend
+
     def get_draw_params(self, request):
         """
         Author: Milton Lenis
@@ -127,31 +317,105 @@ class DatatablesListView:
         start = int(request.GET.get('start', 0))
         end = start + int(request.GET.get('length', 0))
 
-        column = int(request.GET.get('order[0][column]', 0))
         field_names = self.get_field_names()
-        sort_column = field_names[column]
+        # Multi-column ordering, datatables sends order[i] for each column
+        # sorted with shift-click
+        ordering = []
+        counter = 0
+        while 'order[%s][column]' % counter in request.GET:
+            column = int(request.GET['order[%s][column]' % counter])
+            sort_order = request.GET.get('order[%s][dir]' % counter, "")
+            field_name = field_names[column]
+            if field_name not in [name for name, _ in ordering]:
+                ordering.append((field_name, sort_order))
+            counter += 1
+        if not ordering:
+            ordering.append((field_names[0], ""))
+        ordering = self.check_ordering(ordering)
+        sort_column, sort_order = ordering[0]
 
-        sort_order = request.GET.get('order[0][dir]', "")
         search = request.GET.get('search[value]', "")
         draw = int(request.GET.get('draw', 0))
 
-        return Draw(start, end, sort_column, sort_order, search, draw)
+        column_filters = []
+        for counter, field_name in enumerate(field_names):
+            value = request.GET.get(
+                'columns[%s][search][value]' % counter, ""
+            ).strip()
+            searchable = request.GET.get(
+                'columns[%s][searchable]' % counter, "true"
+            )
+            if value and searchable != "false":
+                column_filters.append((field_name, value))
+
+        return Draw(
+            start, end, sort_column, sort_order, search, draw,
+            tuple(column_filters), tuple(ordering)
+        )
+
+    def check_ordering(self, ordering):
+        """
+        Method to check that the ordering requested is supported by an index
+        declared in indexed_orderings, to avoid sorting the whole table. When
+        it isn't, the ordering is rejected or downgraded to the longest
+        supported part (Or the pk) depending on unindexed_ordering
+        """
+        if self.indexed_orderings is None:
+            return ordering
+        field_names = [field_name for field_name, _ in ordering]
+        supported = 0
+        for indexed_ordering in self.indexed_orderings:
+            indexed_ordering = list(indexed_ordering)
+            length = 0
+            while (length < len(field_names)
+                   and field_names[:length + 1] == indexed_ordering[:length + 1]):
+                length += 1
+            supported = max(supported, length)
+        if supported == len(ordering):
+            return ordering
+        if self.unindexed_ordering == 'reject':
+            raise DisallowedOrdering(
+                "%(cls)s has no index to order by %(ordering)s" % {
+                    'cls': self.__class__.__name__,
+                    'ordering': ", ".join(field_names)
+                }
+            )
+        return ordering[:supported] or [(self.model._meta.pk.name, "")]
 
     def filter_by_search_text(self, queryset, search_text):
         """
         Author: Milton Lenis
         Date: 16 April 2017
-        Method to filter the queryset given a search_text. This filters the
+        Method to filter the queryset given a search_text. The filtering is
+        done by the search backend of the view, by default it filters the
         queryset by each one of the fields doing icontains lookup and spliting
         the search_text into words
         """
-        # First we need to generate Q objects to do the filtering all over the
-        # queryset
-        q_objects = generate_q_objects_by_fields_and_words(
-            self.get_fields(),
-            search_text
+        return self.get_search_backend().filter(self, queryset, search_text)
+
+    def filter_by_column_filters(self, queryset, column_filters):
+        """
+        Method to filter the queryset by the search values of the columns,
+        each one is a filter over its column alone and all of them must match,
+        see SearchCompiler.compile_column_filter
+        """
+        search_compiler = self.table_spec.search_compiler
+        for field_name, value in column_filters:
+            queryset = queryset.filter(
+                search_compiler.compile_column_filter(field_name, value)
+            )
+        return queryset
+
+    def filter_by_draw_filters(self, queryset, draw_params):
+        """
+        Method to filter the queryset by the search text and the column
+        filters of the draw
+        """
+        if draw_params.search:
+            queryset = self.filter_by_search_text(queryset, draw_params.search)
+        return self.filter_by_column_filters(
+            queryset, draw_params.column_filters
         )
-        return queryset.filter(q_objects)
 
     def filter_by_draw_params(self, queryset, draw_params):
         """
@@ -161,29 +425,337 @@ class DatatablesListView:
         queryset sorted (Depending of the order) by a column and slices the
         queryset by a start position and end position
         """
-        sort_order = ""
-        if draw_params.sort_order == "desc":
-            sort_order = "-"
-        sort_criteria = "{0}{1}".format(sort_order, draw_params.sort_column)
-        ordered_qs = queryset.order_by(sort_criteria)
+        if self.keyset_pagination:
+            sort_keys = self.get_keyset_sort_keys(draw_params)
+            if sort_keys:
+                return self.filter_by_keyset(queryset, draw_params, sort_keys)
+
+        ordered_qs = queryset.order_by(*self.get_ordering(draw_params))
         return ordered_qs[draw_params.start:draw_params.end]
 
+    def get_ordering(self, draw_params):
+        """
+        Method to get the order_by criteria of the draw, the pk is added as
+        tie-breaker so the pages are deterministic when the sort columns
+        aren't unique
+        """
+        ordering = draw_params.ordering or (
+            (draw_params.sort_column, draw_params.sort_order),
+        )
+        pk_name = self.model._meta.pk.name
+        sort_criteria = []
+        for field_name, sort_order in ordering:
+            sort_criteria.append("{0}{1}".format(
+                "-" if sort_order == "desc" else "", field_name
+            ))
+            if field_name == pk_name:
+                return sort_criteria
+        descending = ordering[0][1] == "desc"
+        sort_criteria.append("-pk" if descending else "pk")
+        return sort_criteria
+
+    def get_keyset_sort_keys(self, draw_params):
+        """
+        Method to get the (field_name, descending) sort keys used by the keyset
+        pagination, the pk is added as tie-breaker to get a total order.
+        Returns None when a sort column can't be used for seeking (Relations,
+        sorted by the ordering of the related model, or nullable columns), in
+        that case the OFFSET pagination is used
+        """
+        ordering = draw_params.ordering or (
+            (draw_params.sort_column, draw_params.sort_order),
+        )
+        sort_keys = []
+        for field_name, sort_order in ordering:
+            field = self.model._meta.get_field(field_name)
+            if not field.concrete or field.is_relation or field.null:
+                return None
+            descending = sort_order == "desc"
+            if field.primary_key:
+                sort_keys.append(('pk', descending))
+                return sort_keys
+            sort_keys.append((field.attname, descending))
+        # Same tie-breaker of get_ordering
+        sort_keys.append(('pk', ordering[0][1] == "desc"))
+        return sort_keys
+
+    def get_cache_scope(self):
+        """
+        Method to get the scope of the values cached for the draws (The keyset
+        boundaries and the identical draws), the user of the request.
+        Override it if the queryset of the view depends on something else of
+        the request
+        """
+        user = getattr(getattr(self, 'request', None), 'user', None)
+        return getattr(user, 'pk', None)
+
+    def get_keyset_cache_key(self, draw_params, sort_keys):
+        # The boundaries are only valid for the same ordering and filters, the
+        # same rows (The version of the model) and the same scope
+        version = get_model_version(self.model, self.keyset_cache_alias)
+        filters = normalize_draw_filters(draw_params)
+        digest = md5(repr(
+            (sort_keys, filters, self.get_cache_scope())
+        ).encode()).hexdigest()
+        return "datatables_listview:keyset:%s.%s:%s:%s" % (
+            self.__class__.__module__, self.__class__.__qualname__, version,
+            digest
+        )
+
+    def get_keyset_boundaries(self, draw_params, sort_keys):
+        """
+        Method to get the known boundaries for the given ordering and search,
+        it's a dictionary with the position of a row as key and the values of
+        its sort keys as value
+        """
+        cache = caches[self.keyset_cache_alias]
+        key = self.get_keyset_cache_key(draw_params, sort_keys)
+        return cache.get(key) or {}
+
+    def remember_keyset_boundaries(self, draw_params, page):
+        """
+        Method to store the first and last rows of a served page as boundaries
+        for the next keyset seeks, page must be already evaluated
+        """
+        sort_keys = self.get_keyset_sort_keys(draw_params)
+        if not sort_keys:
+            return
+        rows = list(page)
+        if not rows:
+            return
+        boundaries = self.get_keyset_boundaries(draw_params, sort_keys)
+        for position, obj in (
+            (draw_params.start, rows[0]),
+            (draw_params.start + len(rows) - 1, rows[-1])
+        ):
+            boundaries.pop(position, None)
+            boundaries[position] = tuple(
+                getattr(obj, name) for name, _ in sort_keys
+            )
+        # Dictionaries keep the insertion order, so the oldest are discarded
+        for position in list(boundaries)[:-self.keyset_max_boundaries]:
+            del boundaries[position]
+        caches[self.keyset_cache_alias].set(
+            self.get_keyset_cache_key(draw_params, sort_keys),
+            boundaries,
+            self.keyset_cache_timeout
+        )
+
+    def filter_by_keyset(self, queryset, draw_params, sort_keys):
+        """
+        Method to get the page with the keyset pagination, it looks for the
+        nearest known boundary and seeks from it, so the database only skips
+        the rows between the boundary and the page. Far random jumps without a
+        near boundary fall back to OFFSET
+        """
+        start, end = draw_params.start, draw_params.end
+        ordered_qs = queryset.order_by(*[
+            "%s%s" % ("-" if descending else "", name)
+            for name, descending in sort_keys
+        ])
+        boundaries = self.get_keyset_boundaries(draw_params, sort_keys)
+        candidates = [
+            position for position in boundaries
+            if abs(position - start) <= self.keyset_max_distance
+        ]
+        if end <= start or not candidates:
+            return ordered_qs[start:end]
+
+        # On ties the boundaries before the page are preferred because they
+        # need a single query
+        position = min(
+            candidates,
+            key=lambda position: (abs(position - start), position > start)
+        )
+        values = boundaries[position]
+        if position <= start:
+            offset = start - position
+            seek_qs = ordered_qs.filter(
+                generate_keyset_q(sort_keys, values, inclusive=True)
+            )
+            return seek_qs[offset:offset + end - start]
+
+        # The page is before the boundary, so the first row of the page is
+        # searched seeking backwards and then the page is fetched from it
+        reversed_keys = [
+            (name, not descending) for name, descending in sort_keys
+        ]
+        reversed_qs = queryset.order_by(*[
+            "%s%s" % ("-" if descending else "", name)
+            for name, descending in reversed_keys
+        ]).filter(generate_keyset_q(reversed_keys, values))
+        offset = position - start - 1
+        first_rows = reversed_qs.select_related(None).prefetch_related(
+            None
+        ).values_list(
+            *[name for name, _ in sort_keys]
+        )[offset:offset + 1]
+        first_rows = list(first_rows)
+        if not first_rows:
+            return ordered_qs[start:end]
+        seek_qs = ordered_qs.filter(
+            generate_keyset_q(sort_keys, first_rows[0], inclusive=True)
+        )
+        return seek_qs[:end - start]
+
+    def fetch_values_rows(self, queryset):
+        """
+        Method to fetch the page with values_list, only the columns of the
+        fields read by the rows are transferred and no model instance is built
+        for the page. The values that need Python (Relations) are loaded in
+        bulk, and all the values are left in the row cache so evaluate_data
+        gets them without touching the rows
+        """
+        columns = self.table_spec.related_columns
+        attnames = ['pk'] + [
+            column.attname for column in columns
+            if column.field.concrete and column.kind != M2M
+        ] + [
+            name for name in self.table_spec.annotations
+            if name in queryset.query.annotations
+        ]
+        rows = [
+            ValuesRow(values[0], dict(zip(attnames, values)))
+            for values in queryset.values_list(*attnames)
+        ]
+        if not rows:
+            return rows
+
+        for column in columns:
+            field = column.field
+            if column.kind == M2M:
+                values = self.get_to_many_values(field, rows)
+            elif column.kind == FK:
+                values = self.get_related_objects_values(field, rows)
+            elif column.kind == CHOICES:
+                # Like get_FOO_display but with the choices of the spec
+                values = {
+                    row.pk: force_str(
+                        column.choices.get(getattr(row, field.attname),
+                                           getattr(row, field.attname)),
+                        strings_only=True
+                    )
+                    for row in rows
+                }
+            elif column.kind == ARRAY:
+                values = {
+                    row.pk: ", ".join(arrayfield_keys_to_values(
+                        getattr(row, field.attname), column.choices
+                    ))
+                    for row in rows
+                }
+            else:
+                values = {row.pk: getattr(row, field.attname) for row in rows}
+            for pk, value in values.items():
+                self.get_row_values(pk)[column.index] = value
+        return rows
+
+    def get_related_objects_values(self, field, rows):
+        # Forward relations, the related objects are loaded with one query
+        target_field = field.target_field
+        related_objects = field.related_model._default_manager.in_bulk(
+            {getattr(row, field.attname) for row in rows} - {None},
+            field_name=target_field.name
+        )
+        return {
+            row.pk: related_objects.get(getattr(row, field.attname))
+            for row in rows
+        }
+
+    def get_to_many_values(self, field, rows):
+        # Relations to many, the related objects are loaded with one query
+        # annotated with the pk of the row they belong to
+        if field.auto_created:
+            query_name = field.field.name
+        else:
+            query_name = field.related_query_name()
+        related_objects = field.related_model._default_manager.filter(**{
+            "%s__in" % query_name: [row.pk for row in rows]
+        }).annotate(_datatables_row_pk=F(query_name))
+        values = {row.pk: [] for row in rows}
+        for related_object in related_objects:
+            values[related_object._datatables_row_pk].append(
+                str(related_object)
+            )
+        return {pk: ", ".join(value) for pk, value in values.items()}
+
     def generate_rows(self, queryset=None):
-        queryset = queryset or self.get_queryset()
+        if queryset is None:
+            queryset = self.get_queryset()
         data = []
         for obj in queryset:
             row = self.get_obj_data(obj)
             data.append(row)
         return data
 
+    def render_rows(self, queryset):
+        if self.compact_protocol:
+            return self.generate_compact_rows(queryset)
+        if self.get_options_list():
+            return self.generate_rows_with_options(queryset)
+        return self.generate_rows(queryset)
+
+    def generate_compact_rows(self, queryset=None):
+        """
+        Method to generate the rows of the compact protocol, the raw values of
+        the cells and the options as [bitmask, url params]. When the options
+        can't be rendered in the browser (The urls are reversed by row) their
+        HTML is sent instead
+        """
+        with_options = bool(self.get_options_list())
+        if queryset is None:
+            queryset = self.get_queryset()
+            if with_options:
+                queryset = self.annotate_option_conditions(queryset)
+        compact_layout = None
+        if with_options:
+            compact_layout = self.table_spec.get_compact_layout()
+            option_renderer = self.get_option_renderer()
+        columns = self.table_spec.columns
+        data = []
+        for obj in queryset:
+            row = [
+                self.get_compact_value(
+                    column, self.evaluate_data(obj, column.field)
+                )
+                for column in columns
+            ]
+            if with_options:
+                if compact_layout is None:
+                    row.append(option_renderer.render_options(
+                        self.get_rendered_urls(obj)
+                    ))
+                else:
+                    row.append(self.get_compact_options(obj))
+            data.append(row)
+        return data
+
+    def get_compact_value(self, column, value):
+        if value is None or isinstance(value, COMPACT_VALUE_TYPES):
+            return value
+        # Related objects, files and the like are sent as text
+        return str(value)
+
+    def get_compact_options(self, obj):
+        mask = 0
+        for option in self.get_visible_options(obj):
+            mask |= 1 << option.index
+        if not mask:
+            return [0, []]
+        return [mask, [
+            quote_url_param(self.evaluate_data(obj, column.field))
+            for column in self.table_spec.param_columns
+        ]]
+
     def generate_rows_with_options(self, queryset=None):
-        queryset = queryset or self.get_queryset()
+        if queryset is None:
+            queryset = self.annotate_option_conditions(self.get_queryset())
         data = []
+        option_renderer = self.get_option_renderer()
         for obj in queryset:
             row = self.get_obj_data(obj)
-            options = render_to_string(
-                "datatables_listview/options_list_rendering_tool.html",
-                {'urls': self.get_rendered_urls(obj)}
+            options = option_renderer.render_options(
+                self.get_rendered_urls(obj)
             )
             row.append(options)
             data.append(row)
@@ -191,103 +763,233 @@ class DatatablesListView:
 
     def get_obj_data(self, obj):
         row = []
-        for field in self.get_fields():
-            value = self.evaluate_data(obj, field)
-            value = self.get_rendered_html_value(field, value)
+        for column in self.table_spec.columns:
+            value = self.evaluate_data(obj, column.field)
+            value = self.get_rendered_html_value(column.field, value)
             row.append(value)
         return row
 
+    def get_option_renderer(self):
+        return self.table_spec.get_option_renderer()
+
     def get_rendered_urls(self, obj):
+        option_renderer = self.get_option_renderer()
         rendered_urls = []
-        for option_conf in self.get_options_list():
-            try:
-                permissions = option_conf['permissions']
-            except KeyError:
-                permissions = None
-
-            try:
-                conditions = option_conf['conditions']
-            except KeyError:
-                conditions = None
-
-            if self.evaluate_conditions(obj, permissions, conditions):
-                params = []
-                for param in option_conf['url_params']:
-                    field = self.model._meta.get_field(param)
-                    field_data = self.evaluate_data(obj, field)
-                    params.append(field_data)
-                rendered_urls.append(
-                    render_to_string(
-                        "datatables_listview/url_rendering_tool.html",
-                        {
-                            'name': option_conf['option_label'],
-                            'url': reverse(
-                                option_conf['option_url'],
-                                args=params
-                            ),
-                            'icon': option_conf.get('icon'),
-                            'confirm_modal': option_conf.get('confirm_modal')
-                        }
-                    )
-                )
+        for option in self.get_visible_options(obj):
+            params = []
+            for column in option.url_params:
+                field_data = self.evaluate_data(obj, column.field)
+                params.append(field_data)
+            rendered_urls.append(
+                option_renderer.render_option(option, params)
+            )
         return rendered_urls
 
+    def get_visible_options(self, obj):
+        # The permissions are the same for all the rows
+        for option in self.get_permitted_options():
+            if option.annotation:
+                visible = getattr(obj, option.annotation, MISSING)
+                if visible is MISSING:
+                    visible = self.evaluate_condition_expression(obj, option)
+                if not visible:
+                    continue
+            if self.evaluate_conditions(obj, (), option.conditions):
+                yield option
+
+    def evaluate_condition_expression(self, obj, option):
+        """
+        Method to evaluate the condition_expression of an option for an object
+        that wasn't read by get_page_queryset (Without the annotation), it
+        takes a query by object. The result is kept in the object
+        """
+        visible = self.model._default_manager.filter(pk=obj.pk).annotate(**{
+            option.annotation: option.expression
+        }).values_list(option.annotation, flat=True).first()
+        setattr(obj, option.annotation, bool(visible))
+        return bool(visible)
+
+    def get_perm_manager(self):
+        if self.perms_manager:
+            return getattr(self.request.user, self.perms_manager)
+        return self.request.user
+
+    def get_user_permissions(self):
+        """
+        Method to get the values of the permissions used by the options for
+        the user of the request, they are evaluated once by draw. The values
+        are kept in shared_permissions too, the batch draws share it between
+        the tables of the same request
+        """
+        if self.user_permissions is None:
+            self.user_permissions = {}
+            perm_manager = MISSING
+            for permission in self.table_spec.permissions:
+                key = (self.perms_manager, permission)
+                if key not in self.shared_permissions:
+                    if perm_manager is MISSING:
+                        perm_manager = self.get_perm_manager()
+                    perm = getattr(perm_manager, permission)
+                    if callable(perm):
+                        perm = perm()
+                    self.shared_permissions[key] = bool(perm)
+                self.user_permissions[permission] = self.shared_permissions[key]
+        return self.user_permissions
+
+    def get_permitted_options(self):
+        user_permissions = self.get_user_permissions()
+        return [
+            option for option in self.table_spec.options
+            if all(user_permissions[permission]
+                   for permission in option.permissions)
+        ]
+
     def evaluate_conditions(self, obj, permissions, conditions):
         if permissions:
-            if self.perms_manager:
-                perm_manager = getattr(self.request.user, self.perms_manager)
-            else:
-                perm_manager = self.request.user
+            user_permissions = self.get_user_permissions()
             for permission in permissions:
-                perm = getattr(perm_manager, permission)
-                if callable(perm):
-                    perm = perm()
-                if not perm:
+                if not user_permissions[permission]:
                     return False
         if conditions:
-            for contition in conditions:
-                field_name = contition['field']
-                field = self.model._meta.get_field(field_name)
-                field_value = self.evaluate_data(obj, field)
-                condition_values = contition['condition_values']
-                condition_func = contition['condition_func']
-                result = condition_func(field_value, condition_values)
+            # The conditions are the ones compiled in the spec options
+            for condition in conditions:
+                field_value = self.evaluate_data(obj, condition.column.field)
+                result = condition.condition_func(
+                    field_value, condition.condition_values
+                )
                 if not result:
                     return False
         return True
 
-    def evaluate_data(self, obj, field):
-        # evaluate data is called several times in the same life cycle of the
-        # view
+    def reset_row_values(self):
+        """
+        Method to empty the row cache, it's scoped to a single draw (Or a
+        chunk of an export) so it only holds the values of the rows being
+        rendered
+        """
+        self.row_values = {}
+
+    def get_row_values(self, pk):
+        # The values of a row are a list with a slot by column of the spec
         try:
-            value = self.fields_data[f'{field.name}-{obj.pk}']
-            return value
+            return self.row_values[pk]
         except KeyError:
-            pass
+            row_values = [MISSING] * len(self.table_spec.related_columns)
+            self.row_values[pk] = row_values
+            return row_values
 
-        if field.choices:
-            value = getattr(obj, 'get_%s_display' % field.name)()
-        elif field.many_to_many:
-            value = getattr(obj, field.name)
+    def evaluate_data(self, obj, field):
+        # evaluate data is called several times in the same life cycle of the
+        # view, the values are cached by row and column for the current draw
+        column = self.table_spec.get_column(field)
+        if column.index is not None:
+            row_values = self.get_row_values(obj.pk)
+            value = row_values[column.index]
+            if value is not MISSING:
+                return value
+
+        if column.kind == CHOICES:
+            # Like get_FOO_display but with the choices of the spec
+            value = getattr(obj, column.attname)
+            value = force_str(
+                column.choices.get(value, value), strings_only=True
+            )
+        elif column.kind == M2M:
+            value = getattr(obj, column.accessor_name)
             if type(value) == list:
                 value = ", ".join(value)
             else:
-                qs_objects = getattr(obj, field.name).all()
+                # Uses the objects loaded by the prefetch_related of the
+                # query plan
+                qs_objects = value.all()
                 value = ", ".join([str(obj) for obj in qs_objects])
-            return value
-        elif field.__class__.__name__ == 'ArrayField':
-            choices = field.base_field.choices
+        elif column.kind == ARRAY:
             keys = getattr(obj, field.name)
-            value = ", ".join(arrayfield_keys_to_values(keys, choices))
+            value = ", ".join(arrayfield_keys_to_values(keys, column.choices))
         else:
             value = getattr(obj, field.name)
 
-        self.fields_data[f'{field.name}-{obj.pk}'] = value
+        if column.index is not None:
+            row_values[column.index] = value
         return value
 
     def get_rendered_html_value(self, field, value):
         return "<span>%s</span>" % value
 
+    def fetch_page_versions(self, queryset, draw_params):
+        """
+        Method to fetch only the pk and the version of the rows of the page
+        (And the keyset sort keys), the rows are rendered or taken from the
+        row cache with them
+        """
+        names = ['pk', self.model._meta.get_field(
+            self.row_cache_version_field
+        ).attname]
+        if self.keyset_pagination:
+            sort_keys = self.get_keyset_sort_keys(draw_params) or ()
+            names += [name for name, _ in sort_keys if name not in names]
+        return [
+            ValuesRow(values[0], dict(zip(names, values)))
+            for values in queryset.values_list(*names)
+        ]
+
+    def get_permissions_fingerprint(self):
+        # The options of a cached row depend on the permissions of the user
+        return tuple(sorted(self.get_user_permissions().items()))
+
+    def get_row_cache_key(self, pk, version, fingerprint):
+        # The urls of the options depend on the script prefix and the urlconf,
+        # the labels on the language and the cells on the fields and options
+        digest = md5(repr((
+            pk, version, fingerprint, self.compact_protocol,
+            get_script_prefix(), get_urlconf(), get_language(),
+            self.table_spec.digest
+        )).encode()).hexdigest()
+        return "datatables_listview:row:%s.%s:%s" % (
+            self.__class__.__module__, self.__class__.__qualname__, digest
+        )
+
+    def generate_cached_rows(self, page):
+        """
+        Method to generate the rows of the page using the row cache, the
+        cached rows are read with a single get_many and only the missing ones
+        are fetched from the database and rendered
+        """
+        version_attname = self.model._meta.get_field(
+            self.row_cache_version_field
+        ).attname
+        fingerprint = self.get_permissions_fingerprint()
+        keys = {
+            row.pk: self.get_row_cache_key(
+                row.pk, getattr(row, version_attname), fingerprint
+            )
+            for row in page
+        }
+        cache = caches[self.row_cache_alias]
+        cached_rows = cache.get_many(list(keys.values()))
+        missing_pks = [
+            row.pk for row in page if keys[row.pk] not in cached_rows
+        ]
+        if missing_pks:
+            queryset = self.annotate_option_conditions(
+                self.get_queryset().filter(pk__in=missing_pks)
+            )
+            if self.values_fast_path:
+                objects = self.fetch_values_rows(queryset)
+            else:
+                objects = list(self.apply_query_plan(queryset))
+            rows = self.render_rows(objects)
+            rendered_rows = {
+                keys[obj.pk]: row for obj, row in zip(objects, rows)
+            }
+            cache.set_many(rendered_rows, self.row_cache_timeout)
+            cached_rows.update(rendered_rows)
+        # The rows deleted after reading the page are skipped
+        return [
+            cached_rows[keys[row.pk]] for row in page
+            if keys[row.pk] in cached_rows
+        ]
+
     def generate_data(self, request):
         """
         Author: Milton Lenis
@@ -295,27 +997,306 @@ class DatatablesListView:
         Method to generate the final data required for the JsonResponse,
         it returns a dictionary with the data formated as datatables requires it
         """
+        self.draw_stats = None
+        if self.is_instrumented():
+            self.draw_stats = DrawStats()
+        with self.stage('draw_params'):
+            draw_params, queryset, filtered_queryset = self.prepare_draw(
+                request
+            )
+        memory_page = None
+        if self.memory_engine is not None:
+            with self.stage('memory'):
+                memory_page = self.memory_engine.get_page(self, draw_params)
+        if memory_page is None:
+            with self.stage('count'):
+                total_count, filtered_count = self.count_draw(
+                    queryset, filtered_queryset, draw_params
+                )
+            generated_rows = self.generate_page_rows(
+                filtered_queryset, draw_params
+            )
+        else:
+            total_count, filtered_count, page = memory_page
+            generated_rows = self.generate_memory_page_rows(page)
+        final_data = self.get_final_data(
+            draw_params, total_count, filtered_count, generated_rows
+        )
+        if self.draw_stats is not None:
+            self.draw_stats.draw_params = draw_params
+            if self.debug_stats:
+                final_data['debug'] = self.draw_stats.as_dict()
+        return final_data
+
+    def is_instrumented(self):
+        return bool(
+            self.instrument_draws or self.server_timing or self.debug_stats
+            or self.slow_draw_threshold is not None
+        )
+
+    def stage(self, name):
+        """
+        Method to measure a stage of the draw, it does nothing when the draws
+        aren't instrumented
+        """
+        if self.draw_stats is None:
+            return NULL_STAGE
+        return self.draw_stats.stage(name)
+
+    def finish_draw_stats(self, response):
+        """
+        Method to report the stats of the draw once the response is ready
+        """
+        draw_stats = self.draw_stats
+        if self.server_timing:
+            server_timing = draw_stats.server_timing()
+            if response.has_header('Server-Timing'):
+                # The response of a batch of draws
+                server_timing = "%s, %s" % (
+                    response['Server-Timing'], server_timing
+                )
+            response['Server-Timing'] = server_timing
+        draw_finished.send(
+            sender=self.__class__, view=self, draw_stats=draw_stats
+        )
+        if (
+            self.slow_draw_threshold is not None
+            and draw_stats.duration >= self.slow_draw_threshold
+        ):
+            draw_params = draw_stats.draw_params._replace(
+                search=normalize_search_text(draw_stats.draw_params.search),
+                draw=None
+            )
+            slow_draws_logger.warning(
+                "Slow draw of %s.%s: %.1f ms, %s queries, %r",
+                self.__class__.__module__, self.__class__.__qualname__,
+                draw_stats.duration * 1000, draw_stats.queries, draw_params,
+                extra={'draw_stats': draw_stats.as_dict()}
+            )
+
+    def prepare_draw(self, request):
+        """
+        Method to start a draw, it returns the draw params, the queryset and
+        the queryset filtered by the search and the column filters. None of
+        them has been evaluated
+        """
+        self.reset_row_values()
+        self.user_permissions = None
         draw_params = self.get_draw_params(request)
         queryset = self.get_queryset()
+        filtered_queryset = queryset
+        if draw_params.search or draw_params.column_filters:
+            filtered_queryset = self.filter_by_draw_filters(
+                queryset, draw_params
+            )
+        return draw_params, queryset, filtered_queryset
 
-        if draw_params.search:
-            queryset = self.filter_by_search_text(queryset, draw_params.search)
+    def count_draw(self, queryset, filtered_queryset, draw_params):
+        count_strategy = self.get_count_strategy()
+        total_count = count_strategy.count_total(self, queryset)
+        if filtered_queryset is queryset:
+            return total_count, total_count
+        filtered_count = count_strategy.count_filtered(
+            self, filtered_queryset, draw_params
+        )
+        return total_count, filtered_count
 
-        objects_count = queryset.count()
-        # This uses the 'filter_by_draw_params' to filter the queryset according
-        # with the draw parameters
-        # This means: it's the filter for the displaying page of the datatable
-        queryset = self.filter_by_draw_params(queryset, draw_params)
-        if self.get_options_list():
-            generated_rows = self.generate_rows_with_options(queryset)
+    def generate_page_rows(self, queryset, draw_params):
+        if self.row_cache_version_field:
+            # Only the pks and versions of the page are read, the rows are
+            # taken from the row cache
+            with self.stage('page_query'):
+                queryset = self.fetch_page_versions(
+                    self.filter_by_draw_params(queryset, draw_params),
+                    draw_params
+                )
+            with self.stage('rows'):
+                generated_rows = self.generate_cached_rows(queryset)
         else:
-            generated_rows = self.generate_rows(queryset)
-        return {
+            with self.stage('page_query'):
+                # The relations are loaded in bulk with the page, so rendering
+                # the rows doesn't do a query by row
+                if not self.values_fast_path:
+                    queryset = self.apply_query_plan(queryset)
+                queryset = self.annotate_option_conditions(queryset)
+                # This uses the 'filter_by_draw_params' to filter the queryset
+                # according with the draw parameters
+                # This means: it's the filter for the displaying page of the
+                # datatable
+                queryset = self.filter_by_draw_params(queryset, draw_params)
+                if self.values_fast_path:
+                    queryset = self.fetch_values_rows(queryset)
+                else:
+                    queryset = list(queryset)
+            with self.stage('rows'):
+                generated_rows = self.render_rows(queryset)
+        if self.keyset_pagination:
+            self.remember_keyset_boundaries(draw_params, queryset)
+        return generated_rows
+
+    def generate_memory_page_rows(self, page):
+        """
+        Method to generate the rows of a page selected by the memory engine,
+        only the objects of the page are read, by pk
+        """
+        if self.row_cache_version_field:
+            with self.stage('rows'):
+                return self.generate_cached_rows(page)
+        with self.stage('page_query'):
+            queryset = self.get_queryset().filter(
+                pk__in=[row.pk for row in page]
+            )
+            if not self.values_fast_path:
+                queryset = self.apply_query_plan(queryset)
+            queryset = self.annotate_option_conditions(queryset)
+            if self.values_fast_path:
+                objects = self.fetch_values_rows(queryset)
+            else:
+                objects = list(queryset)
+            objects = {obj.pk: obj for obj in objects}
+            # In the order of the page, without the rows deleted meanwhile
+            objects = [objects[row.pk] for row in page if row.pk in objects]
+        with self.stage('rows'):
+            return self.render_rows(objects)
+
+    def get_final_data(self, draw_params, total_count, filtered_count,
+                       generated_rows):
+        final_data = {
             'draw': draw_params.draw,
-            'recordsTotal': objects_count,
-            'recordsFiltered': objects_count,
+            'recordsTotal': total_count,
+            'recordsFiltered': filtered_count,
             'data': generated_rows
         }
+        if self.compact_protocol and self.get_options_list():
+            final_data['optionsLayout'] = self.table_spec.get_compact_layout()
+        return final_data
+
+    def get_draw_key(self, draw_params):
+        """
+        Method to get the key of the identical draws, the draw params without
+        the draw counter, the permissions and the scope of the user (See
+        get_cache_scope) and what the rendering depends on. It's used by the
+        single flight and the window prefetch
+        """
+        return (
+            self.__class__.__module__, self.__class__.__qualname__,
+            draw_params._replace(draw=None), self.get_permissions_fingerprint(),
+            self.get_cache_scope(), get_script_prefix(), get_urlconf(),
+            get_language(), self.table_spec.digest
+        )
+
+    def generate_ajax_data(self, request):
+        """
+        Method to generate the data of the ajax requests, it's taken from the
+        prefetched windows when it's possible and the next windows are
+        prefetched
+        """
+        if self.window_prefetch is None:
+            return self.generate_shared_data(request)
+        self.user_permissions = None
+        self.draw_stats = None
+        draw_params = self.get_draw_params(request)
+        final_data = self.window_prefetch.get(self, draw_params)
+        if final_data is None:
+            final_data = self.generate_shared_data(request)
+        self.window_prefetch.schedule(self, request, draw_params, final_data)
+        return final_data
+
+    def generate_shared_data(self, request):
+        """
+        Method to generate the data of the draw sharing it with the identical
+        draws being served at the same time, every response keeps its own
+        draw counter
+        """
+        if self.single_flight is None:
+            return self.generate_data(request)
+        self.user_permissions = None
+        self.draw_stats = None
+        draw_params = self.get_draw_params(request)
+        final_data = self.single_flight.run(
+            self.get_draw_key(draw_params),
+            lambda: self.generate_data(request)
+        )
+        return dict(final_data, draw=draw_params.draw)
+
+    def get_json_serializer(self):
+        return self.json_serializer or get_json_serializer()
+
+    def render_json_response(self, data):
+        serializer = self.get_json_serializer()
+        with self.stage('json'):
+            content = serializer.dumps(data)
+        return HttpResponse(content, content_type=serializer.content_type)
+
+    def get_export_header(self):
+        column_defs = create_column_defs_list(
+            self.column_names_and_defs or self.get_field_names()
+        )
+        return [
+            column_def.get('title', '')
+            for column_def in column_defs[:len(self.table_spec.columns)]
+        ]
+
+    def get_export_filename(self):
+        return self.table_name or self.model._meta.model_name
+
+    def generate_export_rows(self, draw_params):
+        """
+        Method to generate the raw values of all the rows filtered and sorted
+        like the draw, without pagination. The pks are read with a database
+        iterator and the rows are fetched by chunks of export_chunk_size, so
+        the memory doesn't grow with the number of rows
+        """
+        queryset = self.filter_by_draw_filters(self.get_queryset(), draw_params)
+        pks = queryset.order_by(
+            *self.get_ordering(draw_params)
+        ).values_list('pk', flat=True)
+        for chunk in chunked(
+            pks.iterator(chunk_size=self.export_chunk_size),
+            self.export_chunk_size
+        ):
+            # The values of the rows are only kept for the chunk
+            self.reset_row_values()
+            chunk_qs = self.get_queryset().filter(pk__in=chunk)
+            if self.values_fast_path:
+                objects = self.fetch_values_rows(chunk_qs)
+            else:
+                objects = self.apply_query_plan(chunk_qs)
+            objects_by_pk = {obj.pk: obj for obj in objects}
+            for pk in chunk:
+                try:
+                    obj = objects_by_pk[pk]
+                except KeyError:
+                    # Deleted while exporting
+                    continue
+                yield [
+                    self.evaluate_data(obj, column.field)
+                    for column in self.table_spec.columns
+                ]
+        self.reset_row_values()
+
+    def export(self, request, export_format):
+        """
+        Method to export all the rows of the table filtered and sorted like the
+        draw of the request (The search, column filters and ordering of the
+        datatable), the file is streamed while the rows are generated
+        """
+        try:
+            encoder = self.export_encoders[export_format]
+        except KeyError:
+            raise Http404("Unknown export format %s" % export_format)
+        draw_params = self.get_draw_params(request)
+        response = StreamingHttpResponse(
+            encoder.encode(
+                self.get_export_header(),
+                self.generate_export_rows(draw_params)
+            ),
+            content_type=encoder.content_type
+        )
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+            self.get_export_filename(), encoder.extension
+        )
+        return response
 
     def get(self, request, *args, **kwargs):
         """
@@ -323,13 +1304,29 @@ class DatatablesListView:
         Date: April 16 2017
         If the request is ajax it returns the requested data as a JSON, if not,
         it calls the super to give a normal http response and show the template
+
+        The requests with the export_param are answered with the export of the
+        table in the requested format
         """
-        if request.is_ajax():
-            final_data = self.generate_data(request)
-            return JsonResponse(final_data)
+        export_format = request.GET.get(self.export_param)
+        if export_format:
+            return self.export(request, export_format)
+        if self.is_ajax(request):
+            final_data = self.generate_ajax_data(request)
+            response = self.render_json_response(final_data)
+            if self.draw_stats is not None:
+                self.finish_draw_stats(response)
+            return response
         else:
             return super(DatatablesListView, self).get(request, *args, **kwargs)
 
+    def is_ajax(self, request):
+        """
+        Method to know if the request is a draw of datatables, it's the check
+        of request.is_ajax(), removed in Django 4.0
+        """
+        return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
+
     def has_user_permission(self, permission):
         user = self.request.user
         if user.is_authenticated:
@@ -356,4 +1353,123 @@ class DatatablesListView:
             )
 
         context['table_name'] = self.table_name
+        context['compact_protocol'] = self.compact_protocol
+        context['page_length'] = self.page_length
+        context['pipeline_pages'] = self.pipeline_pages
+        if self.inline_first_page:
+            context['first_page'] = self.generate_first_page()
         return context
+
+    def generate_first_page(self):
+        """
+        Method to generate the first window of the table, the one requested
+        by datatables_pipeline.js for the first draw: ordered by the first
+        column, without search and with pipeline_pages pages
+        """
+        length = self.page_length * self.pipeline_pages
+        first_page_request = copy.copy(self.request)
+        first_page_request.GET = QueryDict(mutable=True)
+        first_page_request.GET.update({
+            'start': 0,
+            'length': length,
+            'order[0][column]': 0,
+            'order[0][dir]': 'asc',
+            'draw': 1
+        })
+        return {
+            'start': 0,
+            'length': length,
+            'order': [[0, 'asc']],
+            'json': self.generate_ajax_data(first_page_request)
+        }
+
+
+def get_request_context():
+    """
+    Gets the script prefix, the urlconf and the language of the request, the
+    urls and the labels of the rows depend on them and the threads of the
+    executors don't have them
+    """
+    return get_script_prefix(), get_urlconf(), get_language()
+
+
+def run_in_own_connection(func, *args, context=None):
+    # Runs in a thread of the executor with its own database connections,
+    # they are closed like at the end of a request. The context of the
+    # request (See get_request_context) is set meanwhile
+    if context is None:
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    script_prefix, urlconf, language = context
+    previous_script_prefix = get_script_prefix()
+    set_script_prefix(script_prefix)
+    set_urlconf(urlconf)
+    try:
+        with translation.override(language):
+            return func(*args)
+    finally:
+        set_script_prefix(previous_script_prefix)
+        set_urlconf(None)
+        close_old_connections()
+
+
+class AsyncDatatablesListView(DatatablesListView):
+    """
+    Async variant of the view for ASGI, the count queries and the page query
+    of a draw run at the same time. Each one runs in its own thread with its
+    own database connection, so they don't see the changes of a transaction
+    that isn't committed. With async_concurrent_queries = False they run one
+    after the other in the thread of the sync code. Needs Django 4.1, the
+    first one that serves async class-based views
+
+    The views with a memory engine, single flight, window prefetch or
+    instrumentation run the sync pipeline in the thread of the sync code
+    instead, so all of them work as in the sync view
+    """
+    async_concurrent_queries = True
+
+    def run_query(self, func, *args):
+        if self.async_concurrent_queries:
+            return sync_to_async(run_in_own_connection, thread_sensitive=False)(
+                func, *args
+            )
+        return sync_to_async(func)(*args)
+
+    def uses_sync_pipeline(self):
+        return (
+            self.memory_engine is not None or self.single_flight is not None
+            or self.window_prefetch is not None or self.is_instrumented()
+        )
+
+    async def agenerate_data(self, request):
+        if self.uses_sync_pipeline():
+            return await sync_to_async(self.generate_ajax_data)(request)
+        self.draw_stats = None
+        # The search backend and get_queryset can do queries
+        draw_params, queryset, filtered_queryset = await sync_to_async(
+            self.prepare_draw
+        )(request)
+        counts, generated_rows = await asyncio.gather(
+            self.run_query(
+                self.count_draw, queryset, filtered_queryset, draw_params
+            ),
+            self.run_query(
+                self.generate_page_rows, filtered_queryset, draw_params
+            )
+        )
+        total_count, filtered_count = counts
+        return self.get_final_data(
+            draw_params, total_count, filtered_count, generated_rows
+        )
+
+    async def get(self, request, *args, **kwargs):
+        if self.is_ajax(request) and not request.GET.get(self.export_param):
+            final_data = await self.agenerate_data(request)
+            response = self.render_json_response(final_data)
+            if self.draw_stats is not None:
+                self.finish_draw_stats(response)
+            return response
+        # The exports and the page are rendered by the sync view
+        return await sync_to_async(super().get)(request, *args, **kwargs)
@@ -0,0 +1,91 @@
+//
+// Batch of the ajax requests of several DataTables of a page, the draws
+// requested at the same time are sent together to a BatchDrawView and the
+// response is given back to each table. To be used as the `transport` of
+// $.fn.dataTable.pipeline:
+//
+//     var batch = $.fn.dataTable.batch( { url: '/dashboard/tables/' } );
+//     $('#persons').DataTable( {
+//         serverSide: true,
+//         ajax: $.fn.dataTable.pipeline( { transport: batch.transport('persons') } )
+//     } );
+//
+$.fn.dataTable.batch = function ( opts ) {
+    // Configuration options
+    var conf = $.extend( {
+        url: '',  // url of the BatchDrawView
+        delay: 0  // milliseconds to wait for the draws of the other tables
+    }, opts );
+
+    // Draws waiting to be sent, by table name
+    var pending = {};
+    var timer = null;
+
+    function csrf_token() {
+        var match = document.cookie.match( /(?:^|;\s*)csrftoken=([^;]+)/ );
+        return match ? decodeURIComponent( match[1] ) : '';
+    }
+
+    // A failed draw is answered with an empty page and the error, so the
+    // table stops processing and DataTables reports it
+    function fail( draw, message ) {
+        draw.success( {
+            "draw":            draw.draw,
+            "recordsTotal":    0,
+            "recordsFiltered": 0,
+            "data":            [],
+            "error":           message
+        } );
+    }
+
+    function flush() {
+        var draws = pending;
+        var body = {};
+        pending = {};
+        timer = null;
+        $.each( draws, function ( name, draw ) {
+            body[name] = draw.query;
+        } );
+        return $.ajax( {
+            "type":        'POST',
+            "url":         conf.url,
+            "data":        JSON.stringify( body ),
+            "contentType": 'application/json',
+            "dataType":    'json',
+            "headers":     { 'X-CSRFToken': csrf_token() },
+            "success":     function ( json ) {
+                $.each( draws, function ( name, draw ) {
+                    if ( json && json[name] ) {
+                        draw.success( json[name] );
+                    }
+                    else {
+                        fail( draw, 'The batch has no data of the table ' + name );
+                    }
+                } );
+            },
+            "error":       function ( jqXHR, textStatus, errorThrown ) {
+                $.each( draws, function ( name, draw ) {
+                    fail( draw, 'The batch request failed: ' +
+                        ( errorThrown || textStatus ) );
+                } );
+            }
+        } );
+    }
+
+    return {
+        transport: function ( name ) {
+            return function ( request, success ) {
+                // A newer draw of the same table replaces the waiting one
+                pending[name] = {
+                    query: $.param( request ),
+                    draw: request.draw,
+                    success: success
+                };
+                if ( timer === null ) {
+                    timer = setTimeout( flush, conf.delay );
+                }
+                return null;
+            };
+        }
+    };
+};
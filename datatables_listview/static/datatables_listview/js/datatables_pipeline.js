@@ -8,7 +8,12 @@ $.fn.dataTable.pipeline = function ( opts ) {
         url: '',      // script url
         data: null,   // function or object with parameters to send to the server
                       // matching how `ajax.data` works in DataTables
-        method: 'GET' // Ajax HTTP method
+        method: 'GET', // Ajax HTTP method
+        transport: null, // function( request, success ) that sends the
+                         // request instead of $.ajax, like the transport of
+                         // a $.fn.dataTable.batch
+        seed: null    // {start, length, order, json} of a window rendered
+                      // with the page, it's used by the first draw
     }, opts );
 
     // Private variables for storing the cache
@@ -24,6 +29,29 @@ $.fn.dataTable.pipeline = function ( opts ) {
         var requestLength = request.length;
         var requestEnd    = requestStart + requestLength;
 
+        if ( conf.seed ) {
+            // The first draw uses the window rendered with the page when it
+            // has the same ordering and there is no search
+            var seed = conf.seed;
+            conf.seed = null;
+            var order = $.map( request.order, function ( column ) {
+                return [[ column.column, column.dir ]];
+            } );
+            var searched = request.search.value !== '' ||
+                $.grep( request.columns, function ( column ) {
+                    return column.search.value !== '';
+                } ).length > 0;
+            if ( !searched && requestStart >= seed.start &&
+                 requestEnd <= seed.start + seed.length &&
+                 JSON.stringify( order ) === JSON.stringify( seed.order )
+            ) {
+                cacheLower = seed.start;
+                cacheUpper = seed.start + seed.length;
+                cacheLastRequest = $.extend( true, {}, request );
+                cacheLastJson = seed.json;
+            }
+        }
+
         if ( settings.clearCache ) {
             // API requested that the cache be cleared
             ajax = true;
@@ -75,25 +103,36 @@ $.fn.dataTable.pipeline = function ( opts ) {
                 $.extend( request, conf.data );
             }
 
-            settings.jqXHR = $.ajax( {
-                "type":     conf.method,
-                "url":      conf.url,
-                "data":     request,
-                "dataType": "json",
-                "cache":    false,
-                "success":  function ( json ) {
-                    cacheLastJson = $.extend(true, {}, json);
-
-                    if ( cacheLower != drawStart ) {
-                        json.data.splice( 0, drawStart-cacheLower );
-                    }
-                    if ( requestLength >= -1 ) {
-                        json.data.splice( requestLength, json.data.length );
-                    }
-
-                    drawCallback( json );
+            var success = function ( json ) {
+                if ( json.error ) {
+                    // Nothing is cached from a failed request
+                    cacheLower = -1;
                 }
-            } );
+                cacheLastJson = $.extend(true, {}, json);
+
+                if ( cacheLower != drawStart ) {
+                    json.data.splice( 0, drawStart-cacheLower );
+                }
+                if ( requestLength >= -1 ) {
+                    json.data.splice( requestLength, json.data.length );
+                }
+
+                drawCallback( json );
+            };
+
+            if ( conf.transport ) {
+                settings.jqXHR = conf.transport( request, success );
+            }
+            else {
+                settings.jqXHR = $.ajax( {
+                    "type":     conf.method,
+                    "url":      conf.url,
+                    "data":     request,
+                    "dataType": "json",
+                    "cache":    false,
+                    "success":  success
+                } );
+            }
         }
         else {
             json = $.extend( true, {}, cacheLastJson );
@@ -1,3 +1,55 @@
+// Url of the server side export of the table, with the same search, column
+// filters and ordering of the last request of the datatable
+function server_export_url(dt, export_format) {
+    var params = $.extend({}, dt.ajax.params(), {export: export_format});
+    delete params.start;
+    delete params.length;
+    return window.location.pathname + '?' + $.param(params);
+}
+
+function escape_html(value) {
+    return String(value)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
+// Renderers of the compact protocol, the cells are the raw values and the
+// options are [bitmask of the visible options, url params]. The layout of the
+// options comes in the optionsLayout of the responses
+var options_layout = null;
+
+function render_compact_cell(data, type) {
+    if (type !== 'display') {
+        return data;
+    }
+    return '<span>' + (data === null ? '' : escape_html(data)) + '</span>';
+}
+
+function render_compact_options(data, type) {
+    if (type !== 'display' || typeof data === 'string' || !options_layout) {
+        // The HTML of the options rendered by the server
+        return data;
+    }
+    var mask = data[0];
+    var params = data[1];
+    var urls = [];
+    options_layout.options.forEach(function (parts, index) {
+        if (mask & (1 << index)) {
+            urls.push(parts.map(function (part) {
+                return typeof part === 'number' ? params[part] : part;
+            }).join(''));
+        }
+    });
+    if (!urls.length) {
+        return options_layout.empty;
+    }
+    return options_layout.head + urls.join(options_layout.separator) +
+        options_layout.tail;
+}
+
 $(document).ready(function () {
 
     // Buttons definition for the datatable
@@ -19,18 +71,18 @@ $(document).ready(function () {
                 text: 'Copy'
             },
             {
-                extend: 'csv',
-                exportOptions: {
-                    columns: ':not(:last)'
-                },
-                text: 'CSV'
+                // The CSV and Excel files are generated by the server with all
+                // the filtered rows, not only the ones loaded by the browser
+                text: 'CSV',
+                action: function (e, dt) {
+                    window.location = server_export_url(dt, 'csv');
+                }
             },
             {
-                extend: 'excel',
-                exportOptions: {
-                    columns: ':not(:last)'
-                },
-                text: 'Excel'
+                text: 'Excel',
+                action: function (e, dt) {
+                    window.location = server_export_url(dt, 'xlsx');
+                }
             },
             {
                 extend: 'pdf',
@@ -62,8 +114,17 @@ $(document).ready(function () {
     // Columns definition
     var columns = column_defs;
 
+    if(compact_protocol){
+        columns.forEach(function (column) {
+            column.render = render_compact_cell;
+        });
+    }
+
     if(options){
         columns.push({"title": "Options", "targets": columns.length, "orderable": false, "searchable":false});
+        if(compact_protocol){
+            columns[columns.length - 1].render = render_compact_options;
+        }
     }
 
     //==========================================================================================================
@@ -72,14 +133,25 @@ $(document).ready(function () {
         dom: '<"html5buttons"B>lTfgitp',
         responsive: true,
         bAutoWidth: false,
-        pageLength: 10,
+        pageLength: page_length,
         columnDefs: columns,
         serverSide: true,
         processing: true,
-        ajax: $.fn.dataTable.pipeline({
-            url: "",
-            pages: 5 // number of pages to cache
-        }),
+        ajax: (function () {
+            var pipeline = $.fn.dataTable.pipeline({
+                url: "",
+                pages: pipeline_pages, // number of pages to cache
+                seed: first_page // first window rendered with the page
+            });
+            return function (request, drawCallback, settings) {
+                return pipeline(request, function (json) {
+                    if (json.optionsLayout) {
+                        options_layout = json.optionsLayout;
+                    }
+                    drawCallback(json);
+                }, settings);
+            };
+        })(),
         buttons: final_buttons
 
     });
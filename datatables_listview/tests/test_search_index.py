@@ -0,0 +1,112 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase
+from model_mommy import mommy
+
+from core.search import IContainsSearch, IndexedSearch
+from core.search_index.index import get_index_name, register, unregister
+from core.search_index.models import SearchIndexEntry
+from core.views import DatatablesListView
+from .models import TestCat, TestDog, TestPerson
+
+
+class PersonListView(DatatablesListView):
+    model = TestPerson
+    fields = ['id', 'name', 'gender', 'dog', 'cats']
+    search_backend = IndexedSearch()
+
+
+class TestSearchIndex(TransactionTestCase):
+    """
+    TestCase for the search index of a view, it must be kept updated by the
+    signals once the changes are committed and find the same rows of the
+    icontains search
+    """
+
+    def setUp(self):
+        self.search_index = register(PersonListView)
+        mommy.make_recipe('tests.test_person', _quantity=12)
+
+    def tearDown(self):
+        unregister(PersonListView)
+
+    def get_document(self, obj):
+        return SearchIndexEntry.objects.get(
+            index=get_index_name(PersonListView), object_pk=str(obj.pk)
+        ).document
+
+    def test_rebuild(self):
+        SearchIndexEntry.objects.all().delete()
+        stdout = StringIO()
+        call_command(
+            'rebuild_search_index', 'tests.test_search_index.PersonListView',
+            chunk_size=5, stdout=stdout
+        )
+        self.assertIn("12 entries", stdout.getvalue())
+        obj = TestPerson.objects.first()
+        self.assertEqual(self.get_document(obj), " ".join([
+            str(obj.pk), obj.name.lower(), obj.get_gender_display().lower(),
+            str(obj.dog).lower(),
+            ", ".join(str(cat) for cat in obj.cats.all()).lower()
+        ]))
+
+    def test_same_rows(self):
+        view = PersonListView()
+        for search_text in ("Name1", "naMe3", "FEMALE", "name2 name4", "nope"):
+            self.assertSetEqual(
+                set(view.filter_by_search_text(
+                    view.get_queryset(), search_text
+                )),
+                set(IContainsSearch().filter(
+                    view, view.get_queryset(), search_text
+                ))
+            )
+
+    def test_signals(self):
+        obj = TestPerson.objects.first()
+        obj.name = "Renamed"
+        obj.save()
+        self.assertIn("renamed", self.get_document(obj))
+
+        cat = obj.cats.first()
+        cat_text = str(cat).lower()
+        self.assertIn(cat_text, self.get_document(obj))
+        obj.cats.remove(cat)
+        self.assertNotIn(cat_text, self.get_document(obj))
+        cat.testperson_set.add(obj)
+        self.assertIn(cat_text, self.get_document(obj))
+        cat.testperson_set.clear()
+        self.assertNotIn(cat_text, self.get_document(obj))
+
+        other_cat = obj.cats.first()
+        other_cat_text = str(other_cat).lower()
+        other_cat.delete()
+        self.assertNotIn(other_cat_text, self.get_document(obj))
+        self.assertFalse(TestCat.objects.filter(pk=other_cat.pk).exists())
+
+        obj.delete()
+        self.assertFalse(SearchIndexEntry.objects.filter(
+            index=get_index_name(PersonListView), object_pk=str(obj.pk)
+        ).exists())
+
+    def test_chunks(self):
+        self.search_index.chunk_size = 5
+        dog = TestDog.objects.first()
+        TestPerson.objects.update(dog=dog)
+        SearchIndexEntry.objects.all().delete()
+        dog.save()
+        self.assertEqual(SearchIndexEntry.objects.count(), 12)
+
+    def test_rollback(self):
+        obj = TestPerson.objects.first()
+        try:
+            with transaction.atomic():
+                obj.name = "Renamed"
+                obj.save()
+                self.assertNotIn("renamed", self.get_document(obj))
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertNotIn("renamed", self.get_document(obj))
@@ -0,0 +1,64 @@
+from datetime import date
+
+from django.db.models import Q
+from django.test import TestCase
+from model_mommy import mommy
+
+from core.utils import SearchCompiler
+from .models import TestPerson
+
+
+class TestSearchCompiler(TestCase):
+    """
+    TestCase for the SearchCompiler, the lookups are chosen by the type of
+    each field
+    """
+
+    def setUp(self):
+        mommy.make_recipe('tests.test_person', _quantity=10)
+        self.compiler = SearchCompiler(
+            [TestPerson._meta.get_field(field)
+             for field in ['id', 'name', 'birth_date', 'gender', 'dog', 'cats',
+                           'test_booleanfield', 'test_uuidfield']],
+            prefix_fields=['name']
+        )
+
+    def get_lookups(self, search_text):
+        lookups = []
+        nodes = [self.compiler.compile(search_text)]
+        while nodes:
+            for child in nodes.pop().children:
+                if isinstance(child, Q):
+                    nodes.append(child)
+                else:
+                    lookups.append(child[0])
+        return sorted(lookups)
+
+    def test_lookups_by_type(self):
+        # The words only are searched in the fields that can match them
+        self.assertListEqual(self.get_lookups("smith"), ['name__istartswith'])
+        self.assertListEqual(self.get_lookups("42"), ['id', 'name__istartswith'])
+        self.assertListEqual(
+            self.get_lookups("2017"),
+            ['birth_date__year', 'id', 'name__istartswith']
+        )
+        self.assertListEqual(
+            self.get_lookups("2017-04-16"),
+            ['birth_date', 'name__istartswith']
+        )
+        self.assertListEqual(
+            self.get_lookups("fema"),
+            ['gender__in', 'name__istartswith']
+        )
+
+    def test_results(self):
+        person = TestPerson.objects.first()
+        queryset = TestPerson.objects.filter(self.compiler.compile(str(person.pk)))
+        self.assertIn(person, queryset)
+        queryset = TestPerson.objects.filter(
+            self.compiler.compile(date.today().isoformat())
+        )
+        self.assertEqual(queryset.count(), 10)
+
+    def test_memoized(self):
+        self.assertIs(self.compiler.compile("Name1"), self.compiler.compile(" name1 "))
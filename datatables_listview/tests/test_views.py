@@ -1,11 +1,43 @@
-from django.core.exceptions import ImproperlyConfigured
-from django.http import QueryDict
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.core.exceptions import (
+    ImproperlyConfigured, PermissionDenied, SuspiciousOperation
+)
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, HttpResponseRedirect, QueryDict
 from django.test import RequestFactory
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.template.loader import render_to_string
+from django.urls import reverse, set_script_prefix
+from django.utils import translation
+from django.views.generic import ListView
 from model_mommy import mommy
 
-from core.views import DatatablesListView
-from .models import TestPerson
+from core.batch import BatchDrawView
+from core.coalescing import SingleFlight
+from core.counts import ApproximateCount, CachedCount
+from core.export import EXPORT_ENCODERS
+from core.instrumentation import NULL_STAGE, draw_finished
+from core.memory import MemoryEngine
+from core.prefetch import WindowPrefetcher
+from core.search import (
+    NarrowingSearch, PostgresFullTextSearch, TrigramSearch
+)
+from core.serializers import StdlibJSONSerializer, get_json_serializer
+from core.spec import TableSpec
+from core.utils import Draw, bump_model_version, get_model_version
+from core.views import (
+    AsyncDatatablesListView, DatatablesListView, DisallowedOrdering
+)
+from .models import TestDog, TestPerson
 
 
 class TestDatatablesListView(TestCase):
@@ -146,3 +178,1765 @@ class TestDatatablesListView(TestCase):
         self.assertFalse(method_result.exists())
         method_result = tested_method(self.view.get_queryset(), "Search with found coincidence insensitive case aMe1")
         self.assertEqual(method_result.count(), 2)
+
+
+class TestKeysetPagination(TestCase):
+    """
+    TestCase for the keyset pagination mode of the view, the pages seeked from
+    the known boundaries must be the same ones returned using OFFSET
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender']
+
+    class KeysetPersonListView(PersonListView):
+        keyset_pagination = True
+
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=20)
+
+    def get_page(self, view_class, start, length=3, order_dir='asc'):
+        request = self.factory.get('/', {
+            'start': start,
+            'length': length,
+            'order[0][column]': 1,
+            'order[0][dir]': order_dir,
+            'draw': 1
+        })
+        return view_class().generate_data(request)['data']
+
+    def test_next_and_previous_pages(self):
+        for order_dir in ('asc', 'desc'):
+            # The first page is served with OFFSET and its boundaries are
+            # remembered for the next seeks
+            for start in (18, 15, 0, 3, 6, 12, 9, 3, 7):
+                self.assertListEqual(
+                    self.get_page(self.KeysetPersonListView, start, order_dir=order_dir),
+                    self.get_page(self.PersonListView, start, order_dir=order_dir)
+                )
+
+    def test_seek_from_boundary(self):
+        self.get_page(self.KeysetPersonListView, 0)
+        view = self.KeysetPersonListView()
+        draw_params = Draw(3, 6, 'name', 'asc', '', 1)
+        queryset = view.filter_by_draw_params(view.get_queryset(), draw_params)
+        self.assertIn('"name" >', str(queryset.query))
+
+    def test_invalidated_by_changes(self):
+        self.get_page(self.KeysetPersonListView, 0)
+        mommy.make_recipe('tests.test_person', name="Aaron")
+        self.assertListEqual(
+            self.get_page(self.KeysetPersonListView, 3),
+            self.get_page(self.PersonListView, 3)
+        )
+        TestPerson.objects.order_by('name').first().delete()
+        self.assertListEqual(
+            self.get_page(self.KeysetPersonListView, 3),
+            self.get_page(self.PersonListView, 3)
+        )
+
+    def test_scoped_by_user(self):
+        draw_params = Draw(3, 6, 'name', 'asc', '', 1)
+        keys = set()
+        for pk in (1, 2):
+            view = self.KeysetPersonListView()
+            view.request = mock.Mock(user=mock.Mock(pk=pk))
+            keys.add(view.get_keyset_cache_key(
+                draw_params, view.get_keyset_sort_keys(draw_params)
+            ))
+        self.assertEqual(len(keys), 2)
+
+    def test_relations_use_offset(self):
+        # The relations are sorted by the ordering of the related model
+        view = self.KeysetPersonListView()
+        self.assertIsNone(view.get_keyset_sort_keys(
+            Draw(3, 6, 'dog', 'asc', '', 1)
+        ))
+
+    def test_far_jump_fallback(self):
+        self.KeysetPersonListView.keyset_max_distance = 5
+        self.addCleanup(delattr, self.KeysetPersonListView, 'keyset_max_distance')
+        self.get_page(self.KeysetPersonListView, 0)
+        view = self.KeysetPersonListView()
+        draw_params = Draw(15, 18, 'name', 'asc', '', 1)
+        queryset = view.filter_by_draw_params(view.get_queryset(), draw_params)
+        self.assertNotIn('"name" >', str(queryset.query))
+        self.assertListEqual(
+            self.get_page(self.KeysetPersonListView, 15),
+            self.get_page(self.PersonListView, 15)
+        )
+
+
+class TestQueryPlan(TestCase):
+    """
+    TestCase for the query plan of the view, the relations must be loaded in
+    bulk so a draw does the same number of queries for any page length
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['name', 'dog', 'cats']
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def test_get_query_plan(self):
+        select_related, prefetch_related = self.PersonListView().get_query_plan()
+        self.assertListEqual(select_related, ['dog'])
+        self.assertListEqual(
+            [prefetch.prefetch_through for prefetch in prefetch_related],
+            ['cats']
+        )
+
+    def test_fixed_query_count(self):
+        for length in (1, 5, 10):
+            request = self.factory.get('/', {'start': 0, 'length': length, 'draw': 1})
+            # The count, the page with its dogs and the prefetch of the cats
+            with self.assertNumQueries(3):
+                data = self.PersonListView().generate_data(request)['data']
+            self.assertEqual(len(data), length)
+
+
+class TestValuesFastPath(TestCase):
+    """
+    TestCase for the values_list fast path of the view, it must render the
+    same rows without building an instance of the model by row
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender', 'birth_date', 'dog', 'cats']
+
+    class FastPersonListView(PersonListView):
+        values_fast_path = True
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def test_same_rows(self):
+        request = self.factory.get('/', {
+            'start': 2,
+            'length': 5,
+            'order[0][column]': 1,
+            'order[0][dir]': 'desc',
+            'draw': 1
+        })
+        with mock.patch.object(TestPerson, 'from_db', side_effect=AssertionError):
+            fast_data = self.FastPersonListView().generate_data(request)
+        self.assertDictEqual(
+            fast_data,
+            self.PersonListView().generate_data(request)
+        )
+
+
+class TestRowCache(TestCase):
+    """
+    TestCase for the row cache of evaluate_data, it's scoped to each draw and
+    it has the values of every kind of column
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'cats']
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def get_request(self, start):
+        return self.factory.get('/', {
+            'start': start,
+            'length': 5,
+            'order[0][column]': 0,
+            'order[0][dir]': 'asc',
+            'draw': 1
+        })
+
+    def test_scoped_to_draw(self):
+        view = self.PersonListView()
+        first_page = view.generate_data(self.get_request(0))
+        first_pks = set(view.row_values)
+        self.assertEqual(len(first_pks), 5)
+        second_page = view.generate_data(self.get_request(5))
+        self.assertEqual(len(view.row_values), 5)
+        self.assertFalse(first_pks & set(view.row_values))
+        # The same view object draws the same rows than a new one
+        self.assertDictEqual(
+            first_page,
+            self.PersonListView().generate_data(self.get_request(0))
+        )
+        self.assertNotEqual(first_page['data'], second_page['data'])
+
+    def test_many_to_many_cached(self):
+        view = self.PersonListView()
+        view.generate_data(self.get_request(0))
+        obj = TestPerson.objects.order_by('pk').first()
+        cats = view.table_spec.columns_by_name['cats']
+        with self.assertNumQueries(0):
+            value = view.evaluate_data(obj, cats.field)
+        self.assertEqual(value, view.row_values[obj.pk][cats.index])
+
+
+class TestRenderedRowCache(TestCase):
+    """
+    TestCase for the cache of the rendered rows, keyed by pk, version and the
+    permissions of the user
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'dog', 'cats']
+        options_list = [
+            {
+                'option_label': 'Edit',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'permissions': ['can_edit']
+            }
+        ]
+
+    class CachedPersonListView(PersonListView):
+        row_cache_version_field = 'test_datetimefield'
+
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        self.request = self.factory.get('/', {
+            'start': 0,
+            'length': 5,
+            'order[0][column]': 0,
+            'order[0][dir]': 'asc',
+            'draw': 1
+        })
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def get_view(self, view_class, can_edit=True):
+        view = view_class()
+        view.request = mock.Mock(user=mock.Mock(can_edit=can_edit))
+        return view
+
+    def test_same_rows(self):
+        for can_edit in (True, False):
+            self.assertDictEqual(
+                self.get_view(self.CachedPersonListView, can_edit).generate_data(
+                    self.request
+                ),
+                self.get_view(self.PersonListView, can_edit).generate_data(
+                    self.request
+                )
+            )
+
+    def test_cached_rows(self):
+        data = self.get_view(self.CachedPersonListView).generate_data(
+            self.request
+        )
+        # The total count and the versions of the page
+        with self.assertNumQueries(2):
+            cached_data = self.get_view(
+                self.CachedPersonListView
+            ).generate_data(self.request)
+        self.assertDictEqual(cached_data, data)
+
+    def test_new_version(self):
+        self.get_view(self.CachedPersonListView).generate_data(self.request)
+        obj = TestPerson.objects.order_by('pk').first()
+        obj.name = 'Renamed'
+        obj.test_datetimefield += timedelta(seconds=1)
+        obj.save()
+        data = self.get_view(self.CachedPersonListView).generate_data(
+            self.request
+        )
+        self.assertEqual(data['data'][0][1], '<span>Renamed</span>')
+
+    def test_fields_of_the_view(self):
+        self.get_view(self.CachedPersonListView).generate_data(self.request)
+        view = self.get_view(self.CachedPersonListView)
+        view.fields = ['id', 'name']
+        data = view.generate_data(self.request)
+        view = self.get_view(self.PersonListView)
+        view.fields = ['id', 'name']
+        self.assertDictEqual(data, view.generate_data(self.request))
+
+    def test_language(self):
+        view = self.get_view(self.CachedPersonListView)
+        keys = set()
+        for language in ('en', 'es'):
+            with translation.override(language):
+                keys.add(view.get_row_cache_key(1, None, ()))
+        self.assertEqual(len(keys), 2)
+
+
+class TestCountStrategies(TestCase):
+    """
+    TestCase for the count strategies of the view used for recordsTotal and
+    recordsFiltered
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender']
+
+    class CachedPersonListView(PersonListView):
+        count_strategy = CachedCount()
+
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        self.request = self.factory.get('/', {
+            'start': 0,
+            'length': 5,
+            'search[value]': 'Name1',
+            'draw': 1
+        })
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def test_total_and_filtered(self):
+        data = self.PersonListView().generate_data(self.request)
+        self.assertEqual(data['recordsTotal'], 10)
+        # "Name1" and "Name10"
+        self.assertEqual(data['recordsFiltered'], 2)
+
+    def test_cached_count(self):
+        data = self.CachedPersonListView().generate_data(self.request)
+        # Only the page query because the counts are cached
+        with self.assertNumQueries(1):
+            cached_data = self.CachedPersonListView().generate_data(self.request)
+        self.assertDictEqual(cached_data, data)
+
+        # Saving an object invalidates the counts
+        mommy.make_recipe('tests.test_person')
+        data = self.CachedPersonListView().generate_data(self.request)
+        self.assertEqual(data['recordsTotal'], 11)
+
+    def test_approximate_count_fallback(self):
+        view = self.PersonListView()
+        view.count_strategy = ApproximateCount(threshold=0)
+        # SQLite has no planner estimates so the counts are exact
+        data = view.generate_data(self.request)
+        self.assertEqual(data['recordsTotal'], 10)
+        self.assertEqual(data['recordsFiltered'], 2)
+
+
+def is_female(value, condition_values):
+    return value in condition_values
+
+
+class TestTableSpec(TestCase):
+    """
+    TestCase for the TableSpec compiled by view class, the rows must be
+    rendered without doing _meta lookups
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['name', 'gender', 'cats']
+        options_list = [
+            {
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+            },
+            {
+                'option_label': 'Dog',
+                'option_url': 'person-dog',
+                'url_params': ['id', 'dog'],
+                'conditions': [
+                    {
+                        'field': 'gender',
+                        'condition_values': ['FEMALE'],
+                        'condition_func': is_female
+                    }
+                ]
+            }
+        ]
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def test_compiled_once(self):
+        table_spec = self.PersonListView.get_table_spec()
+        self.assertIs(self.PersonListView().table_spec, table_spec)
+        self.assertListEqual(
+            [column.kind for column in table_spec.related_columns],
+            ['plain', 'choices', 'm2m', 'plain', 'fk']
+        )
+        self.assertEqual(table_spec.options[1].conditions[0].column.name, 'gender')
+
+    def test_invalid_options(self):
+        class InvalidListView(DatatablesListView):
+            model = TestPerson
+            options_list = [{'option_label': 'Detail', 'url_params': ['id']}]
+
+        with self.assertRaises(ImproperlyConfigured):
+            InvalidListView()
+
+    def test_options_list_created_in_init(self):
+        class InitPersonListView(DatatablesListView):
+            model = TestPerson
+            fields = ['name', 'gender']
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.options_list = [{
+                    'option_label': 'Detail',
+                    'option_url': 'person-detail',
+                    'url_params': ['id']
+                }]
+
+        view = InitPersonListView()
+        page = list(view.get_queryset().order_by('name'))
+        data = view.generate_rows_with_options(page)
+        for row, person in zip(data, page):
+            self.assertIn('/persons/%s/' % person.pk, row[-1])
+        self.assertEqual(len(view.table_spec.options), 1)
+        self.assertEqual(len(InitPersonListView.get_table_spec().options), 0)
+        # The views of the next requests share the spec of the same options
+        with mock.patch('core.views.TableSpec', wraps=TableSpec) as compile:
+            table_specs = {
+                InitPersonListView().table_spec for _ in range(3)
+            }
+        self.assertEqual(table_specs, {view.table_spec})
+        self.assertEqual(compile.call_count, 0)
+
+    def test_fields_set_on_the_view(self):
+        view = self.PersonListView()
+        view.fields = ['name', 'gender']
+        self.assertListEqual(
+            [field.name for field in view.get_fields()],
+            view.get_field_names()
+        )
+        request = self.factory.get('/', {
+            'start': 0,
+            'length': 3,
+            'order[0][column]': 1,
+            'order[0][dir]': 'desc',
+            'draw': 1
+        })
+        data = view.generate_data(request)
+        self.assertEqual(len(data['data'][0]), 3)
+        persons = TestPerson.objects.order_by('-gender', '-pk')[:3]
+        for row, person in zip(data['data'], persons):
+            self.assertIn(person.name, row[0])
+
+    def test_no_meta_lookups_by_row(self):
+        view = self.PersonListView()
+        page = list(view.apply_query_plan(view.get_queryset().order_by('name')))
+        with mock.patch.object(TestPerson._meta, 'get_field', side_effect=AssertionError):
+            data = view.generate_rows_with_options(page)
+        for row, person in zip(data, page):
+            self.assertIn('/persons/%s/' % person.pk, row[-1])
+            self.assertEqual(
+                '/persons/%s/dogs/' % person.pk in row[-1],
+                person.get_gender_display() == 'FEMALE'
+            )
+
+
+class TestOptionConditionExpressions(TestCase):
+    """
+    TestCase for the options with a condition_expression, the condition is
+    annotated on the page query and the permissions are evaluated once
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender']
+        options_list = [
+            {
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'permissions': ['can_see']
+            },
+            {
+                'option_label': 'Dog',
+                'option_url': 'person-dog',
+                'url_params': ['id', 'dog'],
+                'conditions': [
+                    {
+                        'field': 'gender',
+                        'condition_values': ['FEMALE'],
+                        'condition_func': is_female
+                    }
+                ]
+            }
+        ]
+
+    class ExpressionPersonListView(PersonListView):
+        options_list = [
+            {
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'permissions': ['can_see']
+            },
+            {
+                'option_label': 'Dog',
+                'option_url': 'person-dog',
+                'url_params': ['id', 'dog'],
+                'condition_expression': Q(gender=1)
+            }
+        ]
+
+    class FastExpressionPersonListView(ExpressionPersonListView):
+        values_fast_path = True
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.request = self.factory.get('/', {
+            'start': 0,
+            'length': 10,
+            'order[0][column]': 0,
+            'order[0][dir]': 'asc',
+            'draw': 1
+        })
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def get_data(self, view_class, can_see):
+        view = view_class()
+        view.request = mock.Mock(user=mock.Mock(can_see=can_see))
+        return view.generate_data(self.request)
+
+    def test_same_rows(self):
+        for can_see in (True, False):
+            data = self.get_data(self.PersonListView, can_see)
+            self.assertDictEqual(
+                self.get_data(self.ExpressionPersonListView, can_see), data
+            )
+            self.assertDictEqual(
+                self.get_data(self.FastExpressionPersonListView, can_see), data
+            )
+
+    def test_annotated(self):
+        view = self.ExpressionPersonListView()
+        queryset = view.annotate_option_conditions(view.get_queryset())
+        self.assertIn('_datatables_option_1', queryset.query.annotations)
+        self.assertEqual(
+            queryset.filter(_datatables_option_1=True).count(),
+            TestPerson.objects.filter(gender=1).count()
+        )
+
+    def test_not_annotated(self):
+        # Objects that weren't read by get_page_queryset
+        view = self.ExpressionPersonListView()
+        view.request = mock.Mock(user=mock.Mock(can_see=True))
+        page = list(TestPerson.objects.order_by('pk'))
+        data = view.generate_rows_with_options(page)
+        for row, person in zip(data, page):
+            self.assertEqual(
+                '/persons/%s/dogs/' % person.pk in row[-1], person.gender == 1
+            )
+
+    def test_permissions_evaluated_once(self):
+        can_see = mock.Mock(return_value=True)
+        self.get_data(self.PersonListView, can_see)
+        self.assertEqual(can_see.call_count, 1)
+
+    def test_expression_over_relation_to_many(self):
+        class CatsPersonListView(self.PersonListView):
+            options_list = [{
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'condition_expression': Q(cats__hate_level__gte=0)
+            }]
+
+        TestPerson.objects.first().cats.clear()
+        data = self.get_data(CatsPersonListView, True)
+        self.assertEqual(data['recordsTotal'], 10)
+        # Each person once, even with three cats
+        self.assertListEqual(
+            [row[0] for row in data['data']],
+            ["<span>%s</span>" % pk for pk in TestPerson.objects.order_by(
+                'pk'
+            ).values_list('pk', flat=True)]
+        )
+        for row, person in zip(data['data'], TestPerson.objects.order_by('pk')):
+            self.assertEqual(
+                '/persons/%s/' % person.pk in row[-1],
+                person.cats.exists()
+            )
+
+    def test_invalid_expression(self):
+        class InvalidPersonListView(DatatablesListView):
+            model = TestPerson
+            options_list = [{
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'condition_expression': "gender=1"
+            }]
+
+        with self.assertRaises(ImproperlyConfigured):
+            InvalidPersonListView()
+
+
+class TestCompactProtocol(TestCase):
+    """
+    TestCase for the compact protocol of the ajax responses, the options
+    rendered from the layout like generate_datatable.js does must be the same
+    rendered by the server
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'birth_date', 'gender', 'dog']
+        options_list = [
+            {
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'icon': 'eye',
+            },
+            {
+                'option_label': 'Dog',
+                'option_url': 'person-dog',
+                'url_params': ['id', 'dog'],
+                'confirm_modal': 'dog-modal',
+                'conditions': [
+                    {
+                        'field': 'gender',
+                        'condition_values': ['FEMALE'],
+                        'condition_func': is_female
+                    }
+                ]
+            }
+        ]
+
+    class CompactPersonListView(PersonListView):
+        compact_protocol = True
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.request = self.factory.get('/', {
+            'start': 0,
+            'length': 10,
+            'order[0][column]': 0,
+            'order[0][dir]': 'asc',
+            'draw': 1
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def render_options(self, layout, compact_options):
+        # Same as render_compact_options of generate_datatable.js
+        mask, params = compact_options
+        urls = [
+            "".join(
+                params[part] if isinstance(part, int) else part
+                for part in parts
+            )
+            for index, parts in enumerate(layout['options'])
+            if mask & (1 << index)
+        ]
+        if not urls:
+            return layout['empty']
+        return layout['head'] + layout['separator'].join(urls) + layout['tail']
+
+    def test_same_rows(self):
+        data = self.PersonListView().generate_data(self.request)
+        compact_data = self.CompactPersonListView().generate_data(self.request)
+        layout = compact_data['optionsLayout']
+        for row, compact_row in zip(data['data'], compact_data['data']):
+            obj = TestPerson.objects.get(pk=compact_row[0])
+            self.assertListEqual(compact_row[:-1], [
+                obj.pk, obj.name, obj.birth_date, obj.get_gender_display(),
+                str(obj.dog)
+            ])
+            self.assertEqual(
+                self.render_options(layout, compact_row[-1]), row[-1]
+            )
+
+    def test_serializers(self):
+        view = self.CompactPersonListView()
+        for serializer in (StdlibJSONSerializer(), get_json_serializer()):
+            view.json_serializer = serializer
+            response = view.render_json_response(
+                view.generate_data(self.request)
+            )
+            self.assertEqual(response['Content-Type'], 'application/json')
+            data = json.loads(response.content)
+            self.assertEqual(len(data['data']), 10)
+            self.assertIn('optionsLayout', data)
+
+
+class TestAsyncView(TestCase):
+    """
+    TestCase for the async variant of the view, it must return the same data
+    of the sync view
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'dog', 'cats']
+
+    class AsyncPersonListView(AsyncDatatablesListView, PersonListView):
+        async_concurrent_queries = False
+
+    def setUp(self):
+        self.request = RequestFactory().get('/', {
+            'start': 0,
+            'length': 5,
+            'order[0][column]': 1,
+            'order[0][dir]': 'desc',
+            'search[value]': 'Name1',
+            'draw': 1
+        })
+        mommy.make_recipe('tests.test_person', _quantity=12)
+
+    def test_same_data(self):
+        self.assertDictEqual(
+            async_to_sync(self.AsyncPersonListView().agenerate_data)(
+                self.request
+            ),
+            self.PersonListView().generate_data(self.request)
+        )
+
+    def test_search_backend_with_queries(self):
+        view = self.AsyncPersonListView()
+        view.search_backend = NarrowingSearch()
+        self.assertDictEqual(
+            async_to_sync(view.agenerate_data)(self.request),
+            self.PersonListView().generate_data(self.request)
+        )
+
+    def test_sync_pipeline(self):
+        view = self.AsyncPersonListView()
+        view.debug_stats = True
+        view.single_flight = SingleFlight()
+        view.request = self.request
+        self.request.META['HTTP_X_REQUESTED_WITH'] = 'XMLHttpRequest'
+        response = async_to_sync(view.get)(self.request)
+        data = json.loads(response.content)
+        self.assertIn('debug', data)
+        self.assertIn('count', data['debug'])
+
+    def test_as_view(self):
+        response = self.client.get(
+            reverse('async-persons'), self.request.GET,
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(
+            json.loads(response.content),
+            json.loads(json.dumps(
+                self.PersonListView().generate_data(self.request),
+                cls=DjangoJSONEncoder
+            ))
+        )
+
+
+class TestAsyncViewConcurrentQueries(TransactionTestCase):
+    """
+    TestCase for the concurrent queries of the async view, they use their own
+    connections so the rows must be committed
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'dog', 'cats']
+
+    class AsyncPersonListView(AsyncDatatablesListView, PersonListView):
+        pass
+
+    def setUp(self):
+        self.request = RequestFactory().get('/', {
+            'start': 0,
+            'length': 5,
+            'order[0][column]': 1,
+            'order[0][dir]': 'desc',
+            'search[value]': 'Name1',
+            'draw': 1
+        })
+        mommy.make_recipe('tests.test_person', _quantity=12)
+
+    def test_same_data(self):
+        self.assertDictEqual(
+            async_to_sync(self.AsyncPersonListView().agenerate_data)(
+                self.request
+            ),
+            self.PersonListView().generate_data(self.request)
+        )
+
+
+class TestInstrumentation(TestCase):
+    """
+    TestCase for the instrumentation of the draws, the stages with their
+    queries and template renders
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'dog', 'cats']
+        server_timing = True
+        debug_stats = True
+
+    def setUp(self):
+        self.request = RequestFactory().get('/', {
+            'start': 0,
+            'length': 5,
+            'order[0][column]': 0,
+            'order[0][dir]': 'asc',
+            'draw': 1
+        })
+        self.request.META['HTTP_X_REQUESTED_WITH'] = 'XMLHttpRequest'
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def test_stages(self):
+        received = []
+
+        def receiver(sender, view, draw_stats, **kwargs):
+            received.append(draw_stats)
+
+        draw_finished.connect(receiver, sender=self.PersonListView)
+        try:
+            response = self.PersonListView().get(self.request)
+        finally:
+            draw_finished.disconnect(receiver, sender=self.PersonListView)
+        debug = json.loads(response.content)['debug']
+        self.assertListEqual(
+            list(debug), ['draw_params', 'count', 'page_query', 'rows']
+        )
+        self.assertEqual(debug['count']['queries'], 1)
+        # The page with the dogs and the prefetch of the cats
+        self.assertEqual(debug['page_query']['queries'], 2)
+        self.assertEqual(debug['rows']['queries'], 0)
+        self.assertEqual(len(received), 1)
+        self.assertIn('json', received[0].stages)
+        self.assertIn('page_query;dur=', response['Server-Timing'])
+
+    def test_template_renders(self):
+        class OptionsPersonListView(self.PersonListView):
+            options_list = [{
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+            }]
+
+        view = OptionsPersonListView()
+        view.generate_data(self.request)
+        # The options are compiled with the first draw
+        self.assertGreater(view.draw_stats.stages['rows'].templates, 0)
+        view.generate_data(self.request)
+        self.assertEqual(view.draw_stats.stages['rows'].templates, 0)
+
+    def test_slow_draws(self):
+        class SlowPersonListView(self.PersonListView):
+            slow_draw_threshold = 0
+
+        with self.assertLogs('datatables_listview.slow_draws', 'WARNING') as logs:
+            SlowPersonListView().get(self.request)
+        self.assertIn("SlowPersonListView", logs.output[0])
+
+    def test_not_instrumented(self):
+        class PlainPersonListView(DatatablesListView):
+            model = TestPerson
+
+        view = PlainPersonListView()
+        view.generate_data(self.request)
+        self.assertIsNone(view.draw_stats)
+        self.assertIs(view.stage('count'), NULL_STAGE)
+
+
+class TestSingleFlight(TestCase):
+    """
+    TestCase for the coalescing of the identical draws, they are computed once
+    and every response keeps its draw counter
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name']
+        single_flight = SingleFlight()
+
+    class SharedPersonListView(PersonListView):
+        single_flight = SingleFlight(cache_alias='default')
+
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+
+    def get_request(self, draw, search='Name'):
+        return self.factory.get('/', {
+            'start': 0,
+            'length': 5,
+            'order[0][column]': 1,
+            'order[0][dir]': 'asc',
+            'search[value]': search,
+            'draw': draw
+        })
+
+    def test_concurrent_draws(self):
+        single_flight = self.PersonListView.single_flight
+        waiters = 4
+        computed = []
+
+        def generate_data(view, request):
+            # The leader waits for the other draws
+            for _ in range(200):
+                flights = list(single_flight.in_flight.values())
+                if flights and flights[0].waiters == waiters:
+                    break
+                time.sleep(0.01)
+            computed.append(request)
+            return {'draw': 0, 'data': []}
+
+        results = {}
+
+        def draw(counter):
+            view = self.PersonListView()
+            results[counter] = view.generate_shared_data(
+                self.get_request(counter)
+            )
+
+        with mock.patch.object(self.PersonListView, 'generate_data',
+                               generate_data):
+            threads = [
+                threading.Thread(target=draw, args=(counter,))
+                for counter in range(waiters + 1)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(computed), 1)
+        self.assertEqual(
+            {counter: data['draw'] for counter, data in results.items()},
+            {counter: counter for counter in range(waiters + 1)}
+        )
+        self.assertFalse(single_flight.in_flight)
+
+    def test_different_draws(self):
+        view = self.PersonListView()
+        with mock.patch.object(
+            self.PersonListView, 'generate_data', autospec=True,
+            return_value={'draw': 0}
+        ) as generate_data:
+            view.generate_shared_data(self.get_request(1))
+            view.generate_shared_data(self.get_request(2, search='Other'))
+        self.assertEqual(generate_data.call_count, 2)
+
+    def test_shared_cache(self):
+        mommy.make_recipe('tests.test_person', _quantity=3)
+        data = self.SharedPersonListView().generate_shared_data(
+            self.get_request(1)
+        )
+        with self.assertNumQueries(0):
+            shared_data = self.SharedPersonListView().generate_shared_data(
+                self.get_request(2)
+            )
+        self.assertEqual(shared_data['draw'], 2)
+        self.assertEqual(shared_data['data'], data['data'])
+
+    def test_scoped_by_user(self):
+        draw_params = Draw(0, 5, 'name', 'asc', '', 1)
+        keys = set()
+        for pk in (1, 2):
+            view = self.PersonListView()
+            view.request = mock.Mock(user=mock.Mock(pk=pk))
+            keys.add(view.get_draw_key(draw_params))
+        self.assertEqual(len(keys), 2)
+
+
+class TestWindowPrefetch(TransactionTestCase):
+    """
+    TestCase for the prefetch of the next windows, they are generated in
+    other threads so the rows must be committed
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'dog']
+
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def get_request(self, start, draw=1):
+        return self.factory.get('/', {
+            'start': start,
+            'length': 3,
+            'order[0][column]': 1,
+            'order[0][dir]': 'desc',
+            'draw': draw
+        })
+
+    def get_view_class(self, **kwargs):
+        return type('PrefetchPersonListView', (self.PersonListView,), {
+            'window_prefetch': WindowPrefetcher(**kwargs)
+        })
+
+    def test_next_windows(self):
+        view_class = self.get_view_class(depth=2)
+        view_class().generate_ajax_data(self.get_request(0))
+        view_class.window_prefetch.wait()
+        for start in (3, 6):
+            with self.assertNumQueries(0):
+                data = view_class().generate_ajax_data(
+                    self.get_request(start, draw=start)
+                )
+            self.assertEqual(data['draw'], start)
+            self.assertDictEqual(
+                data,
+                self.PersonListView().generate_data(
+                    self.get_request(start, draw=start)
+                )
+            )
+        view_class.window_prefetch.wait()
+
+    def test_last_window(self):
+        view_class = self.get_view_class()
+        view_class().generate_ajax_data(self.get_request(9))
+        self.assertFalse(view_class.window_prefetch.futures)
+        self.assertFalse(view_class.window_prefetch.windows)
+
+    def test_eviction(self):
+        view_class = self.get_view_class(depth=3, max_windows=1)
+        view = view_class()
+        view.generate_ajax_data(self.get_request(0))
+        view_class.window_prefetch.wait()
+        self.assertEqual(len(view_class.window_prefetch.windows), 1)
+        prefetched = [
+            view_class.window_prefetch.get(
+                view, view.get_draw_params(self.get_request(start))
+            )
+            for start in (3, 6, 9)
+        ]
+        self.assertEqual(
+            len([data for data in prefetched if data is not None]), 1
+        )
+
+    def test_script_prefix(self):
+        view_class = type('OptionsPersonListView', (self.get_view_class(),), {
+            'options_list': [{
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id']
+            }]
+        })
+        set_script_prefix('/app/')
+        self.addCleanup(set_script_prefix, '/')
+        view_class().generate_ajax_data(self.get_request(0))
+        view_class.window_prefetch.wait()
+        with self.assertNumQueries(0):
+            data = view_class().generate_ajax_data(self.get_request(3))
+        view_class.window_prefetch.wait()
+        self.assertIn('/app/persons/', data['data'][0][-1])
+        self.assertDictEqual(
+            data, view_class().generate_data(self.get_request(3))
+        )
+
+    def test_initkwargs(self):
+        view_class = type(
+            'PrefetchPersonListView', (self.get_view_class(), ListView), {}
+        )
+        view_class(fields=['id', 'name']).generate_ajax_data(
+            self.get_request(0)
+        )
+        view_class.window_prefetch.wait()
+        with self.assertNumQueries(0):
+            data = view_class(fields=['id', 'name']).generate_ajax_data(
+                self.get_request(3)
+            )
+        view_class.window_prefetch.wait()
+        self.assertEqual(len(data['data'][0]), 2)
+
+
+class TestMemoryEngine(TransactionTestCase):
+    """
+    TestCase for the draws served by the memory engine, the loaded rows are
+    updated once the transactions are committed
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender', 'birth_date', 'dog']
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        for counter in range(12):
+            mommy.make_recipe(
+                'tests.test_person',
+                gender=counter % 2,
+                birth_date=date(2000 + counter % 3, 1, counter + 1)
+            )
+        self.view_class = type(
+            'MemoryPersonListView', (self.PersonListView,), {
+                'memory_engine': MemoryEngine()
+            }
+        )
+
+    def get_request(self, start=0, length=5, ordering=((1, 'asc'),),
+                    **params):
+        query = {'start': start, 'length': length, 'draw': 1}
+        for counter, (column, sort_order) in enumerate(ordering):
+            query['order[%s][column]' % counter] = column
+            query['order[%s][dir]' % counter] = sort_order
+        query.update(params)
+        return self.factory.get('/', query)
+
+    def test_same_data_as_the_database(self):
+        requests = [
+            self.get_request(),
+            self.get_request(start=5, ordering=((1, 'desc'),)),
+            self.get_request(ordering=((2, 'asc'), (1, 'desc'))),
+            self.get_request(ordering=((3, 'desc'), (2, 'asc'))),
+            self.get_request(ordering=((4, 'desc'),)),
+            self.get_request(ordering=((0, 'desc'),)),
+            self.get_request(**{'search[value]': 'female'}),
+            self.get_request(**{'search[value]': 'name1 2001'}),
+            self.get_request(**{'search[value]': '2002-01-03 NAME4'}),
+            self.get_request(start=2, **{'search[value]': 'e'}),
+            self.get_request(**{'search[value]': 'nothing'}),
+        ]
+        for request in requests:
+            self.assertDictEqual(
+                self.view_class().generate_data(request),
+                self.PersonListView().generate_data(request)
+            )
+
+    def test_page_queries(self):
+        self.view_class().generate_data(self.get_request())
+        # Only the page is read, with its dogs
+        with self.assertNumQueries(1):
+            data = self.view_class().generate_data(
+                self.get_request(**{'search[value]': 'name1'})
+            )
+        self.assertEqual(data['recordsTotal'], 12)
+
+    def test_signals(self):
+        self.view_class().generate_data(self.get_request())
+        person = TestPerson.objects.order_by('name').last()
+        person.name = "Aaron"
+        person.save()
+        mommy.make_recipe('tests.test_person', name="Abel")
+        TestPerson.objects.order_by('name').last().delete()
+        request = self.get_request(**{'search[value]': 'a'})
+        data = self.view_class().generate_data(request)
+        self.assertEqual(data['recordsTotal'], 12)
+        self.assertDictEqual(
+            data, self.PersonListView().generate_data(request)
+        )
+        self.assertIn("Aaron", data['data'][0][1])
+        self.assertIn("Abel", data['data'][1][1])
+
+    def test_unsupported_draws(self):
+        view = self.view_class()
+        engine = view.memory_engine
+        draw_params = view.get_draw_params(
+            self.get_request(**{'columns[1][search][value]': 'name1'})
+        )
+        self.assertIsNone(engine.get_page(view, draw_params))
+        view.search_backend = PostgresFullTextSearch()
+        draw_params = view.get_draw_params(
+            self.get_request(**{'search[value]': 'name1'})
+        )
+        self.assertIsNone(engine.get_page(view, draw_params))
+
+    def test_max_rows(self):
+        view = self.view_class()
+        engine = view.memory_engine
+        engine.max_age = 60
+        engine.max_rows = 5
+        self.assertIsNone(engine.get_page(
+            view, view.get_draw_params(self.get_request())
+        ))
+        for counter in range(2):
+            self.assertDictEqual(
+                view.generate_data(self.get_request()),
+                self.PersonListView().generate_data(self.get_request())
+            )
+        # The rows are counted again once the placeholder is old
+        engine.max_rows = 500
+        engine.tables[self.view_class].loaded_at -= 60
+        self.assertIsNotNone(engine.get_page(
+            view, view.get_draw_params(self.get_request())
+        ))
+        person = TestPerson.objects.order_by('name').last()
+        person.name = "Aaron"
+        person.save()
+        self.assertIn(
+            "Aaron", view.generate_data(self.get_request())['data'][0][1]
+        )
+
+
+class TestBatchDraw(TestCase):
+    """
+    TestCase for the batch of draws of several tables in one request
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender']
+        options_list = [
+            {
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'permissions': ['can_see']
+            }
+        ]
+
+    class DogListView(DatatablesListView):
+        model = TestDog
+        fields = ['id', 'name', 'age']
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=5)
+        self.batch_view = BatchDrawView.as_view(tables={
+            'persons': self.PersonListView,
+            'female_persons': self.PersonListView,
+            'dogs': self.DogListView
+        })
+        self.query_strings = {
+            'persons': 'start=0&length=3&order[0][column]=1&draw=2',
+            'female_persons': (
+                'start=0&length=3&order[0][column]=0&draw=4'
+                '&search[value]=female'
+            ),
+            'dogs': 'start=1&length=2&order[0][column]=2&order[0][dir]=desc'
+                    '&draw=3'
+        }
+
+    def get_request(self, body, can_see=True):
+        request = self.factory.post(
+            '/', json.dumps(body), content_type='application/json'
+        )
+        request.user = mock.Mock(can_see=can_see)
+        return request
+
+    def test_data(self):
+        can_see = mock.Mock(return_value=True)
+        response = self.batch_view(
+            self.get_request(self.query_strings, can_see)
+        )
+        data = json.loads(response.content)
+        self.assertEqual(set(data), set(self.query_strings))
+        for name, view_class in (
+            ('persons', self.PersonListView),
+            ('female_persons', self.PersonListView),
+            ('dogs', self.DogListView)
+        ):
+            view = view_class()
+            view.request = mock.Mock(user=mock.Mock(can_see=True))
+            expected = view.generate_data(
+                self.factory.get('/?' + self.query_strings[name])
+            )
+            expected = json.loads(json.dumps(expected, cls=DjangoJSONEncoder))
+            self.assertEqual(data[name], expected)
+        # The permissions are shared by the tables
+        self.assertEqual(can_see.call_count, 1)
+
+    def test_invalid_batches(self):
+        with self.assertRaises(Http404):
+            self.batch_view(self.get_request({'cats': 'start=0'}))
+        with self.assertRaises(SuspiciousOperation):
+            self.batch_view(self.get_request(['start=0']))
+        batch_view = BatchDrawView.as_view(
+            tables={'persons': self.PersonListView}, max_tables=1
+        )
+        with self.assertRaises(SuspiciousOperation):
+            batch_view(self.get_request(self.query_strings))
+
+    def test_missing_tables(self):
+        with self.assertRaises(ImproperlyConfigured):
+            BatchDrawView.as_view()(self.get_request(self.query_strings))
+
+    def test_protected_tables(self):
+        class LoginPersonListView(self.PersonListView, ListView):
+            def dispatch(self, request, *args, **kwargs):
+                if not request.user.is_authenticated:
+                    return HttpResponseRedirect('/login/')
+                return super().dispatch(request, *args, **kwargs)
+
+        class PermissionDogListView(self.DogListView, ListView):
+            def dispatch(self, request, *args, **kwargs):
+                if not request.user.has_perm('tests.view_testdog'):
+                    raise PermissionDenied
+                return super().dispatch(request, *args, **kwargs)
+
+        batch_view = BatchDrawView.as_view(tables={
+            'persons': LoginPersonListView, 'dogs': PermissionDogListView
+        })
+        request = self.get_request({'persons': self.query_strings['persons']})
+        request.user.is_authenticated = False
+        response = batch_view(request)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, '/login/')
+
+        request = self.get_request({'dogs': self.query_strings['dogs']})
+        request.user.has_perm.return_value = False
+        with self.assertRaises(PermissionDenied):
+            batch_view(request)
+        request.user.has_perm.return_value = True
+        data = json.loads(batch_view(request).content)
+        self.assertEqual(data['dogs']['draw'], 3)
+
+
+class TestBatchDrawConcurrentQueries(TransactionTestCase):
+    """
+    TestCase for the batch with concurrent queries, each table is served in
+    its own thread so the rows must be committed
+    """
+
+    def test_same_data(self):
+        mommy.make_recipe('tests.test_person', _quantity=5)
+        factory = RequestFactory()
+        tables = {
+            'persons': TestBatchDraw.PersonListView,
+            'dogs': TestBatchDraw.DogListView
+        }
+        body = json.dumps({
+            'persons': 'start=0&length=3&order[0][column]=1&draw=1',
+            'dogs': 'start=0&length=3&order[0][column]=1&draw=1'
+        })
+        responses = []
+        for concurrent_queries in (False, True):
+            request = factory.post(
+                '/', body, content_type='application/json'
+            )
+            request.user = mock.Mock(can_see=True)
+            responses.append(BatchDrawView.as_view(
+                tables=tables, concurrent_queries=concurrent_queries
+            )(request))
+        self.assertEqual(
+            json.loads(responses[0].content), json.loads(responses[1].content)
+        )
+
+    def test_script_prefix(self):
+        mommy.make_recipe('tests.test_person', _quantity=5)
+        set_script_prefix('/app/')
+        self.addCleanup(set_script_prefix, '/')
+        query_string = 'start=0&length=3&order[0][column]=1&draw=1'
+        request = RequestFactory().post('/', json.dumps({
+            'persons': query_string, 'other_persons': query_string
+        }), content_type='application/json')
+        request.user = mock.Mock(can_see=True)
+        data = json.loads(BatchDrawView.as_view(tables={
+            'persons': TestBatchDraw.PersonListView,
+            'other_persons': TestBatchDraw.PersonListView
+        }, concurrent_queries=True)(request).content)
+        for name in ('persons', 'other_persons'):
+            self.assertIn('/app/persons/', data[name]['data'][0][-1])
+
+
+class TestInlineFirstPage(TestCase):
+    """
+    TestCase for the first window of the table embedded in the page
+    """
+
+    class PersonListView(DatatablesListView, ListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender']
+        inline_first_page = True
+        page_length = 5
+        pipeline_pages = 2
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=12)
+
+    def get_context_data(self, view_class):
+        view = view_class()
+        view.request = self.factory.get('/')
+        view.args = ()
+        view.kwargs = {}
+        view.object_list = view.get_queryset()
+        return view.get_context_data()
+
+    def test_first_page(self):
+        first_page = self.get_context_data(self.PersonListView)['first_page']
+        self.assertEqual(first_page['start'], 0)
+        self.assertEqual(first_page['length'], 10)
+        self.assertEqual(first_page['order'], [[0, 'asc']])
+        self.assertDictEqual(
+            first_page['json'],
+            self.PersonListView().generate_data(self.factory.get('/', {
+                'start': 0,
+                'length': 10,
+                'order[0][column]': 0,
+                'order[0][dir]': 'asc',
+                'draw': 1
+            }))
+        )
+        self.assertEqual(len(first_page['json']['data']), 10)
+
+    def test_template(self):
+        context = self.get_context_data(self.PersonListView)
+        html = render_to_string('datatables_listview/js.html', context)
+        self.assertIn('id="first-page"', html)
+        self.assertIn('let page_length = 5', html)
+
+        view_class = type('PagePersonListView', (self.PersonListView,), {
+            'inline_first_page': False
+        })
+        context = self.get_context_data(view_class)
+        self.assertNotIn('first_page', context)
+        html = render_to_string('datatables_listview/js.html', context)
+        self.assertNotIn('id="first-page"', html)
+
+
+class TestOptionRenderer(TestCase):
+    """
+    TestCase for the compiled option renderer, the HTML must be the same
+    rendered by the templates
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['name']
+        options_list = [
+            {
+                'option_label': 'Detail',
+                'option_url': 'person-detail',
+                'url_params': ['id'],
+                'icon': 'eye',
+            },
+            {
+                'option_label': 'Dog & <friends>',
+                'option_url': 'person-dog',
+                'url_params': ['id', 'dog'],
+                'confirm_modal': 'dog-modal',
+            }
+        ]
+
+    def setUp(self):
+        mommy.make_recipe('tests.test_person', _quantity=3)
+
+    def render_with_templates(self, obj):
+        urls = [
+            render_to_string(
+                "datatables_listview/url_rendering_tool.html",
+                {
+                    'name': option['option_label'],
+                    'url': reverse(
+                        option['option_url'],
+                        args=[getattr(obj, param) for param in option['url_params']]
+                    ),
+                    'icon': option.get('icon'),
+                    'confirm_modal': option.get('confirm_modal')
+                }
+            )
+            for option in self.PersonListView.options_list
+        ]
+        return render_to_string(
+            "datatables_listview/options_list_rendering_tool.html",
+            {'urls': urls}
+        )
+
+    def test_same_html(self):
+        view = self.PersonListView()
+        for obj in TestPerson.objects.all():
+            row = view.generate_rows_with_options([obj])[0]
+            self.assertEqual(row[-1], self.render_with_templates(obj))
+
+    def test_no_options(self):
+        renderer = self.PersonListView.get_table_spec().get_option_renderer()
+        self.assertEqual(
+            renderer.render_options([]),
+            render_to_string(
+                "datatables_listview/options_list_rendering_tool.html",
+                {'urls': []}
+            )
+        )
+
+
+class TestSearchBackends(TestCase):
+    """
+    TestCase for the search backends used by filter_by_search_text, the
+    PostgreSQL backends fall back to icontains in SQLite
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['name', 'gender']
+
+    def setUp(self):
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def test_fallback(self):
+        for search_backend in (PostgresFullTextSearch(), TrigramSearch()):
+            view = self.PersonListView()
+            view.search_backend = search_backend
+            queryset = view.filter_by_search_text(view.get_queryset(), "naMe1")
+            self.assertEqual(queryset.count(), 2)
+
+    def test_custom_backend(self):
+        class NameStartsWithSearch:
+            def filter(self, view, queryset, search_text):
+                return queryset.filter(name__startswith=search_text)
+
+        view = self.PersonListView()
+        view.search_backend = NameStartsWithSearch()
+        queryset = view.filter_by_search_text(view.get_queryset(), "Name1")
+        self.assertEqual(queryset.count(), 2)
+
+
+class TestNarrowingSearch(TestCase):
+    """
+    TestCase for the search backend that narrows the longer searches over
+    the pks kept for the shorter ones
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender']
+
+    def setUp(self):
+        caches['default'].clear()
+        mommy.make_recipe('tests.test_person', _quantity=25)
+        self.search_backend = NarrowingSearch()
+
+    def get_view(self):
+        view = self.PersonListView()
+        view.search_backend = self.search_backend
+        return view
+
+    def get_pks(self, view, search_text):
+        return set(view.filter_by_search_text(
+            view.get_queryset(), search_text
+        ).values_list('pk', flat=True))
+
+    def test_same_rows(self):
+        plain_view = self.PersonListView()
+        view = self.get_view()
+        for search_text in ('1', '12', '2', '2 f', '20 fe', 'n', 'na', 'NAME1',
+                            'name12', 'name2', 'male', 'female', 'x'):
+            self.assertEqual(
+                self.get_pks(view, search_text),
+                self.get_pks(plain_view, search_text),
+                search_text
+            )
+
+    def test_narrowing(self):
+        view = self.get_view()
+        self.get_pks(view, 'name1')
+        # Only the pks of the rows that matched 'name1' are searched
+        with self.assertNumQueries(1):
+            view.filter_by_search_text(view.get_queryset(), 'name12')
+        scope = self.search_backend.get_scope(view)
+        pks, kept = self.search_backend.get_kept_pks(
+            scope, 'name12', get_model_version(TestPerson)
+        )
+        self.assertTrue(kept)
+        self.assertEqual(
+            list(pks),
+            list(TestPerson.objects.filter(
+                name__icontains='name12'
+            ).order_by('pk').values_list('pk', flat=True))
+        )
+        # The kept search is used again
+        with self.assertNumQueries(0):
+            view.filter_by_search_text(view.get_queryset(), 'name12')
+
+    def test_invalidation(self):
+        view = self.get_view()
+        self.assertEqual(len(self.get_pks(view, 'aaron')), 0)
+        mommy.make_recipe('tests.test_person', name="Aaron")
+        self.assertEqual(len(self.get_pks(view, 'aaron')), 1)
+
+    def test_shared_version(self):
+        view = self.get_view()
+        self.assertEqual(len(self.get_pks(view, 'nam')), 25)
+        person = mommy.prepare_recipe(
+            'tests.test_person', name="Namezz", dog=TestDog.objects.first()
+        )
+        TestPerson.objects.bulk_create([person])
+        # The version is bumped by the process that did the bulk change
+        bump_model_version(TestPerson)
+        self.assertEqual(len(self.get_pks(view, 'namez')), 1)
+
+    def test_limits(self):
+        self.search_backend.max_pks = 3
+        self.search_backend.max_searches = 2
+        view = self.get_view()
+        self.get_pks(view, 'name')
+        self.assertFalse(self.search_backend.searches)
+        for search_text in ('name12', 'name13', 'name14'):
+            self.get_pks(view, search_text)
+        # The least recently used search is evicted
+        self.assertEqual(
+            [search_text for _, search_text in self.search_backend.searches],
+            ['name13', 'name14']
+        )
+
+
+class TestColumnFilters(TestCase):
+    """
+    TestCase for the filters by column sent by datatables in
+    columns[i][search][value]
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender', 'birth_date']
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def test_get_draw_params(self):
+        request = self.factory.get('/', {
+            'columns[1][search][value]': 'Name1 ',
+            'columns[2][search][value]': 'FEMALE',
+            'columns[2][searchable]': 'false',
+            'columns[3][search][value]': '',
+        })
+        draw_params = self.PersonListView().get_draw_params(request)
+        self.assertEqual(draw_params.column_filters, (('name', 'Name1'),))
+
+    def test_filters(self):
+        view = self.PersonListView()
+        pks = sorted(TestPerson.objects.values_list('pk', flat=True))
+        gender = TestPerson.objects.first().gender
+        for column_filters, expected in (
+            ((('name', 'name1'),), TestPerson.objects.filter(name__startswith='Name1')),
+            ((('id', '%s-%s' % (pks[2], pks[4])),), TestPerson.objects.filter(pk__in=pks[2:5])),
+            ((('id', '>=%s' % pks[8]),), TestPerson.objects.filter(pk__in=pks[8:])),
+            ((('id', 'one'),), TestPerson.objects.none()),
+            ((('gender', TestPerson.GENDERS[gender][1].lower()),),
+             TestPerson.objects.filter(gender=gender)),
+            ((('gender', 'male|female'),), TestPerson.objects.all()),
+            ((('birth_date', str(date.today().year)),), TestPerson.objects.all()),
+            ((('name', 'name1'), ('id', str(pks[0]))), TestPerson.objects.filter(pk=pks[0])),
+        ):
+            queryset = view.filter_by_column_filters(view.get_queryset(), column_filters)
+            self.assertSetEqual(set(queryset), set(expected), column_filters)
+
+    def test_filtered_count(self):
+        request = self.factory.get('/', {
+            'start': 0,
+            'length': 10,
+            'columns[1][search][value]': 'Name1',
+            'draw': 1
+        })
+        data = self.PersonListView().generate_data(request)
+        self.assertEqual(data['recordsTotal'], 10)
+        self.assertEqual(data['recordsFiltered'], 2)
+
+
+class TestMultiColumnOrdering(TestCase):
+    """
+    TestCase for the ordering by several columns sent by datatables in
+    order[i], with the pk as tie-breaker
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'gender', 'birth_date']
+
+    class IndexedPersonListView(PersonListView):
+        indexed_orderings = [('gender', 'name'), ('id',)]
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=10)
+        self.request = self.factory.get('/', {
+            'start': 0,
+            'length': 10,
+            'order[0][column]': 3,
+            'order[0][dir]': 'asc',
+            'order[1][column]': 1,
+            'order[1][dir]': 'desc',
+            'draw': 1
+        })
+
+    def test_get_draw_params(self):
+        draw_params = self.PersonListView().get_draw_params(self.request)
+        self.assertEqual(draw_params.ordering, (('birth_date', 'asc'), ('name', 'desc')))
+        self.assertEqual(draw_params.sort_column, 'birth_date')
+
+    def test_ordering(self):
+        view = self.PersonListView()
+        draw_params = view.get_draw_params(self.request)
+        self.assertListEqual(view.get_ordering(draw_params), ['birth_date', '-name', 'pk'])
+        queryset = view.filter_by_draw_params(view.get_queryset(), draw_params)
+        self.assertListEqual(
+            list(queryset),
+            list(TestPerson.objects.order_by('birth_date', '-name'))
+        )
+
+    def test_indexed_orderings(self):
+        view = self.IndexedPersonListView()
+        self.assertListEqual(
+            view.check_ordering([('gender', 'asc'), ('name', 'desc')]),
+            [('gender', 'asc'), ('name', 'desc')]
+        )
+        self.assertListEqual(
+            view.check_ordering([('gender', 'asc'), ('birth_date', 'desc')]),
+            [('gender', 'asc')]
+        )
+        # Without a supported part it's ordered by the pk
+        draw_params = view.get_draw_params(self.request)
+        self.assertEqual(draw_params.ordering, (('id', ''),))
+
+        view.unindexed_ordering = 'reject'
+        with self.assertRaises(DisallowedOrdering):
+            view.get_draw_params(self.request)
+
+
+class TestExport(TestCase):
+    """
+    TestCase for the server side export of the whole table
+    """
+
+    class PersonListView(DatatablesListView):
+        model = TestPerson
+        fields = ['id', 'name', 'cats']
+        column_names_and_defs = ['Id', 'Name', 'Cats']
+        export_chunk_size = 3
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        mommy.make_recipe('tests.test_person', _quantity=10)
+
+    def get_export(self, export_format, **params):
+        params['export'] = export_format
+        response = self.PersonListView().get(self.factory.get('/', params))
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        content = self.get_export(
+            'csv', **{'order[0][column]': 1, 'order[0][dir]': 'desc'}
+        )
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'Id,Name,Cats')
+        # All the rows without pagination and sorted like the draw
+        self.assertEqual(len(lines), 11)
+        person = TestPerson.objects.order_by('-name').first()
+        self.assertEqual(
+            lines[1],
+            '%s,%s,"%s"' % (person.pk, person.name,
+                            ", ".join(str(cat) for cat in person.cats.all()))
+        )
+
+    def test_ndjson_filtered(self):
+        content = self.get_export('ndjson', **{'search[value]': 'Name1'})
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertSetEqual({row['Name'] for row in rows}, {'Name1', 'Name10'})
+
+    def test_ndjson_types(self):
+        moment = datetime(2020, 1, 2, 3, 4, 5)
+        dog = mommy.make_recipe('tests.test_dog')
+        content = "".join(EXPORT_ENCODERS['ndjson'].encode(
+            ['Moment', 'Price', 'Dog'], [[moment, Decimal('1.50'), dog]]
+        ))
+        self.assertDictEqual(json.loads(content), {
+            'Moment': '2020-01-02T03:04:05',
+            'Price': '1.50',
+            'Dog': str(dog)
+        })
+
+    def test_fixed_queries_by_chunk(self):
+        # The pks, and by chunk the rows and the prefetch of the cats
+        with self.assertNumQueries(1 + 4 * 2):
+            self.get_export('csv')
+
+    def test_unknown_format(self):
+        with self.assertRaises(Http404):
+            self.get_export('doc')
@@ -1,3 +1,7 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -7,5 +11,13 @@ DATABASES = {
 SECRET_KEY = "r4dy"
 INSTALLED_APPS = [
     'django.contrib.contenttypes',
+    'core.search_index',
     'tests'
 ]
+ROOT_URLCONF = 'tests.urls'
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
+    },
+]
@@ -0,0 +1,13 @@
+from django.urls import re_path
+from django.views.generic import View
+
+from .views import AsyncPersonListView
+
+# Urls used by the options_list of the test views and the served views
+
+urlpatterns = [
+    re_path(r'^persons/(\d+)/$', View.as_view(), name='person-detail'),
+    re_path(r'^persons/(\d+)/dogs/([^/]+)/$', View.as_view(), name='person-dog'),
+    re_path(r'^persons/async/$', AsyncPersonListView.as_view(),
+            name='async-persons'),
+]
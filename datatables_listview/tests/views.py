@@ -0,0 +1,13 @@
+from django.views.generic import ListView
+
+from core.views import AsyncDatatablesListView
+from .models import TestPerson
+
+# Views served by the urls of the tests
+
+
+class AsyncPersonListView(AsyncDatatablesListView, ListView):
+    model = TestPerson
+    fields = ['id', 'name', 'dog', 'cats']
+    # The queries must see the rows of the transaction of the TestCase
+    async_concurrent_queries = False